@@ -0,0 +1,314 @@
+"""
+Подставные Telegram и Backend для бенчмарков: бот работает без сети и без внешних сервисов
+"""
+
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import InlineKeyboardMarkup, InputFile
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+COMPOSERS = ["Моцарт", "Бах", "Бетховен", "Шопен", "Чайковский", "Рахманинов", "Шуберт", "Гендель"]
+CATEGORIES = ["Фортепиано", "Скрипка", "Оркестр", "Хор", "Камерная музыка", "Орган"]
+
+
+class FakeTelegramSession(BaseSession):
+    """Сессия Bot API, которая ничего не отправляет, а записывает вызовы.
+
+    На send*/edit* отвечает сообщением (для sendDocument - с документом,
+    предварительно вычитав файл, как при загрузке), на остальное - True.
+    Последние сообщение и inline-клавиатура каждого чата запоминаются,
+    чтобы сценарии могли "нажимать" кнопки из ответов бота.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.uploaded_bytes = 0
+        self._message_ids = 0
+        # chat_id -> (message_id, текст, клавиатура)
+        self.last_message: Dict[int, Tuple[int, str, Optional[InlineKeyboardMarkup]]] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = method.__api_method__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if name == "getMe":
+            result: Any = BOT_USER
+        elif name.startswith(("send", "edit", "copy", "forward")):
+            result = await self._message_result(bot, method)
+        else:
+            result = True
+
+        response = self.check_response(
+            bot=bot, method=method, status_code=200,
+            content=json.dumps({"ok": True, "result": result}, ensure_ascii=False)
+        )
+        return response.result
+
+    async def _message_result(self, bot: Bot, method: TelegramMethod) -> Dict[str, Any]:
+        chat_id = getattr(method, "chat_id", None) or 0
+        message_id = getattr(method, "message_id", None)
+        if message_id is None:
+            self._message_ids += 1
+            message_id = self._message_ids
+
+        text = getattr(method, "text", None) or getattr(method, "caption", None) or ""
+        message: Dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text
+        }
+
+        document = getattr(method, "document", None)
+        if document is not None:
+            if isinstance(document, InputFile):
+                # Загрузка в Telegram: файл читается целиком
+                async for chunk in document.read(bot):
+                    self.uploaded_bytes += len(chunk)
+            message.pop("text")
+            message["caption"] = text
+            message["document"] = {"file_id": f"file{message_id}", "file_unique_id": f"unique{message_id}"}
+
+        markup = getattr(method, "reply_markup", None)
+        if isinstance(markup, InlineKeyboardMarkup) or name_is_edit(method):
+            keyboard = markup if isinstance(markup, InlineKeyboardMarkup) else None
+            self.last_message[chat_id] = (message_id, text, keyboard)
+        return message
+
+    def find_button(self, chat_id: int, prefix: str) -> Optional[Tuple[int, str, str]]:
+        """Кнопка последнего сообщения чата: (message_id, текст сообщения, callback_data)"""
+        last = self.last_message.get(chat_id)
+        if not last or last[2] is None:
+            return None
+        message_id, text, keyboard = last
+        for row in keyboard.inline_keyboard:
+            for button in row:
+                if button.callback_data and button.callback_data.startswith(prefix):
+                    return message_id, text, button.callback_data
+        return None
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def name_is_edit(method: TelegramMethod) -> bool:
+    return method.__api_method__.startswith("edit")
+
+
+def make_token(user_id: int, ttl: int = 86400) -> str:
+    """JWT с claim exp (подпись не проверяется ботом)"""
+    def encode(data: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{encode({'alg': 'HS256'})}.{encode({'id': user_id, 'exp': int(time.time()) + ttl})}.bench"
+
+
+class StandInBackend:
+    """Локальный aiohttp-сервер с маршрутами Backend API, которые использует бот.
+
+    latency   - средняя задержка ответа (секунды, разброс ±50%);
+    error_rate - доля ответов 503 (кроме /health);
+    results   - сколько произведений находит любой поиск;
+    padding   - байт текста описания в каждом произведении (размер ответов);
+    file_size - размер отдаваемого PDF (байт).
+    """
+
+    def __init__(self, latency: float = 0.02, error_rate: float = 0.0, results: int = 60,
+                 padding: int = 200, file_size: int = 256 * 1024):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.results = results
+        self.padding = padding
+        self.file_size = file_size
+        self.calls: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+
+    def work(self, work_id: int) -> Dict[str, Any]:
+        composer = COMPOSERS[work_id % len(COMPOSERS)]
+        return {
+            "id": work_id,
+            "work_title": f"Произведение {work_id}",
+            "composer": composer,
+            "category": CATEGORIES[work_id % len(CATEGORIES)],
+            "file_path": f"{composer}/work_{work_id}.pdf",
+            "file_type": "pdf",
+            "file_size": self.file_size,
+            "pages_count": 4 + work_id % 20,
+            "description": "н" * self.padding,
+            "created_at": "2024-01-01T00:00:00Z"
+        }
+
+    @web.middleware
+    async def _simulate(self, request: web.Request, handler) -> web.StreamResponse:
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.calls[f"{request.method} {route}"] += 1
+        if request.path == "/health":
+            return await handler(request)
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({"error": "unavailable"}, status=503)
+        return await handler(request)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "healthy"})
+
+    async def search_works(self, request: web.Request) -> web.Response:
+        page = int(request.query.get("page", 1))
+        limit = int(request.query.get("limit", 10))
+        start = (page - 1) * limit
+        ids = range(start + 1, min(self.results, start + limit) + 1)
+        return web.json_response({
+            "results": [self.work(work_id) for work_id in ids],
+            "total": self.results,
+            "pagination": {"page": page, "limit": limit, "has_next": start + limit < self.results}
+        })
+
+    async def get_work(self, request: web.Request) -> web.Response:
+        return web.json_response({"data": self.work(int(request.match_info["work_id"]))})
+
+    async def composers(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "composers": [{"composer": name, "works_count": 10 + i} for i, name in enumerate(COMPOSERS)]
+        })
+
+    async def categories(self, request: web.Request) -> web.Response:
+        return web.json_response({"categories": [{"category": name, "works_count": 10} for name in CATEGORIES]})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"total": self.results, "composers": len(COMPOSERS), "categories": len(CATEGORIES)})
+
+    async def suggestions(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "suggestions": [{"value": name, "count": 5 + i} for i, name in enumerate(CATEGORIES)]
+        })
+
+    async def search_terms(self, request: web.Request) -> web.Response:
+        query = request.query.get("search", request.query.get("query", ""))
+        limit = int(request.query.get("limit", 10))
+        terms = [
+            {"id": i, "term": f"{query} {i}", "definition": "Определение " + "т" * self.padding}
+            for i in range(1, min(limit, 5) + 1)
+        ]
+        return web.json_response({"terms": terms, "pagination": {"total": len(terms), "hasMore": False}})
+
+    async def login(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        user_id = abs(hash(data.get("email", ""))) % 1_000_000
+        return web.json_response({
+            "token": make_token(user_id),
+            "user": {"id": user_id, "email": data.get("email"), "name": "Bench User", "role": "user"}
+        })
+
+    async def verify_token(self, request: web.Request) -> web.Response:
+        return web.json_response({"user": {"id": 1, "email": "bench@example.com", "name": "Bench User", "role": "user"}})
+
+    async def file_info(self, request: web.Request) -> web.Response:
+        path = request.query.get("path", "")
+        return web.json_response({
+            "name": path.rsplit("/", 1)[-1], "path": path, "size": self.file_size,
+            "type": "file", "extension": ".pdf", "modified": "2024-01-01T00:00:00.000Z"
+        })
+
+    async def download(self, request: web.Request) -> web.Response:
+        body = b"%PDF-1.4\n" + b"0" * max(0, self.file_size - 9)
+        return web.Response(body=body, content_type="application/pdf")
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._simulate])
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/api/works/search/smart", self.search_works)
+        app.router.add_get("/api/works/search/suggestions", self.suggestions)
+        app.router.add_get("/api/works/composers", self.composers)
+        app.router.add_get("/api/works/categories", self.categories)
+        app.router.add_get("/api/works/stats/summary", self.stats)
+        app.router.add_get("/api/terms/stats/summary", self.stats)
+        app.router.add_get(r"/api/works/{work_id:\d+}", self.get_work)
+        app.router.add_get("/api/terms", self.search_terms)
+        app.router.add_get("/api/terms/search/smart", self.search_terms)
+        app.router.add_post("/api/auth/login", self.login)
+        app.router.add_post("/api/auth/verify-token", self.verify_token)
+        app.router.add_get("/api/auth/me", self.verify_token)
+        app.router.add_get("/api/files/info", self.file_info)
+        app.router.add_get("/api/files/download", self.download)
+        return app
+
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def total_calls(self) -> int:
+        """Запросы к API без проверок /health"""
+        return sum(count for route, count in self.calls.items() if not route.endswith("/health"))
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Входящее текстовое сообщение пользователя"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+    message: Dict[str, Any] = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": user,
+        "text": text
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, user_id: int, message_id: int, message_text: str, data: str) -> Dict[str, Any]:
+    """Нажатие inline-кнопки под сообщением бота"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": message_text or "..."
+            }
+        }
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк обработчиков: настоящий Dispatcher бота против подставного
+Telegram и локального Backend API с задаваемой задержкой, долей ошибок и размером ответов
+
+Запуск из каталога telegram-bot:
+    python -m benchmarks.handler_benchmark --users 50 --iterations 5
+    python -m benchmarks.handler_benchmark --save-baseline benchmarks/baseline.json
+    python -m benchmarks.handler_benchmark --baseline benchmarks/baseline.json --tolerance 0.2
+
+Сценарии (--scenarios): search - поиск текстом, следующая страница, карточка
+произведения, скачивание; term - /term <термин>; login - /start, кнопка входа, email и пароль.
+Каждый пользователь проходит выбранные сценарии --iterations раз, пользователи
+работают одновременно. Сравнение с базовой линией завершает запуск с кодом 1,
+если p95 шага или число запросов к Backend на обновление выросли больше --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ["search", "term", "login"]
+QUERIES = ["моцарт", "бах соната", "шопен ноктюрн", "фортепиано", "бетховен симфония", "хор"]
+TERMS = ["allegro", "andante", "валторна", "крещендо", "легато", "фермата"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Настройки бота до импорта config.settings: все внешнее - локальное и временное"""
+    os.environ["BACKEND_API_URL"] = f"http://127.0.0.1:{args.backend_port}/api"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bot.db')}"
+    os.environ["PDF_CACHE_DIR"] = os.path.join(workdir, "pdf_cache")
+    os.environ["PDF_CACHE_PREWARM"] = "0"
+    os.environ["TERMS_CSV_PATH"] = args.terms_csv or os.path.join(workdir, "no_terms.csv")
+    os.environ["LOG_FILE"] = os.path.join(workdir, "bot.log")
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCH")
+
+
+class Recorder:
+    """Время шагов сценариев"""
+
+    def __init__(self):
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.updates = 0
+        self.errors = 0
+
+    def add(self, step: str, elapsed: float) -> None:
+        self.steps[step].append(elapsed)
+        self.updates += 1
+
+
+class VirtualUser:
+    """Пользователь Telegram, который отправляет обновления в диспетчер"""
+
+    _update_ids = 0
+
+    def __init__(self, user_id: int, bot, dp, session, recorder: Recorder):
+        self.user_id = user_id
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.recorder = recorder
+
+    @classmethod
+    def next_update_id(cls) -> int:
+        cls._update_ids += 1
+        return cls._update_ids
+
+    async def feed(self, step: str, raw: Dict[str, Any]) -> None:
+        from aiogram.types import Update
+
+        update = Update.model_validate(raw, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.recorder.errors += 1
+        self.recorder.add(step, time.perf_counter() - started)
+
+    async def send(self, step: str, text: str) -> None:
+        from benchmarks.fakes import message_update
+        await self.feed(step, message_update(self.next_update_id(), self.user_id, text))
+
+    async def click(self, step: str, prefix: str) -> bool:
+        """Нажатие кнопки последнего сообщения бота; False - кнопки нет"""
+        from benchmarks.fakes import callback_update
+        button = self.session.find_button(self.user_id, prefix)
+        if button is None:
+            return False
+        message_id, text, data = button
+        await self.feed(step, callback_update(self.next_update_id(), self.user_id, message_id, text, data))
+        return True
+
+    async def search(self) -> None:
+        await self.send("search", random.choice(QUERIES))
+        await self.click("search_page", "search_page_")
+        if await self.click("work_details", "work_details_"):
+            await self.click("download", "download_work_")
+
+    async def term(self) -> None:
+        await self.send("term", f"/term {random.choice(TERMS)}")
+
+    async def login(self) -> None:
+        await self.send("start", "/start")
+        await self.click("login_start", "login")
+        await self.send("login_email", f"user{self.user_id}@example.com")
+        await self.send("login_password", "bench-password")
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from loguru import logger
+    from bot import create_dispatcher
+    from benchmarks.fakes import FakeTelegramSession, StandInBackend, percentile
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+
+    # Логи бота - только предупреждения и ошибки, чтобы не мешать замеру
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    backend = StandInBackend(
+        latency=args.backend_latency_ms / 1000,
+        error_rate=args.error_rate,
+        results=args.results,
+        padding=args.payload_bytes,
+        file_size=args.file_kb * 1024
+    )
+    await backend.start("127.0.0.1", args.backend_port)
+
+    # Лимиты исходящих запросов Telegram не подключаются: мерим обработку, а не очередь отправки
+    session = FakeTelegramSession(latency=args.telegram_latency_ms / 1000)
+    bot = Bot(token=os.environ["TELEGRAM_BOT_TOKEN"], session=session,
+              default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    # Запросы запуска (проверка здоровья и т.п.) в счет не идут
+    backend.calls.clear()
+    session.calls.clear()
+
+    recorder = Recorder()
+    random.seed(args.seed)
+
+    async def user_loop(index: int) -> None:
+        for iteration in range(args.iterations):
+            for scenario in args.scenarios:
+                # Вход - новым пользователем: уже вошедшему бот только сообщает об этом
+                user_id = 100000 + index if scenario != "login" else 500000 + iteration * args.users + index
+                user = VirtualUser(user_id, bot, dp, session, recorder)
+                await getattr(user, scenario)()
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(user_loop(index) for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await backend.stop()
+
+    updates = max(1, recorder.updates)
+    return {
+        "config": {
+            "users": args.users,
+            "iterations": args.iterations,
+            "scenarios": args.scenarios,
+            "backend_latency_ms": args.backend_latency_ms,
+            "error_rate": args.error_rate,
+            "payload_bytes": args.payload_bytes
+        },
+        "updates": recorder.updates,
+        "errors": recorder.errors,
+        "elapsed": elapsed,
+        "updates_per_second": recorder.updates / elapsed if elapsed else 0.0,
+        "backend_calls_per_update": backend.total_calls / updates,
+        "telegram_calls_per_update": sum(session.calls.values()) / updates,
+        "backend_calls": dict(backend.calls),
+        "telegram_calls": dict(session.calls),
+        "steps": {
+            step: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000
+            }
+            for step, values in recorder.steps.items()
+        }
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\nОбновлений: {result['updates']}, ошибок обработки: {result['errors']}, "
+          f"время: {result['elapsed']:.2f}с, {result['updates_per_second']:.1f} обн/с")
+    print(f"Запросов к Backend на обновление: {result['backend_calls_per_update']:.2f}, "
+          f"к Telegram: {result['telegram_calls_per_update']:.2f}\n")
+    print(f"{'Шаг':<18}{'N':>7}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}")
+    for step, stats in result["steps"].items():
+        print(f"{step:<18}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+    print("\nBackend:")
+    for route, count in sorted(result["backend_calls"].items(), key=lambda item: -item[1]):
+        print(f"  {route:<45}{count:>7}")
+
+
+def compare_with_baseline(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Регрессии относительно базовой линии: p95 шагов, пропускная способность, запросы к Backend"""
+    regressions = []
+    limit = 1 + tolerance
+
+    for step, stats in result["steps"].items():
+        base = baseline.get("steps", {}).get(step)
+        if base and base["p95_ms"] > 0 and stats["p95_ms"] > base["p95_ms"] * limit:
+            regressions.append(f"{step}: p95 {stats['p95_ms']:.1f} мс, было {base['p95_ms']:.1f} мс")
+
+    base_rate = baseline.get("updates_per_second", 0)
+    if base_rate and result["updates_per_second"] < base_rate / limit:
+        regressions.append(f"пропускная способность {result['updates_per_second']:.1f} обн/с, было {base_rate:.1f}")
+
+    base_calls = baseline.get("backend_calls_per_update", 0)
+    if base_calls and result["backend_calls_per_update"] > base_calls * limit:
+        regressions.append(
+            f"запросов к Backend на обновление {result['backend_calls_per_update']:.2f}, было {base_calls:.2f}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк обработчиков бота")
+    parser.add_argument("--users", type=int, default=20, help="Одновременных пользователей")
+    parser.add_argument("--iterations", type=int, default=3, help="Повторов сценариев на пользователя")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Сценарии через запятую ({', '.join(SCENARIOS)})")
+    parser.add_argument("--backend-latency-ms", type=float, default=20, help="Средняя задержка Backend")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0, help="Задержка ответов Telegram")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов Backend 503")
+    parser.add_argument("--results", type=int, default=60, help="Произведений в результатах поиска")
+    parser.add_argument("--payload-bytes", type=int, default=200, help="Размер описания произведения")
+    parser.add_argument("--file-kb", type=int, default=256, help="Размер PDF")
+    parser.add_argument("--terms-csv", help="Словарь терминов (по умолчанию термины ищутся в Backend)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="ERROR", help="Уровень логов бота")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Сохранить результат как базовую линию")
+    parser.add_argument("--baseline", metavar="PATH", help="Сравнить с базовой линией")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    args.backend_port = free_port()
+
+    with tempfile.TemporaryDirectory(prefix="handler_bench_") as workdir:
+        prepare_environment(args, workdir)
+        result = asyncio.run(run_benchmark(args))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nБазовая линия сохранена: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Регрессии относительно {args.baseline} (допуск {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n✅ Без регрессий относительно {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
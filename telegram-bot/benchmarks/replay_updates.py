@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанных обновлений (RECORD_UPDATES_FILE) на настоящем
+Dispatcher бота против подставного Telegram и локального Backend API
+
+Запуск из каталога telegram-bot:
+    python -m benchmarks.replay_updates logs/updates.ndjson              # в реальном темпе
+    python -m benchmarks.replay_updates logs/updates.ndjson --speed 10   # в 10 раз быстрее
+    python -m benchmarks.replay_updates logs/updates.ndjson --speed 0    # без пауз
+
+Интервалы между обновлениями сохраняются (с делением на --speed), обновления
+одного пользователя обрабатываются строго по порядку записи, разные
+пользователи - одновременно. Нажатие кнопки привязывается к кнопке с тем же
+префиксом callback_data из последнего ответа бота этому пользователю
+(идентификаторы сессий поиска при воспроизведении другие); если такой кнопки
+нет, отправляются записанные данные. Тексты, скрытые при записи (ввод email
+и пароля), воспроизводятся как "***". Отчет: время по обработчикам (метрика
+bot_handler_duration_seconds) и по маршрутам Backend (bot_api_request_duration_seconds).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.handler_benchmark import free_port, prepare_environment
+
+
+def load_records(path: str, limit: int = 0) -> List[Dict[str, Any]]:
+    """Записи NDJSON по времени поступления; поврежденные строки пропускаются"""
+    records = []
+    skipped = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                record["ts"] = float(record["ts"])
+                record["update"]["update_id"]
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+                continue
+            records.append(record)
+    if skipped:
+        print(f"Пропущено поврежденных строк: {skipped}", file=sys.stderr)
+    # Несколько процессов дописывают файл пачками: восстанавливаем общий порядок
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def update_user(update: Dict[str, Any]) -> Optional[int]:
+    """Пользователь обновления: ключ очереди, сохраняющей порядок"""
+    for kind in ("message", "callback_query", "inline_query", "edited_message"):
+        event = update.get(kind)
+        if event and event.get("from"):
+            return event["from"].get("id")
+    return None
+
+
+def callback_prefix(data: str) -> str:
+    """Префикс callback_data без идентификаторов: search_page_ab12_2 -> search_page_"""
+    parts = data.split("_")
+    stripped = False
+    while len(parts) > 1 and any(char.isdigit() for char in parts[-1]):
+        parts.pop()
+        stripped = True
+    return "_".join(parts) + "_" if stripped else data
+
+
+class Replayer:
+    """Подача записанных обновлений в диспетчер по расписанию записи"""
+
+    def __init__(self, bot, dp, session, speed: float):
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.speed = speed
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        # Насколько позже расписания обновление попало в обработку (ждало свою очередь)
+        self.delays: List[float] = []
+        self.errors = 0
+        self.rebound = 0
+
+    def _rebind(self, update: Dict[str, Any]) -> None:
+        callback = update.get("callback_query")
+        if not callback or not callback.get("data"):
+            return
+        user_id = callback["from"]["id"]
+        button = self.session.find_button(user_id, callback["data"])
+        if button is None:
+            button = self.session.find_button(user_id, callback_prefix(callback["data"]))
+        if button is None:
+            return
+        message_id, text, data = button
+        callback["data"] = data
+        message = callback.setdefault("message", {"date": 0, "chat": {"id": user_id, "type": "private"}})
+        message["message_id"] = message_id
+        message["text"] = text or "..."
+        self.rebound += 1
+
+    async def _feed(self, record: Dict[str, Any], due: float) -> None:
+        from aiogram.types import Update
+
+        raw = record["update"]
+        self._rebind(raw)
+        self.delays.append(max(0.0, time.perf_counter() - due))
+        update = Update.model_validate(raw, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors += 1
+        self.latencies[update.event_type].append(time.perf_counter() - started)
+
+    async def _user_worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                await self._feed(*item)
+            finally:
+                queue.task_done()
+
+    async def run(self, records: List[Dict[str, Any]]) -> float:
+        queues: Dict[Any, asyncio.Queue] = {}
+        workers: List[asyncio.Task] = []
+        first_ts = records[0]["ts"] if records else 0.0
+        started = time.perf_counter()
+
+        for record in records:
+            due = started
+            if self.speed > 0:
+                due += (record["ts"] - first_ts) / self.speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            user = update_user(record["update"])
+            key = user if user is not None else record["update"]["update_id"]
+            queue = queues.get(key)
+            if queue is None:
+                queue = queues[key] = asyncio.Queue()
+                workers.append(asyncio.create_task(self._user_worker(queue)))
+            queue.put_nowait((record, due))
+
+        for queue in queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        return time.perf_counter() - started
+
+
+async def replay(args: argparse.Namespace, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from loguru import logger
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from bot import create_dispatcher
+    from benchmarks.fakes import FakeTelegramSession, StandInBackend, percentile
+    from utils.metrics import handler_latency, api_latency
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    backend = StandInBackend(
+        latency=args.backend_latency_ms / 1000,
+        error_rate=args.error_rate,
+        padding=args.payload_bytes,
+        file_size=args.file_kb * 1024
+    )
+    await backend.start("127.0.0.1", args.backend_port)
+
+    session = FakeTelegramSession(latency=args.telegram_latency_ms / 1000)
+    bot = Bot(token=os.environ["TELEGRAM_BOT_TOKEN"], session=session,
+              default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    backend.calls.clear()
+    session.calls.clear()
+    handler_latency.clear()
+    api_latency.clear()
+
+    replayer = Replayer(bot, dp, session, args.speed)
+    try:
+        elapsed = await replayer.run(records)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await backend.stop()
+
+    handler_total = sum(total for total, _ in handler_latency.totals().values()) or 1.0
+    api_total = sum(total for total, _ in api_latency.totals().values()) or 1.0
+    return {
+        "updates": len(records),
+        "errors": replayer.errors,
+        "rebound_callbacks": replayer.rebound,
+        "elapsed": elapsed,
+        "updates_per_second": len(records) / elapsed if elapsed else 0.0,
+        "schedule_delay_p95_ms": percentile(replayer.delays, 95) * 1000,
+        "update_types": {
+            kind: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000
+            }
+            for kind, values in replayer.latencies.items()
+        },
+        "handlers": [
+            {"handler": ".".join(labels), "count": count, "total_s": total,
+             "mean_ms": total / count * 1000, "share": total / handler_total}
+            for labels, (total, count) in sorted(handler_latency.totals().items(), key=lambda item: -item[1][0])
+        ],
+        "backend": [
+            {"endpoint": " ".join(labels), "count": count, "total_s": total,
+             "mean_ms": total / count * 1000, "share": total / api_total}
+            for labels, (total, count) in sorted(api_latency.totals().items(), key=lambda item: -item[1][0])
+        ],
+        "telegram_calls": dict(session.calls)
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\nОбновлений: {result['updates']}, ошибок обработки: {result['errors']}, "
+          f"время: {result['elapsed']:.2f}с, {result['updates_per_second']:.1f} обн/с")
+    print(f"Отставание от расписания p95: {result['schedule_delay_p95_ms']:.1f} мс, "
+          f"нажатий привязано к новым кнопкам: {result['rebound_callbacks']}\n")
+
+    print(f"{'Тип обновления':<22}{'N':>7}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}")
+    for kind, stats in result["update_types"].items():
+        print(f"{kind:<22}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+
+    for title, rows, key in (("Обработчик", result["handlers"], "handler"),
+                             ("Маршрут Backend", result["backend"], "endpoint")):
+        print(f"\n{title:<45}{'N':>7}{'всего, с':>11}{'ср., мс':>10}{'доля':>8}")
+        for row in rows:
+            print(f"{row[key]:<45}{row['count']:>7}{row['total_s']:>11.2f}{row['mean_ms']:>10.1f}{row['share']:>8.1%}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument("path", help="Файл NDJSON (RECORD_UPDATES_FILE)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение времени (0 - без пауз)")
+    parser.add_argument("--limit", type=int, default=0, help="Воспроизвести первые N обновлений")
+    parser.add_argument("--backend-latency-ms", type=float, default=20, help="Средняя задержка Backend")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0, help="Задержка ответов Telegram")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов Backend 503")
+    parser.add_argument("--payload-bytes", type=int, default=200, help="Размер описания произведения")
+    parser.add_argument("--file-kb", type=int, default=256, help="Размер PDF")
+    parser.add_argument("--terms-csv", help="Словарь терминов (по умолчанию термины ищутся в Backend)")
+    parser.add_argument("--log-level", default="ERROR", help="Уровень логов бота")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args()
+
+    records = load_records(args.path, args.limit)
+    if not records:
+        parser.error(f"в {args.path} нет обновлений")
+    args.backend_port = free_port()
+
+    with tempfile.TemporaryDirectory(prefix="replay_") as workdir:
+        prepare_environment(args, workdir)
+        # Воспроизведение не записывается повторно
+        os.environ["RECORD_UPDATES_FILE"] = ""
+        result = asyncio.run(replay(args, records))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
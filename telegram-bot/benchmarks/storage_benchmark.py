@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентного доступа к хранилищам бота (SQLite / SQLite WAL / MySQL)
+
+Запуск из каталога telegram-bot:
+    python -m benchmarks.storage_benchmark --concurrency 50 --operations 200
+
+MySQL участвует в сравнении, если заданы DB_HOST, DB_NAME и DB_USER
+(или аргументы --mysql-*).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import BaseStorage, SQLiteStorage, WALSQLiteStorage, MySQLStorage
+
+
+# Доли операций в смеси (похоже на реальную нагрузку: в основном чтения)
+OPERATION_MIX = [
+    ("get_user_session", 0.45),
+    ("get_search_cache", 0.25),
+    ("get_user_preferences", 0.10),
+    ("save_search_cache", 0.15),
+    ("save_user_session", 0.05),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_operation(storage: BaseStorage, operation: str, users: int, queries: int) -> None:
+    """Одна операция из смеси"""
+    telegram_id = random.randint(1, users)
+    query_hash = f"q{random.randint(1, queries)}"
+    expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    
+    if operation == "get_user_session":
+        await storage.get_user_session(telegram_id)
+    elif operation == "get_search_cache":
+        await storage.get_search_cache(query_hash)
+    elif operation == "get_user_preferences":
+        await storage.get_user_preferences(telegram_id)
+    elif operation == "save_search_cache":
+        results = json.dumps({"results": [{"id": i, "work_title": "x" * 40} for i in range(10)]})
+        await storage.save_search_cache(query_hash, query_hash, results, expires_at)
+    elif operation == "save_user_session":
+        await storage.save_user_session(telegram_id, "token", json.dumps({"telegram_id": telegram_id}), expires_at)
+
+
+async def benchmark(storage: BaseStorage, concurrency: int, operations: int,
+                    users: int, queries: int) -> Dict[str, float]:
+    """Запуск смеси операций в concurrency параллельных задачах"""
+    names = [name for name, _ in OPERATION_MIX]
+    weights = [weight for _, weight in OPERATION_MIX]
+    read_latencies: List[float] = []
+    write_latencies: List[float] = []
+    
+    async def worker() -> None:
+        for _ in range(operations):
+            operation = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            await run_operation(storage, operation, users, queries)
+            latency = (time.perf_counter() - started) * 1000
+            if operation.startswith("get_"):
+                read_latencies.append(latency)
+            else:
+                write_latencies.append(latency)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    total = len(read_latencies) + len(write_latencies)
+    return {
+        "ops": total,
+        "ops_per_sec": total / elapsed,
+        "read_p50_ms": percentile(read_latencies, 50),
+        "read_p99_ms": percentile(read_latencies, 99),
+        "write_p50_ms": percentile(write_latencies, 50),
+        "write_p99_ms": percentile(write_latencies, 99),
+    }
+
+
+async def run_backend(storage: BaseStorage, args: argparse.Namespace) -> Dict[str, float]:
+    """Подготовка данных и замер одного хранилища"""
+    await storage.connect()
+    try:
+        # Предзаполнение, чтобы чтения находили данные
+        expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+        for telegram_id in range(1, args.users + 1):
+            await storage.save_user_session(telegram_id, "token", "{}", expires_at)
+        
+        return await benchmark(storage, args.concurrency, args.operations, args.users, args.queries)
+    finally:
+        await storage.close()
+
+
+def print_result(name: str, result: Dict[str, float]) -> None:
+    print(
+        f"{name:<8} | {result['ops']:>7} оп. | {result['ops_per_sec']:>9.1f} оп/с | "
+        f"чтение p50 {result['read_p50_ms']:.2f} / p99 {result['read_p99_ms']:.2f} мс | "
+        f"запись p50 {result['write_p50_ms']:.2f} / p99 {result['write_p99_ms']:.2f} мс"
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилищ бота")
+    parser.add_argument("--concurrency", type=int, default=50, help="Число параллельных задач")
+    parser.add_argument("--operations", type=int, default=200, help="Операций на задачу")
+    parser.add_argument("--users", type=int, default=1000, help="Число пользователей")
+    parser.add_argument("--queries", type=int, default=500, help="Число различных запросов")
+    parser.add_argument("--sqlite-path", default="", help="Файл SQLite (по умолчанию временный)")
+    parser.add_argument("--sqlite-readers", type=int, default=4, help="Читателей в режиме WAL")
+    parser.add_argument("--mysql-host", default=os.getenv("DB_HOST", ""))
+    parser.add_argument("--mysql-port", type=int, default=int(os.getenv("DB_PORT", "3306")))
+    parser.add_argument("--mysql-db", default=os.getenv("DB_NAME", ""))
+    parser.add_argument("--mysql-user", default=os.getenv("DB_USER", ""))
+    parser.add_argument("--mysql-password", default=os.getenv("DB_PASSWORD", ""))
+    parser.add_argument("--mysql-pool", type=int, default=10)
+    args = parser.parse_args()
+    
+    print(f"Конкурентность: {args.concurrency}, операций на задачу: {args.operations}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_path = args.sqlite_path or os.path.join(tmp_dir, "bench.db")
+        print_result("sqlite", await run_backend(SQLiteStorage(sqlite_path), args))
+        
+        wal_path = sqlite_path + ".wal-bench"
+        print_result("wal", await run_backend(WALSQLiteStorage(wal_path, readers=args.sqlite_readers), args))
+    
+    if args.mysql_host and args.mysql_db and args.mysql_user:
+        mysql = MySQLStorage(
+            host=args.mysql_host,
+            port=args.mysql_port,
+            user=args.mysql_user,
+            password=args.mysql_password,
+            db=args.mysql_db,
+            maxsize=args.mysql_pool
+        )
+        print_result("mysql", await run_backend(mysql, args))
+    else:
+        print("mysql    | пропущено: не заданы DB_HOST / DB_NAME / DB_USER")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
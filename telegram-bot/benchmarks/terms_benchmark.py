@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска терминов: локальный индекс вариантов заголовков против Backend
+
+Запуск из каталога telegram-bot:
+    python -m benchmarks.terms_benchmark --queries 2000
+
+Запросы - варианты заголовков из terms.csv (написания на других языках и
+произношения), для каждого известен ожидаемый термин. Backend участвует в
+сравнении, если доступен BACKEND_API_URL (ответы берутся без кеша поиска).
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.terms_index import TermsIndex, load_terms, normalize_text
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_queries(index: TermsIndex, count: int) -> List[Tuple[str, int]]:
+    """Случайные варианты заголовков: (запрос, id ожидаемого термина)"""
+    variants = [
+        (alias["text"], term["id"])
+        for term in index.terms.values()
+        for alias in term["aliases"]
+        if len(normalize_text(alias["text"])) > 2
+    ]
+    return random.choices(variants, k=count)
+
+
+def measure(queries: List[Tuple[str, int]],
+            find: Callable[[str], List[Dict]]) -> Dict[str, float]:
+    """Последовательный замер задержки и доли запросов, нашедших ожидаемый термин"""
+    latencies = []
+    found = 0
+    for query, term_id in queries:
+        started = time.perf_counter()
+        terms = find(query)
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+        found += any(term.get("id") == term_id for term in terms)
+    return {
+        "queries": len(queries),
+        "p50_us": percentile(latencies, 50),
+        "p99_us": percentile(latencies, 99),
+        "hit_rate": found / len(queries) if queries else 0.0,
+    }
+
+
+def linear_scan(index: TermsIndex, limit: int) -> Callable[[str], List[Dict]]:
+    """Перебор словаря с поиском подстроки - как LIKE '%...%' на стороне Backend"""
+    def find(query: str) -> List[Dict]:
+        key = normalize_text(query)
+        results = []
+        for term_id, term_key in index.keys.items():
+            if key in term_key:
+                results.append(index.terms[term_id])
+                if len(results) >= limit:
+                    break
+        return results
+    return find
+
+
+async def measure_backend(queries: List[Tuple[str, int]], limit: int) -> Dict[str, float]:
+    """Замер поиска через Backend API (/terms?search=)"""
+    from services.api_client import api_client
+
+    latencies = []
+    found = 0
+    try:
+        for query, term_id in queries:
+            started = time.perf_counter()
+            # Напрямую, минуя кеш поиска: иначе повторные запросы замерят кеш
+            response = await api_client._make_request(
+                "GET", "/terms", params={"search": query, "page": 1, "limit": limit}
+            )
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+            if not response or response.get("error"):
+                return {}
+            found += any(term.get("id") == term_id for term in response.get("terms", []))
+    finally:
+        await api_client.close()
+
+    return {
+        "queries": len(queries),
+        "p50_us": percentile(latencies, 50),
+        "p99_us": percentile(latencies, 99),
+        "hit_rate": found / len(queries),
+    }
+
+
+def print_result(name: str, result: Dict[str, float]) -> None:
+    print(
+        f"{name:<8} | {result['queries']:>6} запр. | "
+        f"p50 {result['p50_us']:>10.1f} / p99 {result['p99_us']:>10.1f} мкс | "
+        f"найдено {result['hit_rate'] * 100:.1f}%"
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска терминов")
+    parser.add_argument("--csv", default=os.getenv("TERMS_CSV_PATH", "../files/terms.csv"),
+                        help="Файл терминов")
+    parser.add_argument("--queries", type=int, default=2000, help="Число запросов")
+    parser.add_argument("--backend-queries", type=int, default=200,
+                        help="Число запросов к Backend (0 - не замерять)")
+    parser.add_argument("--limit", type=int, default=10, help="Результатов на запрос")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    started = time.perf_counter()
+    index = TermsIndex(load_terms(args.csv))
+    print(
+        f"Индекс: {len(index)} терминов, {len(index.exact)} ключей вариантов, "
+        f"построен за {(time.perf_counter() - started) * 1000:.0f} мс"
+    )
+
+    queries = make_queries(index, args.queries)
+    print_result("alias", measure(queries, index.lookup))
+    print_result("search", measure(queries, lambda query: index.search(query, args.limit)))
+    print_result("scan", measure(queries, linear_scan(index, args.limit)))
+
+    if args.backend_queries > 0:
+        try:
+            result = await measure_backend(queries[:args.backend_queries], args.limit)
+        except Exception as e:
+            result = {}
+            print(f"backend  | пропущено: {e}")
+        if result:
+            print_result("backend", result)
+        else:
+            print("backend  | пропущено: Backend недоступен")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
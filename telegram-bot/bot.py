@@ -3,9 +3,14 @@
 """
 
 import asyncio
+import json
 import sys
+import traceback
+from typing import Any, Dict
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from loguru import logger
 
@@ -16,6 +21,9 @@ from config.database import db_manager
 # Импорты middleware
 from middleware.auth import auth_middleware
 from middleware.logging import logging_middleware
+from middleware.scheduler import scheduler_middleware
+from middleware.outbound import outbound_limiter
+from middleware.recorder import update_recorder
 
 # Импорты обработчиков
 from handlers import (
@@ -24,14 +32,27 @@ from handlers import (
     collections_handlers,
     files_handlers,
     terms_handlers,
-    settings_handlers
+    settings_handlers,
+    inline_handlers
 )
 
 # Импорты сервисов
 from services.api_client import api_client
+from services.pdf_cache import pdf_cache
+from services.terms_index import terms_service
+from services.warmup import startup_warmer
+from utils.metrics import registry, collect_bot_state, start_metrics_server
+from utils.profiling import loop_watchdog, update_profiler
 
+# Режимы запуска
+from runtime.webhook import run_webhook
+from runtime.supervisor import run_supervisor
 
-async def on_startup() -> None:
+# Типы обновлений, которые обрабатывает бот
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+
+async def on_startup(bot: Bot) -> None:
     """Функция запуска бота"""
     logger.info("🚀 Запуск Telegram бота музыкальной библиотеки")
     
@@ -53,6 +74,38 @@ async def on_startup() -> None:
     except Exception as e:
         logger.error(f"❌ Ошибка проверки Backend API: {e}")
     
+    # Фоновая проба Backend для circuit breaker
+    api_client.start_health_probe()
+    
+    # Локальный словарь терминов
+    try:
+        await terms_service.start()
+    except Exception as e:
+        logger.error(f"❌ Ошибка загрузки словаря терминов: {e}")
+    
+    # Локальный кеш PDF: восстановление индекса и прогрев популярных произведений
+    try:
+        await pdf_cache.start()
+        pdf_cache.start_prewarm(settings.PDF_CACHE_PREWARM, settings.PDF_CACHE_PREWARM_CONCURRENCY)
+    except Exception as e:
+        logger.error(f"❌ Ошибка инициализации кеша PDF: {e}")
+    
+    # Метрики: состояние кешей и очередей снимается при каждом запросе /metrics
+    if settings.METRICS_ENABLED:
+        registry.on_collect(collect_bot_state)
+    
+    # Сторож цикла событий и профилирование медленных обновлений
+    loop_watchdog.start()
+    update_profiler.start()
+    
+    # Запись входящих обновлений для воспроизведения нагрузки
+    if settings.RECORD_UPDATES_FILE:
+        update_recorder.start()
+    
+    # Прогрев соединений и кешей: обновления начинают приниматься после него
+    # (или по истечении WARMUP_BUDGET, остаток прогрева - в фоне)
+    await startup_warmer.run(bot)
+    
     logger.info("🎉 Бот успешно запущен!")
 
 
@@ -61,6 +114,13 @@ async def on_shutdown() -> None:
     logger.info("🛑 Остановка Telegram бота")
     
     # Закрытие соединений
+    await startup_warmer.close()
+    await update_recorder.stop()
+    update_profiler.stop()
+    await loop_watchdog.stop()
+    await pdf_cache.close()
+    await terms_service.close()
+    
     try:
         await db_manager.close()
         logger.info("✅ База данных закрыта")
@@ -74,10 +134,34 @@ async def on_shutdown() -> None:
         logger.error(f"❌ Ошибка закрытия API клиента: {e}")
     
     logger.info("👋 Бот остановлен")
+    
+    # Дописываем очередь фоновой записи логов
+    await logger.complete()
+
+
+def format_json_record(record: Dict[str, Any]) -> str:
+    """Формат файла логов для LOG_FORMAT=json: одна JSON-запись на строку"""
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        **{key: value for key, value in record["extra"].items() if not key.startswith("_")}
+    }
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
 
 
 def setup_logging() -> None:
-    """Настройка логирования"""
+    """Настройка логирования.
+    
+    При LOG_ASYNC запись, ротация и сжатие файла выполняются в фоновом
+    потоке loguru (enqueue), а не в цикле событий.
+    """
     
     # Удаляем стандартный обработчик
     logger.remove()
@@ -90,18 +174,23 @@ def setup_logging() -> None:
                "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
                "<level>{message}</level>",
         level=settings.LOG_LEVEL,
-        colorize=True
+        colorize=True,
+        enqueue=settings.LOG_ASYNC
     )
     
     # Добавляем файловый обработчик
     logger.add(
         settings.LOG_FILE,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | {message}",
+        format=(
+            format_json_record if settings.LOG_FORMAT == "json"
+            else "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | {message}"
+        ),
         level=settings.LOG_LEVEL,
         rotation="10 MB",
         retention="7 days",
         compression="zip",
-        encoding="utf-8"
+        encoding="utf-8",
+        enqueue=settings.LOG_ASYNC
     )
 
 
@@ -115,6 +204,7 @@ def register_handlers(dp: Dispatcher) -> None:
     dp.include_router(files_handlers.router)
     dp.include_router(terms_handlers.router)
     dp.include_router(settings_handlers.router)
+    dp.include_router(inline_handlers.router)
     
     logger.info("✅ Обработчики зарегистрированы")
 
@@ -123,8 +213,16 @@ def register_middleware(dp: Dispatcher) -> None:
     """Регистрация middleware"""
     
     # Middleware должен регистрироваться в правильном порядке
+    # Запись обновлений - первой, чтобы попали и отброшенные планировщиком повторы
+    if settings.RECORD_UPDATES_FILE:
+        dp.update.outer_middleware(update_recorder)
+    
+    # Очередь пользователя и общий лимит обработчиков - до разбора по типам событий
+    dp.update.outer_middleware(scheduler_middleware)
+    
     dp.message.middleware(logging_middleware)
     dp.callback_query.middleware(logging_middleware)
+    dp.inline_query.middleware(logging_middleware)
     
     dp.message.middleware(auth_middleware)
     dp.callback_query.middleware(auth_middleware)
@@ -132,18 +230,28 @@ def register_middleware(dp: Dispatcher) -> None:
     logger.info("✅ Middleware зарегистрированы")
 
 
-async def main() -> None:
-    """Главная функция"""
+def create_bot() -> Bot:
+    """Создание бота (с локальным сервером Bot API, если он задан)"""
     
-    # Настройка логирования
-    setup_logging()
-    logger.info("🔧 Настройка Telegram бота")
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL, is_local=settings.TELEGRAM_API_LOCAL)
+        )
+        logger.info(f"🔧 Сервер Bot API: {settings.TELEGRAM_API_URL}")
     
-    # Создание бота и диспетчера
     bot = Bot(
         token=settings.TELEGRAM_BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    # Все исходящие запросы проходят через лимиты Telegram
+    bot.session.middleware(outbound_limiter)
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создание диспетчера с middleware, обработчиками и функциями запуска/остановки"""
     
     dp = Dispatcher()
     
@@ -155,20 +263,52 @@ async def main() -> None:
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
+    return dp
+
+
+async def main() -> None:
+    """Главная функция"""
+    
+    # Настройка логирования
+    setup_logging()
+    logger.info("🔧 Настройка Telegram бота")
+    
+    if settings.BOT_WORKERS > 1:
+        # Супервизор принимает обновления и раздает их процессам-обработчикам,
+        # обработчики и сервисы работают только в процессах
+        await run_supervisor(settings.BOT_WORKERS, ALLOWED_UPDATES)
+        return
+    
+    # Создание бота и диспетчера
+    bot = create_bot()
+    dp = create_dispatcher()
+    metrics_runner = None
+    
     try:
-        # Запуск polling
-        logger.info("🔄 Запуск polling...")
-        await dp.start_polling(
-            bot,
-            allowed_updates=["message", "callback_query", "inline_query"],
-            drop_pending_updates=True
-        )
+        if settings.BOT_MODE == "webhook":
+            # Обновления приходят POST-запросами на встроенный сервер
+            logger.info("🔄 Запуск webhook...")
+            await run_webhook(bot, dp, ALLOWED_UPDATES)
+        else:
+            # В режиме polling метрики отдает отдельный сервер
+            if settings.METRICS_ENABLED:
+                metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+            
+            # Запуск polling
+            logger.info("🔄 Запуск polling...")
+            await dp.start_polling(
+                bot,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=True
+            )
     except KeyboardInterrupt:
         logger.info("👋 Получен сигнал остановки")
     except Exception as e:
         logger.error(f"💥 Критическая ошибка: {e}")
         raise
     finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 
@@ -71,6 +71,7 @@ def check_imports():
     modules_to_check = [
         'config.settings',
         'config.database',
+        'storage',
         'services.api_client',
         'handlers.auth_handlers',
         'handlers.search_handlers',
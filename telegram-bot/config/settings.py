@@ -3,7 +3,7 @@
 """
 
 import os
-from typing import List
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -18,10 +18,61 @@ class Settings:
     BOT_NAME: str = os.getenv("BOT_NAME", "MusicLibraryBot")
     BOT_USERNAME: str = os.getenv("BOT_USERNAME", "@music_library_bot")
     
+    # Способ получения обновлений: polling или webhook
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()
+    # Локальный сервер Bot API (например, http://telegram-bot-api:8081); пусто - api.telegram.org
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")
+    TELEGRAM_API_LOCAL: bool = os.getenv("TELEGRAM_API_LOCAL", "false").lower() == "true"
+    
+    # Webhook: публичный адрес, секрет для заголовка X-Telegram-Bot-Api-Secret-Token,
+    # адрес встроенного сервера и число одновременно обрабатываемых обновлений
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_CONCURRENCY: int = int(os.getenv("WEBHOOK_CONCURRENCY", "100"))
+    WEBHOOK_MAX_PENDING: int = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+    
+    # Обработка обновлений в нескольких процессах (1 - в одном процессе, без супервизора)
+    BOT_WORKERS: int = int(os.getenv("BOT_WORKERS", "1"))
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "100"))
+    WORKER_QUEUE_SIZE: int = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+    WORKER_RESTART_DELAY: float = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+    WORKER_STATS_INTERVAL: int = int(os.getenv("WORKER_STATS_INTERVAL", "60"))
+    
+    # Метрики Prometheus (GET /metrics)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
+    
+    # Сторож цикла событий (0 - без записи стека при блокировке) и профилирование медленных обновлений (0 - выключено)
+    LOOP_WATCHDOG_INTERVAL: float = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+    LOOP_STALL_THRESHOLD_MS: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+    PROFILE_SLOW_UPDATES_MS: int = int(os.getenv("PROFILE_SLOW_UPDATES_MS", "0"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "logs/profiles")
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "100"))
+    PROFILE_SAMPLE_INTERVAL_MS: int = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    
     # Backend API настройки
     BACKEND_API_URL: str = os.getenv("BACKEND_API_URL", "http://localhost:3000/api")
     BACKEND_API_KEY: str = os.getenv("BACKEND_API_KEY", "")
     
+    # Таймауты, повторы и circuit breaker для Backend API
+    API_TIMEOUT: float = float(os.getenv("API_TIMEOUT", "10"))
+    API_RETRY_ATTEMPTS: int = int(os.getenv("API_RETRY_ATTEMPTS", "3"))
+    API_RETRY_BASE_DELAY: float = float(os.getenv("API_RETRY_BASE_DELAY", "0.2"))
+    API_RETRY_MAX_DELAY: float = float(os.getenv("API_RETRY_MAX_DELAY", "2"))
+    API_RETRY_BUDGET_RATIO: float = float(os.getenv("API_RETRY_BUDGET_RATIO", "0.2"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+    HEALTH_PROBE_INTERVAL: float = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+    # Простой соединения с Backend до закрытия (секунды)
+    API_KEEPALIVE_TIMEOUT: float = float(os.getenv("API_KEEPALIVE_TIMEOUT", "60"))
+    # Кеш справочных данных Backend: категории, композиторы, статистика (секунды)
+    REFERENCE_CACHE_TTL: int = int(os.getenv("REFERENCE_CACHE_TTL", "300"))
+    
     # База данных (MySQL при наличии DB_HOST, иначе SQLite)
     DB_HOST: str = os.getenv("DB_HOST", "")
     DB_PORT: int = int(os.getenv("DB_PORT", "3306"))
@@ -29,6 +80,13 @@ class Settings:
     DB_USER: str = os.getenv("DB_USER", "")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///bot_cache.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    
+    # Режим SQLite: wal (пул читателей + один писатель) или simple (одно соединение)
+    SQLITE_MODE: str = os.getenv("SQLITE_MODE", "wal").lower()
+    SQLITE_READERS: int = int(os.getenv("SQLITE_READERS", "4"))
+    SQLITE_WRITE_BATCH: int = int(os.getenv("SQLITE_WRITE_BATCH", "64"))
+    SQLITE_FLUSH_INTERVAL_MS: int = int(os.getenv("SQLITE_FLUSH_INTERVAL_MS", "5"))
 
     @classmethod
     def use_mysql(cls) -> bool:
@@ -37,14 +95,92 @@ class Settings:
     # Логирование
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "logs/bot.log")
+    # Запись в фоновом потоке: вывод, ротация и сжатие не блокируют цикл событий
+    LOG_ASYNC: bool = os.getenv("LOG_ASYNC", "true").lower() == "true"
+    # Формат файла логов: text или json (структурированные записи)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    # Доля записываемых строк о входящих обновлениях по типам, например "message=0.1,callback_query=0.05"
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        name.strip(): float(rate)
+        for name, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(","))
+        if rate.strip()
+    }
+    # Медленные обновления (и ошибки) записываются всегда
+    LOG_SLOW_UPDATE_MS: int = int(os.getenv("LOG_SLOW_UPDATE_MS", "1000"))
+    
+    # Запись обезличенных входящих обновлений в NDJSON для воспроизведения (пусто - выключено)
+    RECORD_UPDATES_FILE: str = os.getenv("RECORD_UPDATES_FILE", "")
+    # Соль хеша идентификаторов (по умолчанию - токен бота) и доля записываемых пользователей
+    RECORD_UPDATES_SALT: str = os.getenv("RECORD_UPDATES_SALT", "")
+    RECORD_UPDATES_SAMPLE: float = float(os.getenv("RECORD_UPDATES_SAMPLE", "1"))
     
     # Файлы
     MAX_FILE_SIZE: str = os.getenv("MAX_FILE_SIZE", "50MB")
     ALLOWED_EXTENSIONS: List[str] = os.getenv("ALLOWED_EXTENSIONS", "pdf,mp3,sib,mus").split(",")
     
+    # Каталог библиотеки, общий с Backend (пусто - файлы только через HTTP)
+    LIBRARY_ROOT: str = os.getenv("LIBRARY_ROOT", "")
+    
+    # Словарь терминов (CSV перечитывается при изменении)
+    TERMS_CSV_PATH: str = os.getenv("TERMS_CSV_PATH", "files/terms.csv")
+    TERMS_RELOAD_INTERVAL: int = int(os.getenv("TERMS_RELOAD_INTERVAL", "30"))
+    
+    # Локальный кеш PDF-файлов
+    PDF_CACHE_ENABLED: bool = os.getenv("PDF_CACHE_ENABLED", "true").lower() == "true"
+    PDF_CACHE_DIR: str = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+    PDF_CACHE_SIZE_MB: int = int(os.getenv("PDF_CACHE_SIZE_MB", "1024"))
+    PDF_CACHE_PREWARM: int = int(os.getenv("PDF_CACHE_PREWARM", "100"))
+    PDF_CACHE_PREWARM_CONCURRENCY: int = int(os.getenv("PDF_CACHE_PREWARM_CONCURRENCY", "4"))
+    
+    # Прогрев при запуске за WARMUP_BUDGET секунд (0 - без прогрева): соединения с Backend
+    # и Telegram, справочные данные и WARMUP_SEARCHES самых частых поисков
+    WARMUP_BUDGET: float = float(os.getenv("WARMUP_BUDGET", "10"))
+    WARMUP_BACKEND_CONNECTIONS: int = int(os.getenv("WARMUP_BACKEND_CONNECTIONS", "8"))
+    WARMUP_TELEGRAM_CONNECTIONS: int = int(os.getenv("WARMUP_TELEGRAM_CONNECTIONS", "2"))
+    WARMUP_SEARCHES: int = int(os.getenv("WARMUP_SEARCHES", "100"))
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+    
     # Кеширование
     CACHE_EXPIRE_TIME: int = int(os.getenv("CACHE_EXPIRE_TIME", "3600"))
     ENABLE_CACHE: bool = os.getenv("ENABLE_CACHE", "true").lower() == "true"
+    SEARCH_CACHE_L1_SIZE: int = int(os.getenv("SEARCH_CACHE_L1_SIZE", "512"))
+    
+    # Сессии поиска (снимок результатов для пагинации)
+    SEARCH_SESSION_TTL: int = int(os.getenv("SEARCH_SESSION_TTL", "1800"))
+    SEARCH_SESSION_WINDOW: int = int(os.getenv("SEARCH_SESSION_WINDOW", "100"))
+    SEARCH_SESSION_MAX: int = int(os.getenv("SEARCH_SESSION_MAX", "5000"))
+    
+    # Общий поиск по всем источникам: срок ответа (секунды)
+    SEARCH_FANOUT_DEADLINE: float = float(os.getenv("SEARCH_FANOUT_DEADLINE", "4"))
+    
+    # Объединение одинаковых одновременных GET-запросов к Backend
+    ENABLE_REQUEST_COALESCING: bool = os.getenv("ENABLE_REQUEST_COALESCING", "true").lower() == "true"
+    
+    # Inline-режим
+    INLINE_DEBOUNCE: float = float(os.getenv("INLINE_DEBOUNCE", "0.15"))
+    INLINE_DEADLINE: float = float(os.getenv("INLINE_DEADLINE", "0.45"))
+    INLINE_CACHE_SIZE: int = int(os.getenv("INLINE_CACHE_SIZE", "2048"))
+    INLINE_CACHE_TTL: int = int(os.getenv("INLINE_CACHE_TTL", "600"))
+    INLINE_CACHE_TIME: int = int(os.getenv("INLINE_CACHE_TIME", "300"))
+    INLINE_MAX_RESULTS: int = int(os.getenv("INLINE_MAX_RESULTS", "50"))
+    
+    # Планировщик обновлений: общий лимит одновременных обработчиков и окно
+    # (секунды), в котором повторное нажатие той же кнопки отбрасывается
+    SCHEDULER_CONCURRENCY: int = int(os.getenv("SCHEDULER_CONCURRENCY", "64"))
+    SCHEDULER_DUPLICATE_WINDOW: float = float(os.getenv("SCHEDULER_DUPLICATE_WINDOW", "1"))
+    
+    # Лимиты исходящих запросов к Telegram
+    TELEGRAM_GLOBAL_RATE: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+    TELEGRAM_CHAT_RATE: float = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+    TELEGRAM_CHAT_BURST: float = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+    TELEGRAM_GROUP_RATE: float = float(os.getenv("TELEGRAM_GROUP_RATE", "20"))
+    TELEGRAM_GROUP_BURST: float = float(os.getenv("TELEGRAM_GROUP_BURST", "5"))
+    TELEGRAM_MAX_RETRIES: int = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+    
+    # Кеш сессий пользователей
+    SESSION_CACHE_SIZE: int = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+    SESSION_CACHE_TTL: int = int(os.getenv("SESSION_CACHE_TTL", "900"))
+    TOKEN_VERIFY_INTERVAL: int = int(os.getenv("TOKEN_VERIFY_INTERVAL", "300"))
     
     # Администраторы
     ADMIN_IDS: List[int] = [
@@ -65,6 +201,12 @@ class Settings:
         
         if not cls.BACKEND_API_URL:
             raise ValueError("BACKEND_API_URL не указан")
+        
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный BOT_MODE: {cls.BOT_MODE}")
+        
+        if cls.LOG_FORMAT not in ("text", "json"):
+            raise ValueError(f"Неизвестный LOG_FORMAT: {cls.LOG_FORMAT}")
     
     @classmethod
     def get_max_file_size_bytes(cls) -> int:
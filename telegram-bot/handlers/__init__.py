@@ -8,6 +8,7 @@ from . import collections_handlers
 from . import files_handlers
 from . import terms_handlers
 from . import settings_handlers
+from . import inline_handlers
 
 __all__ = [
     "auth_handlers",
@@ -15,5 +16,6 @@ __all__ = [
     "collections_handlers",
     "files_handlers",
     "terms_handlers",
-    "settings_handlers"
+    "settings_handlers",
+    "inline_handlers"
 ]
\ No newline at end of file
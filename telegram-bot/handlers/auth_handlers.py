@@ -352,8 +352,9 @@ async def cmd_logout(event, user: User):
         user.role = None
         user.is_authenticated = False
         
-        # Удаляем сессию из БД
+        # Удаляем сессию из кеша и БД
         from config.database import db_manager
+        auth_middleware.invalidate_user(user.telegram_id)
         await db_manager.delete_user_session(user.telegram_id)
         
         text = f"👋 До свидания, <b>{user.full_name}</b>!\n\nВы успешно вышли из аккаунта."
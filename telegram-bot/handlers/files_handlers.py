@@ -3,15 +3,23 @@
 """
 
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import CallbackQuery, FSInputFile, Message
 from loguru import logger
+from typing import Optional
 import aiohttp
-import aiofiles
+import asyncio
 import os
-import tempfile
 
+from config.settings import settings
+from config.database import db_manager
 from models.user import User
 from services.api_client import api_client
+from services.file_transfer import (
+    BackendStreamFile, MappedInputFile, FileTooLargeError, stat_library_file, spool_to_temp
+)
+from services.file_id_cache import telegram_files, file_fingerprint
+from services.pdf_cache import pdf_cache
 from keyboards.inline import main_menu_keyboard
 from utils.validators import sanitize_filename
 
@@ -50,65 +58,88 @@ async def download_work(callback: CallbackQuery, user: User):
             )
             return
         
-        # Получаем URL для скачивания
-        download_url = await api_client.download_file_url(file_path, user.jwt_token)
+        caption = f"🎵 <b>{work_title}</b>\n👨‍🎼 {composer}"
+        
+        # Файл уже загружался в Telegram: отправляем по file_id без скачивания
+        fingerprint = await file_fingerprint(file_path, user.jwt_token)
+        file_id = await telegram_files.get(work_id, fingerprint)
+        
+        if file_id:
+            try:
+                await callback.message.answer_document(
+                    document=file_id,
+                    caption=caption,
+                    reply_markup=main_menu_keyboard()
+                )
+                
+                await db_manager.record_download(work_id)
+                
+                await callback.message.edit_text(
+                    f"✅ Файл отправлен: <b>{work_title}</b>",
+                    reply_markup=main_menu_keyboard()
+                )
+                return
+            
+            except TelegramBadRequest as e:
+                # file_id больше не действителен: загружаем файл заново
+                logger.warning(f"file_id произведения {work_id} отклонен Telegram: {e}")
+                await telegram_files.invalidate(work_id)
         
-        # Скачиваем файл во временную директорию
-        temp_dir = tempfile.gettempdir()
         safe_filename = sanitize_filename(f"{composer} - {work_title}.pdf")
-        temp_file_path = os.path.join(temp_dir, safe_filename)
         
         try:
-            session = await api_client._get_session()
-            async with session.get(download_url) as response:
-                if response.status == 200:
-                    async with aiofiles.open(temp_file_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            await f.write(chunk)
-                else:
+            # Файл читаем локально, если бот видит каталог библиотеки или файл есть в кеше PDF
+            library_file = await stat_library_file(settings.LIBRARY_ROOT, file_path)
+            if library_file:
+                local_path, stat = library_file
+                if stat.st_size > settings.get_max_file_size_bytes():
+                    raise FileTooLargeError(f"Файл {stat.st_size} байт")
+            else:
+                local_path = await pdf_cache.get(work_id, fingerprint)
+            
+            if local_path:
+                sent = await callback.message.answer_document(
+                    document=MappedInputFile(local_path, filename=safe_filename),
+                    caption=caption,
+                    reply_markup=main_menu_keyboard()
+                )
+            else:
+                sent = await send_from_backend(
+                    callback, file_path, user.jwt_token, work_id, fingerprint, safe_filename, caption
+                )
+                if sent is None:
                     await callback.message.edit_text(
                         "❌ Ошибка скачивания файла",
                         reply_markup=main_menu_keyboard()
                     )
                     return
-        
-        except Exception as e:
-            logger.error(f"Ошибка скачивания файла {file_path}: {e}")
-            await callback.message.edit_text(
-                "❌ Ошибка скачивания файла",
-                reply_markup=main_menu_keyboard()
-            )
-            return
-        
-        # Отправляем файл пользователю
-        try:
-            document = FSInputFile(temp_file_path, filename=safe_filename)
             
-            caption = f"🎵 <b>{work_title}</b>\n👨‍🎼 {composer}"
+            # Запоминаем file_id: следующие отправки обойдутся без загрузки
+            if sent.document:
+                await telegram_files.set(
+                    work_id, fingerprint,
+                    sent.document.file_id, sent.document.file_unique_id
+                )
             
-            await callback.message.answer_document(
-                document=document,
-                caption=caption,
-                reply_markup=main_menu_keyboard()
-            )
+            await db_manager.record_download(work_id)
             
             await callback.message.edit_text(
                 f"✅ Файл отправлен: <b>{work_title}</b>",
                 reply_markup=main_menu_keyboard()
             )
-            
+        
+        except FileTooLargeError as e:
+            logger.warning(f"Файл {file_path} превышает MAX_FILE_SIZE: {e}")
+            await callback.message.edit_text(
+                f"❌ Файл слишком большой (максимум {settings.MAX_FILE_SIZE})",
+                reply_markup=main_menu_keyboard()
+            )
         except Exception as e:
-            logger.error(f"Ошибка отправки файла {safe_filename}: {e}")
+            logger.error(f"Ошибка отправки файла {file_path}: {e}")
             await callback.message.edit_text(
                 "❌ Ошибка отправки файла",
                 reply_markup=main_menu_keyboard()
             )
-        finally:
-            # Удаляем временный файл
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
         
     except (ValueError, IndexError) as e:
         logger.error(f"Ошибка парсинга work_id: {callback.data} | {e}")
@@ -121,6 +152,104 @@ async def download_work(callback: CallbackQuery, user: User):
         )
 
 
+async def send_from_backend(callback: CallbackQuery, file_path: str, jwt_token: Optional[str], work_id: int,
+                            fingerprint: Optional[str], filename: str, caption: str) -> Optional[Message]:
+    """Передача файла с Backend в Telegram с сохранением копии в кеш PDF.
+
+    Возвращает отправленное сообщение или None, если Backend не отдал файл.
+    Поток с Backend читается один раз, поэтому после 429 планировщик запрос
+    не повторяет: файл отправляется заново после retry_after - из кеша PDF,
+    если копию успел сохранить другой запрос, иначе новым потоком.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await stream_from_backend(callback, file_path, jwt_token, work_id,
+                                             fingerprint, filename, caption)
+        except TelegramRetryAfter as e:
+            attempt += 1
+            if attempt > settings.TELEGRAM_MAX_RETRIES:
+                raise
+            logger.warning(f"Flood control при загрузке файла {file_path}, отправка заново через {e.retry_after}с")
+            await asyncio.sleep(e.retry_after)
+        
+        cached_path = await pdf_cache.get(work_id, fingerprint)
+        if cached_path:
+            return await callback.message.answer_document(
+                document=MappedInputFile(cached_path, filename=filename),
+                caption=caption,
+                reply_markup=main_menu_keyboard()
+            )
+
+
+async def stream_from_backend(callback: CallbackQuery, file_path: str, jwt_token: Optional[str], work_id: int,
+                              fingerprint: Optional[str], filename: str, caption: str) -> Optional[Message]:
+    """Одна передача файла с Backend в Telegram (без повторов после 429)"""
+    max_size = settings.get_max_file_size_bytes()
+    
+    # Длительность передачи зависит от скорости загрузки в Telegram: общего таймаута у потока нет
+    async with api_client.stream_file(file_path, jwt_token) as response:
+        if response is None:
+            return None
+        
+        # Размер проверяем до передачи тела файла
+        if response.content_length is not None and response.content_length > max_size:
+            raise FileTooLargeError(f"Файл {response.content_length} байт")
+        
+        if response.content_length is None:
+            return await send_spooled(callback, response, work_id, fingerprint,
+                                      filename, caption, max_size)
+        
+        # Размер известен: тело ответа сразу уходит в загрузку Telegram,
+        # попутно записываясь в кеш PDF
+        writer = pdf_cache.open_writer(work_id, fingerprint)
+        try:
+            sent = await callback.message.answer_document(
+                document=BackendStreamFile(response, filename=filename, sink=writer),
+                caption=caption,
+                reply_markup=main_menu_keyboard()
+            )
+        except BaseException:
+            if writer:
+                await writer.abort()
+            raise
+    
+    if writer:
+        if writer.size == response.content_length:
+            await writer.commit()
+        else:
+            await writer.abort()
+    
+    return sent
+
+
+async def send_spooled(callback: CallbackQuery, response: aiohttp.ClientResponse, work_id: int,
+                       fingerprint: Optional[str], filename: str, caption: str, max_size: int) -> Message:
+    """Отправка файла неизвестного размера через временный файл с уникальным именем"""
+    
+    temp_dir = pdf_cache.tmp_dir if pdf_cache.ready else None
+    temp_file_path = await spool_to_temp(response, max_size, suffix=".pdf", directory=temp_dir)
+    
+    try:
+        # Готовый файл переносим в кеш PDF, если он включен
+        cached_path = await pdf_cache.put_file(work_id, fingerprint, temp_file_path)
+        if cached_path:
+            temp_file_path = None
+        
+        return await callback.message.answer_document(
+            document=FSInputFile(cached_path or temp_file_path, filename=filename),
+            caption=caption,
+            reply_markup=main_menu_keyboard()
+        )
+    finally:
+        # Удаляем временный файл
+        if temp_file_path:
+            try:
+                os.unlink(temp_file_path)
+            except OSError:
+                pass
+
+
 @router.callback_query(F.data.startswith("thumbnail_"))
 async def get_thumbnail(callback: CallbackQuery, user: User):
     """Получение миниатюры произведения"""
@@ -0,0 +1,243 @@
+"""
+Обработчики inline-режима (@bot запрос)
+"""
+
+import asyncio
+import hashlib
+import time
+from html import escape
+from typing import Dict, Any, List, Optional, Tuple
+
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from loguru import logger
+
+from config.settings import settings
+from services.api_client import api_client
+from services.cache_service import LRUCache, normalize_query
+from services.terms_index import terms_service
+from utils.formatters import format_term_info, truncate_text
+
+router = Router()
+
+# Результатов на одну страницу inline-выдачи
+PAGE_SIZE = 10
+
+# Результаты по нормализованному запросу (каждый префикс, набранный пользователем):
+# (результаты, полны ли они - Backend не обрезал выдачу по лимиту)
+_results_cache = LRUCache(maxsize=settings.INLINE_CACHE_SIZE, ttl=settings.INLINE_CACHE_TTL)
+
+# Последний inline-запрос каждого пользователя (для подавления промежуточных нажатий)
+_latest_queries = LRUCache(maxsize=10000, ttl=60)
+
+# Загрузки, которые продолжаются после истечения дедлайна ответа
+_pending: Dict[str, asyncio.Task] = {}
+
+
+def _result_id(kind: str, value: str) -> str:
+    """Уникальный id результата (не длиннее 64 байт)"""
+    digest = hashlib.sha1(value.encode("utf-8")).hexdigest()[:20]
+    return f"{kind}:{digest}"
+
+
+def _build_items(suggestions: List[Dict[str, Any]], terms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Объединение подсказок Backend и терминов в плоский список результатов"""
+    items: List[Dict[str, Any]] = []
+    seen = set()
+
+    for suggestion in suggestions:
+        value = str(suggestion.get("value") or "").strip()
+        kind = suggestion.get("type", "work")
+        count = suggestion.get("count", 0)
+        if not value or (kind, value) in seen:
+            continue
+        seen.add((kind, value))
+        safe_value = escape(value)
+        match = normalize_query(value)
+
+        if kind == "composer":
+            items.append({
+                "id": _result_id("composer", value),
+                "title": f"👨‍🎼 {value}",
+                "description": f"Композитор · произведений: {count}",
+                "text": f"👨‍🎼 <b>{safe_value}</b>\n🎵 Произведений: {count}\n\n🔍 <code>/composer {safe_value}</code>",
+                "match": match
+            })
+        elif kind == "category":
+            items.append({
+                "id": _result_id("category", value),
+                "title": f"📂 {value}",
+                "description": f"Категория · произведений: {count}",
+                "text": f"📂 <b>{safe_value}</b>\n🎵 Произведений: {count}",
+                "match": match
+            })
+        else:
+            items.append({
+                "id": _result_id("work", value),
+                "title": f"🎵 {value}",
+                "description": "Произведение",
+                "text": f"🎵 <b>{safe_value}</b>\n\n🔍 <code>/search {safe_value}</code>",
+                "match": match
+            })
+
+    for term in terms:
+        name = str(term.get("term") or "").strip()
+        if not name or ("term", name) in seen:
+            continue
+        seen.add(("term", name))
+
+        items.append({
+            "id": _result_id("term", f"{term.get('id', '')}:{name}"),
+            "title": f"📚 {name}",
+            "description": str(term.get("definition") or "")[:100],
+            "text": truncate_text(format_term_info(term)),
+            "match": normalize_query(f"{name} {term.get('definition') or ''}")
+        })
+
+    return items
+
+
+async def _fetch_items(query: str) -> Optional[List[Dict[str, Any]]]:
+    """Загрузка результатов с Backend и сохранение в кеш префиксов"""
+    suggestions_response, terms_response = await asyncio.gather(
+        api_client.get_search_suggestions(query, "all", limit=settings.INLINE_MAX_RESULTS),
+        terms_service.search(query, limit=PAGE_SIZE)
+    )
+
+    if (not suggestions_response or suggestions_response.get("error")) and \
+            (not terms_response or terms_response.get("error")):
+        return None
+
+    suggestions = []
+    if suggestions_response and not suggestions_response.get("error"):
+        suggestions = suggestions_response.get("suggestions", [])
+
+    terms = []
+    if terms_response and not terms_response.get("error"):
+        terms = terms_response.get("terms", terms_response.get("data", []))
+
+    items = _build_items(suggestions, terms)
+    complete = len(suggestions) < settings.INLINE_MAX_RESULTS and len(terms) < PAGE_SIZE
+    _results_cache.set(normalize_query(query), (items, complete))
+    return items
+
+
+def _start_fetch(query: str) -> asyncio.Task:
+    """Одна загрузка на запрос, даже если ответ не уложился в дедлайн"""
+    key = normalize_query(query)
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_items(query))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    return task
+
+
+def _from_prefix(query: str) -> Optional[List[Dict[str, Any]]]:
+    """Результаты более короткого запроса из кеша, отфильтрованные по продолжению.
+
+    Пользователь дописывает запрос: выдача по "моца" уже содержит все, что
+    найдется по "моцар". Полная выдача префикса отфильтрованная сохраняется
+    в кеш как есть; обрезанная по лимиту отдается сразу, а полная загружается
+    в фоне к следующим нажатиям и страницам.
+    """
+    key = normalize_query(query)
+    for length in range(len(key) - 1, 1, -1):
+        cached: Optional[Tuple[List[Dict[str, Any]], bool]] = _results_cache.get(key[:length])
+        if cached is None:
+            continue
+
+        items, complete = cached
+        filtered = [item for item in items if key in item["match"]]
+        if not filtered:
+            return None
+        if complete:
+            _results_cache.set(key, (filtered, True))
+        else:
+            _start_fetch(query)
+        return filtered
+    return None
+
+
+async def _get_items(query: str, deadline: float) -> Optional[List[Dict[str, Any]]]:
+    """Результаты из кеша или с Backend не позже deadline (time.monotonic)"""
+    cached = _results_cache.get(normalize_query(query))
+    if cached is not None:
+        return cached[0]
+
+    task = _start_fetch(query)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        # Загрузка продолжится в фоне и попадет в кеш к следующему нажатию
+        logger.debug(f"Inline-запрос '{query}' не уложился в дедлайн")
+        return None
+
+
+def _to_articles(items: List[Dict[str, Any]]) -> List[InlineQueryResultArticle]:
+    """Преобразование результатов в статьи inline-выдачи"""
+    return [
+        InlineQueryResultArticle(
+            id=item["id"],
+            title=item["title"][:64],
+            description=item["description"],
+            input_message_content=InputTextMessageContent(message_text=item["text"])
+        )
+        for item in items
+    ]
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery, received_at: Optional[float] = None):
+    """Inline-поиск по произведениям, композиторам и терминам"""
+
+    # Дедлайн ответа отсчитывается от поступления обновления и включает паузу debounce
+    deadline = (received_at or time.monotonic()) + settings.INLINE_DEADLINE
+    query = inline_query.query.strip()
+    user_id = inline_query.from_user.id
+
+    if len(query) < 2:
+        await inline_query.answer(
+            [],
+            cache_time=settings.INLINE_CACHE_TIME,
+            is_personal=False
+        )
+        return
+
+    try:
+        offset = int(inline_query.offset) if inline_query.offset else 0
+    except ValueError:
+        offset = 0
+
+    items = None
+    try:
+        if offset == 0 and _results_cache.get(normalize_query(query)) is None:
+            # Продолжение уже найденного запроса отдаем сразу, без паузы
+            items = _from_prefix(query)
+            if items is None:
+                # Иначе ждем паузу: промежуточные нажатия до Backend не доходят
+                _latest_queries.set(user_id, inline_query.id)
+                await asyncio.sleep(max(0.0, min(settings.INLINE_DEBOUNCE, deadline - time.monotonic())))
+                if _latest_queries.get(user_id) != inline_query.id:
+                    return
+
+        if items is None:
+            items = await _get_items(query, deadline)
+    except Exception as e:
+        logger.error(f"Ошибка inline-поиска '{query}': {e}")
+        items = None
+
+    if items is None:
+        # Пустой ответ не кешируем на стороне Telegram
+        await inline_query.answer([], cache_time=0, is_personal=False)
+        return
+
+    page = items[offset:offset + PAGE_SIZE]
+    next_offset = str(offset + PAGE_SIZE) if offset + PAGE_SIZE < len(items) else ""
+
+    await inline_query.answer(
+        _to_articles(page),
+        cache_time=settings.INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset
+    )
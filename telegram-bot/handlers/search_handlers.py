@@ -2,13 +2,22 @@
 Обработчики поиска произведений и терминов
 """
 
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.exceptions import TelegramBadRequest
 from loguru import logger
 
+from config.settings import settings
 from models.user import User
 from services.api_client import api_client
+from services.search_sessions import search_sessions, SearchSession
+from services.search_fanout import search_everything, SOURCES
+from handlers.terms_handlers import search_specific_term
 from keyboards.inline import (
     search_type_keyboard, search_results_keyboard, 
     work_details_keyboard, main_menu_keyboard
@@ -16,12 +25,21 @@ from keyboards.inline import (
 from keyboards.reply import main_menu_reply
 from utils.formatters import (
     format_search_results, format_work_info, 
-    format_error_message, truncate_text
+    format_error_message, format_unified_results, truncate_text
 )
 from utils.validators import validate_search_query, clean_search_query
 
 router = Router()
 
+# Кнопки основного меню, которые не считаются поисковым запросом
+MENU_BUTTONS = ["🔍 Поиск", "📚 Термины", "📁 Коллекции", "📂 Категории", 
+                "👤 Профиль", "⚙️ Настройки", "❌ Отмена"]
+
+
+class SearchStates(StatesGroup):
+    """Состояния поиска"""
+    waiting_for_query = State()
+
 
 # Команда /search
 @router.message(Command("search"))
@@ -75,10 +93,10 @@ async def search_works_button(event, user: User):
 
 # Обработчик поиска по типу
 @router.callback_query(F.data.startswith("search_type_"))
-async def search_by_type(callback: CallbackQuery, user: User):
+async def search_by_type(callback: CallbackQuery, state: FSMContext, user: User):
     """Обработчик поиска по типу"""
     
-    search_type = callback.data.split("_")[-1]
+    search_type = callback.data[len("search_type_"):]
     
     type_descriptions = {
         "works": "🎵 <b>Поиск произведений</b>\n\nВведите название произведения или композитора:",
@@ -92,8 +110,31 @@ async def search_by_type(callback: CallbackQuery, user: User):
     await callback.answer()
     await callback.message.edit_text(text)
     
-    # Сохраняем тип поиска в состояние пользователя (можно использовать FSM)
-    # Для простоты пока обрабатываем все типы одинаково
+    # Следующее сообщение пользователя ищем только в выбранном источнике
+    await state.set_state(SearchStates.waiting_for_query)
+    await state.update_data(search_type=search_type)
+
+
+# Запрос после выбора типа поиска
+@router.message(StateFilter(SearchStates.waiting_for_query), F.text.regexp(r'^[^/].*'))
+async def typed_search(message: Message, state: FSMContext, user: User):
+    """Поиск в источнике, выбранном кнопкой типа поиска"""
+    
+    data = await state.get_data()
+    await state.clear()
+    
+    if message.text in MENU_BUTTONS:
+        return  # Пропускаем обработку кнопок меню
+    
+    query = message.text.strip()
+    
+    # Валидация запроса
+    is_valid, error_msg = validate_search_query(query)
+    if not is_valid:
+        await message.answer(f"❌ {error_msg}")
+        return
+    
+    await run_search(message, query, user, data.get("search_type", "all"))
 
 
 # Универсальный поиск по тексту сообщения
@@ -102,8 +143,7 @@ async def universal_search(message: Message, user: User):
     """Универсальный поиск по тексту сообщения"""
     
     # Проверяем, не является ли сообщение кнопкой меню
-    if message.text in ["🔍 Поиск", "📚 Термины", "📁 Коллекции", "📂 Категории", 
-                       "👤 Профиль", "⚙️ Настройки", "❌ Отмена"]:
+    if message.text in MENU_BUTTONS:
         return  # Пропускаем обработку кнопок меню
     
     query = message.text.strip()
@@ -114,10 +154,110 @@ async def universal_search(message: Message, user: User):
         await message.answer(f"❌ {error_msg}")
         return
     
-    await perform_search(message, query, user)
+    await run_search(message, query, user, user.default_search_type)
+
+
+async def run_search(message: Message, query: str, user: User, search_type: str = "all"):
+    """Поиск в выбранном источнике или сразу во всех"""
+    
+    if search_type == "works":
+        await perform_search(message, query, user)
+    elif search_type == "terms":
+        await search_specific_term(message, query, user)
+    elif search_type in SOURCES:
+        await perform_unified_search(message, query, user, sources=(search_type,))
+    else:
+        await perform_unified_search(message, query, user)
+
+
+async def perform_unified_search(message: Message, query: str, user: User, sources=SOURCES):
+    """Параллельный поиск по источникам с показом результатов по мере ответов.
+
+    Сообщение загрузки редактируется после ответа каждого источника, так что
+    пользователь ждет самый быстрый источник, а не сумму всех запросов.
+    Источники, не успевшие за SEARCH_FANOUT_DEADLINE, помечаются как загружающиеся.
+    """
+    
+    clean_query = clean_search_query(query)
+    per_page = user.items_per_page
+    
+    loading_msg = await message.answer("🔍 Ищу...")
+    
+    # Правки сообщения по очереди и без повторов одного и того же текста
+    edit_lock = asyncio.Lock()
+    shown = {"text": None}
+    
+    async def render(results, final: bool = False):
+        works = results.get("works")
+        session = works.session if works else None
+        page_works = session.results[:per_page] if session else []
+        
+        text = truncate_text(format_unified_results(query, results, page_works, final=final))
+        if session and page_works:
+            keyboard = search_results_keyboard(
+                results=page_works,
+                page=1,
+                total_pages=session.total_pages(per_page),
+                session_id=session.id
+            )
+        else:
+            keyboard = search_type_keyboard() if final else None
+        
+        async with edit_lock:
+            if text == shown["text"] and not final:
+                return
+            try:
+                await loading_msg.edit_text(text, reply_markup=keyboard)
+            except TelegramBadRequest as e:
+                # "message is not modified" - текст уже актуален
+                if "not modified" not in str(e):
+                    raise
+            shown["text"] = text
+    
+    try:
+        results = await search_everything(
+            clean_query,
+            jwt_token=user.jwt_token,
+            deadline=settings.SEARCH_FANOUT_DEADLINE,
+            on_update=render,
+            sources=sources
+        )
+        await render(results, final=True)
+        
+    except Exception as e:
+        logger.error(f"Ошибка общего поиска для запроса '{query}': {e}")
+        await loading_msg.edit_text(
+            "❌ Произошла ошибка при поиске. Попробуйте позже.",
+            reply_markup=main_menu_keyboard()
+        )
 
 
-async def perform_search(message: Message, query: str, user: User, page: int = 1):
+async def render_search_page(session: SearchSession, page: int, user: User):
+    """Текст и клавиатура страницы результатов из сессии поиска"""
+    
+    per_page = user.items_per_page
+    results = await search_sessions.get_page(session, page, per_page, user.jwt_token)
+    
+    # Оценка числа страниц от Backend могла оказаться завышенной
+    total_pages = session.total_pages(per_page)
+    if not results and page > total_pages:
+        page = total_pages
+        results = await search_sessions.get_page(session, page, per_page, user.jwt_token)
+    
+    results_text = format_search_results(results, session.query, page, session.total)
+    results_text = truncate_text(results_text)
+    
+    keyboard = search_results_keyboard(
+        results=results,
+        page=page,
+        total_pages=total_pages,
+        session_id=session.id
+    )
+    
+    return results_text, keyboard
+
+
+async def perform_search(message: Message, query: str, user: User):
     """Выполнение поиска произведений"""
     
     # Очищаем и подготавливаем запрос
@@ -127,25 +267,13 @@ async def perform_search(message: Message, query: str, user: User, page: int = 1
     loading_msg = await message.answer("🔍 Ищу произведения...")
     
     try:
-        # Используем умный поиск если доступен
-        response = await api_client.smart_search_works(
-            query=clean_query,
-            page=page,
-            limit=user.items_per_page,
-            jwt_token=user.jwt_token
-        )
+        # Один запрос к Backend на весь поиск: дальше листаем снимок
+        session, error = await search_sessions.create(clean_query, user.jwt_token)
         
-        if not response:
-            await loading_msg.edit_text(
-                "❌ Ошибка соединения с сервером",
-                reply_markup=main_menu_keyboard()
-            )
-            return
-        
-        if response.get("error"):
+        if error:
             error_text = format_error_message(
-                response.get("error", "unknown"),
-                response.get("message", "")
+                error.get("error", "unknown"),
+                error.get("message", "")
             )
             await loading_msg.edit_text(
                 error_text,
@@ -153,13 +281,7 @@ async def perform_search(message: Message, query: str, user: User, page: int = 1
             )
             return
         
-        # Обрабатываем результаты
-        results = response.get("results", [])
-        total = response.get("total", 0)
-        current_page = response.get("pagination", {}).get("page", page)
-        total_pages = response.get("pagination", {}).get("total_pages", 1)
-        
-        if not results:
+        if not session.results:
             await loading_msg.edit_text(
                 f"🔍 По запросу <b>'{query}'</b> ничего не найдено.\n\n"
                 "💡 Попробуйте:\n"
@@ -170,17 +292,7 @@ async def perform_search(message: Message, query: str, user: User, page: int = 1
             )
             return
         
-        # Форматируем результаты
-        results_text = format_search_results(results, query, current_page, total)
-        results_text = truncate_text(results_text)
-        
-        # Создаем клавиатуру с результатами
-        keyboard = search_results_keyboard(
-            results=results,
-            page=current_page,
-            total_pages=total_pages,
-            search_query=query
-        )
+        results_text, keyboard = await render_search_page(session, 1, user)
         
         await loading_msg.edit_text(
             results_text,
@@ -195,62 +307,61 @@ async def perform_search(message: Message, query: str, user: User, page: int = 1
         )
 
 
+async def search_session_expired(callback: CallbackQuery):
+    """Сообщение об истекшей сессии поиска"""
+    
+    await callback.message.edit_text(
+        "⌛ <b>Результаты поиска устарели</b>\n\n"
+        "Введите запрос еще раз:",
+        reply_markup=search_type_keyboard()
+    )
+
+
 # Обработчик пагинации результатов поиска
 @router.callback_query(F.data.startswith("search_page_"))
 async def search_pagination(callback: CallbackQuery, user: User):
     """Обработчик пагинации результатов поиска"""
     
     try:
-        parts = callback.data.split("_")
-        page = int(parts[2])
-        query = "_".join(parts[3:])  # Восстанавливаем запрос
-        
-        await callback.answer()
-        
-        # Выполняем поиск для новой страницы
-        await perform_search_callback(callback, query, user, page)
-        
-    except (ValueError, IndexError) as e:
+        _, _, session_id, page = callback.data.split("_")
+        page = max(1, int(page))
+    except ValueError as e:
         logger.error(f"Ошибка парсинга callback данных: {callback.data} | {e}")
         await callback.answer("❌ Ошибка навигации")
+        return
+    
+    await callback.answer()
+    
+    session = search_sessions.get(session_id)
+    if not session:
+        await search_session_expired(callback)
+        return
+    
+    await show_search_page(callback, session, page, user)
 
 
-async def perform_search_callback(callback: CallbackQuery, query: str, user: User, page: int = 1):
-    """Выполнение поиска для callback запроса"""
+# Обработчик возврата к результатам поиска из карточки произведения
+@router.callback_query(F.data.startswith("search_back_"))
+async def search_back(callback: CallbackQuery, user: User):
+    """Обработчик возврата к последней просмотренной странице результатов"""
+    
+    session_id = callback.data[len("search_back_"):]
+    
+    await callback.answer()
+    
+    session = search_sessions.get(session_id)
+    if not session:
+        await search_session_expired(callback)
+        return
+    
+    await show_search_page(callback, session, session.page, user)
+
+
+async def show_search_page(callback: CallbackQuery, session: SearchSession, page: int, user: User):
+    """Показ страницы результатов из сессии поиска"""
     
     try:
-        # Используем умный поиск
-        response = await api_client.smart_search_works(
-            query=query,
-            page=page,
-            limit=user.items_per_page,
-            jwt_token=user.jwt_token
-        )
-        
-        if not response or response.get("error"):
-            await callback.message.edit_text(
-                "❌ Ошибка при загрузке результатов",
-                reply_markup=main_menu_keyboard()
-            )
-            return
-        
-        # Обрабатываем результаты
-        results = response.get("results", [])
-        total = response.get("total", 0)
-        current_page = response.get("pagination", {}).get("page", page)
-        total_pages = response.get("pagination", {}).get("total_pages", 1)
-        
-        # Форматируем результаты
-        results_text = format_search_results(results, query, current_page, total)
-        results_text = truncate_text(results_text)
-        
-        # Создаем клавиатуру с результатами
-        keyboard = search_results_keyboard(
-            results=results,
-            page=current_page,
-            total_pages=total_pages,
-            search_query=query
-        )
+        results_text, keyboard = await render_search_page(session, page, user)
         
         await callback.message.edit_text(
             results_text,
@@ -258,7 +369,7 @@ async def perform_search_callback(callback: CallbackQuery, query: str, user: Use
         )
         
     except Exception as e:
-        logger.error(f"Ошибка поиска в callback для запроса '{query}': {e}")
+        logger.error(f"Ошибка показа результатов для запроса '{session.query}': {e}")
         await callback.message.edit_text(
             "❌ Произошла ошибка при поиске",
             reply_markup=main_menu_keyboard()
@@ -271,33 +382,40 @@ async def work_details(callback: CallbackQuery, user: User):
     """Обработчик просмотра деталей произведения"""
     
     try:
-        work_id = int(callback.data.split("_")[-1])
+        parts = callback.data.split("_")
+        work_id = int(parts[2])
+        session_id = parts[3] if len(parts) > 3 else None
         
         await callback.answer()
         
-        # Показываем индикатор загрузки
-        await callback.message.edit_text("🔄 Загружаю информацию о произведении...")
-        
-        # Получаем информацию о произведении
-        response = await api_client.get_work_by_id(work_id, user.jwt_token)
-        
-        if not response or response.get("error"):
-            await callback.message.edit_text(
-                "❌ Произведение не найдено",
-                reply_markup=main_menu_keyboard()
-            )
-            return
-        
-        work_data = response
-        if "data" in response:
-            work_data = response["data"]
+        # Карточку из снимка поиска показываем без обращения к Backend
+        session = search_sessions.get(session_id) if session_id else None
+        work_data = session.get_work(work_id) if session else None
+        
+        if work_data is None:
+            # Показываем индикатор загрузки
+            await callback.message.edit_text("🔄 Загружаю информацию о произведении...")
+            
+            # Получаем информацию о произведении
+            response = await api_client.get_work_by_id(work_id, user.jwt_token)
+            
+            if not response or response.get("error"):
+                await callback.message.edit_text(
+                    "❌ Произведение не найдено",
+                    reply_markup=main_menu_keyboard()
+                )
+                return
+            
+            work_data = response
+            if "data" in response:
+                work_data = response["data"]
         
         # Форматируем информацию о произведении
         work_text = format_work_info(work_data, show_full=True)
         work_text = truncate_text(work_text)
         
         # Создаем клавиатуру с действиями
-        keyboard = work_details_keyboard(work_id)
+        keyboard = work_details_keyboard(work_id, session_id=session.id if session else None)
         
         await callback.message.edit_text(
             work_text,
@@ -366,23 +484,16 @@ async def search_composer_works(message: Message, composer_name: str, user: User
     
     try:
         # Поиск произведений композитора
-        response = await api_client.smart_search_works(
-            query=composer_name,
-            page=1,
-            limit=user.items_per_page,
-            jwt_token=user.jwt_token
-        )
+        session, error = await search_sessions.create(composer_name, user.jwt_token)
         
-        if not response or response.get("error"):
+        if error:
             await loading_msg.edit_text(
                 f"❌ Произведения композитора '{composer_name}' не найдены",
                 reply_markup=main_menu_keyboard()
             )
             return
         
-        results = response.get("results", [])
-        
-        if not results:
+        if not session.results:
             await loading_msg.edit_text(
                 f"🔍 Произведения композитора <b>{composer_name}</b> не найдены.\n\n"
                 "💡 Попробуйте:\n"
@@ -393,16 +504,7 @@ async def search_composer_works(message: Message, composer_name: str, user: User
             )
             return
         
-        # Форматируем результаты
-        results_text = format_search_results(results, f"Композитор: {composer_name}", 1, len(results))
-        results_text = truncate_text(results_text)
-        
-        keyboard = search_results_keyboard(
-            results=results,
-            page=1,
-            total_pages=1,
-            search_query=composer_name
-        )
+        results_text, keyboard = await render_search_page(session, 1, user)
         
         await loading_msg.edit_text(
             results_text,
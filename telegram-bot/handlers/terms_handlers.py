@@ -8,7 +8,7 @@ from aiogram.filters import Command
 from loguru import logger
 
 from models.user import User
-from services.api_client import api_client
+from services.terms_index import terms_service
 from keyboards.inline import main_menu_keyboard, search_type_keyboard
 from utils.formatters import format_term_info, format_error_message
 
@@ -58,10 +58,9 @@ async def search_specific_term(message: Message, term: str, user: User):
     loading_msg = await message.answer(f"📚 Ищу термин '{term}'...")
     
     try:
-        # Поиск термина через API
-        response = await api_client.search_terms(
+        # Поиск по локальному словарю (Backend - если словарь не загружен)
+        response = await terms_service.search(
             query=term,
-            page=1,
             limit=5,
             jwt_token=user.jwt_token
         )
@@ -73,7 +72,7 @@ async def search_specific_term(message: Message, term: str, user: User):
             )
             return
         
-        terms = response.get("data", response.get("results", []))
+        terms = response.get("terms", response.get("data", []))
         
         if not terms:
             await loading_msg.edit_text(
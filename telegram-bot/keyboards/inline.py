@@ -68,7 +68,8 @@ def search_type_keyboard() -> InlineKeyboardMarkup:
 
 
 def work_details_keyboard(work_id: int, in_collection: bool = False, 
-                         collection_id: Optional[int] = None) -> InlineKeyboardMarkup:
+                         collection_id: Optional[int] = None,
+                         session_id: Optional[str] = None) -> InlineKeyboardMarkup:
     """Клавиатура для детальной информации о произведении"""
     
     buttons = []
@@ -104,7 +105,10 @@ def work_details_keyboard(work_id: int, in_collection: bool = False,
     
     # Навигация
     nav_row = [
-        InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_search")
+        InlineKeyboardButton(
+            text="🔙 Назад",
+            callback_data=f"search_back_{session_id}" if session_id else "back_to_search"
+        )
     ]
     buttons.append(nav_row)
     
@@ -112,8 +116,12 @@ def work_details_keyboard(work_id: int, in_collection: bool = False,
 
 
 def search_results_keyboard(results: List[Dict[str, Any]], page: int = 1, 
-                          total_pages: int = 1, search_query: str = "") -> InlineKeyboardMarkup:
-    """Клавиатура для результатов поиска"""
+                          total_pages: int = 1, session_id: str = "") -> InlineKeyboardMarkup:
+    """Клавиатура для результатов поиска.
+
+    В callback_data передается только короткий id сессии поиска, а не сам запрос
+    (лимит Telegram - 64 байта).
+    """
     
     buttons = []
     
@@ -134,7 +142,8 @@ def search_results_keyboard(results: List[Dict[str, Any]], page: int = 1,
                 
                 row.append(InlineKeyboardButton(
                     text=button_text,
-                    callback_data=f"work_details_{work_id}"
+                    callback_data=f"work_details_{work_id}_{session_id}" if session_id
+                    else f"work_details_{work_id}"
                 ))
         
         if row:
@@ -147,7 +156,7 @@ def search_results_keyboard(results: List[Dict[str, Any]], page: int = 1,
         if page > 1:
             nav_row.append(InlineKeyboardButton(
                 text="⬅️ Пред.", 
-                callback_data=f"search_page_{page-1}_{search_query}"
+                callback_data=f"search_page_{session_id}_{page-1}"
             ))
         
         nav_row.append(InlineKeyboardButton(
@@ -158,7 +167,7 @@ def search_results_keyboard(results: List[Dict[str, Any]], page: int = 1,
         if page < total_pages:
             nav_row.append(InlineKeyboardButton(
                 text="След. ➡️",
-                callback_data=f"search_page_{page+1}_{search_query}"
+                callback_data=f"search_page_{session_id}_{page+1}"
             ))
         
         buttons.append(nav_row)
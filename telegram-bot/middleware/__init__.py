@@ -4,5 +4,8 @@ Middleware для Telegram бота
 
 from .auth import AuthMiddleware
 from .logging import LoggingMiddleware
+from .scheduler import SchedulerMiddleware
+from .outbound import OutboundLimiter
+from .recorder import UpdateRecorder
 
-__all__ = ["AuthMiddleware", "LoggingMiddleware"]
\ No newline at end of file
+__all__ = ["AuthMiddleware", "LoggingMiddleware", "SchedulerMiddleware", "OutboundLimiter", "UpdateRecorder"]
\ No newline at end of file
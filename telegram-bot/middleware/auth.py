@@ -2,20 +2,52 @@
 Middleware для аутентификации пользователей
 """
 
+from dataclasses import dataclass
 from typing import Callable, Dict, Any, Awaitable, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User as TgUser
 from loguru import logger
 
 from models.user import User
+from config.settings import settings
 from config.database import db_manager
 from services.api_client import api_client
+from services.cache_service import LRUCache
+import base64
 import json
+import time
+
+
+def get_jwt_expiration(token: str) -> Optional[float]:
+    """Время истечения JWT (claim exp) без проверки подписи"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+@dataclass
+class CachedSession:
+    """Запись кеша сессий"""
+    user: User
+    verified_at: float = 0.0
 
 
 class AuthMiddleware(BaseMiddleware):
     """Middleware для обработки аутентификации пользователей"""
     
+    def __init__(self):
+        super().__init__()
+        # Кеш пользователей по telegram_id: обычные обновления не ходят ни в БД, ни в API
+        self._sessions = LRUCache(
+            maxsize=settings.SESSION_CACHE_SIZE,
+            ttl=settings.SESSION_CACHE_TTL
+        )
+    
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -31,12 +63,20 @@ class AuthMiddleware(BaseMiddleware):
             return await handler(event, data)
         
         try:
-            # Загружаем или создаем пользователя
-            user = await self._load_or_create_user(telegram_user)
+            cached: Optional[CachedSession] = self._sessions.get(telegram_user.id)
+            
+            if cached:
+                user = cached.user
+                user.update_from_telegram_user(telegram_user)
+            else:
+                # Загружаем или создаем пользователя
+                user = await self._load_or_create_user(telegram_user)
+                cached = CachedSession(user=user)
+                self._sessions.set(telegram_user.id, cached)
             
             # Проверяем аутентификацию
             if user.jwt_token:
-                await self._verify_authentication(user)
+                await self._check_authentication(cached)
             
             # Добавляем пользователя в данные
             data["user"] = user
@@ -85,16 +125,42 @@ class AuthMiddleware(BaseMiddleware):
         
         return user
     
-    async def _verify_authentication(self, user: User) -> None:
-        """Проверка действительности аутентификации"""
+    async def _check_authentication(self, cached: CachedSession) -> None:
+        """Локальная проверка токена с периодической сверкой через Backend"""
         
-        if not user.jwt_token:
+        user = cached.user
+        
+        # Истечение токена проверяем локально по claim exp
+        expires_at = get_jwt_expiration(user.jwt_token)
+        if expires_at is not None and expires_at <= time.time():
+            logger.info(f"Истек токен пользователя {user.telegram_id}")
+            await self._clear_authentication(user)
             return
         
+        if cached.verified_at and time.monotonic() - cached.verified_at < settings.TOKEN_VERIFY_INTERVAL:
+            return
+        
+        if await self._verify_authentication(user):
+            cached.verified_at = time.monotonic()
+    
+    async def _verify_authentication(self, user: User) -> bool:
+        """Проверка действительности аутентификации через Backend.
+        
+        Возвращает True, если получен окончательный ответ (токен действителен или отозван).
+        """
+        
+        if not user.jwt_token:
+            return True
+        
         try:
             # Проверяем токен через API
             response = await api_client.verify_token(user.jwt_token)
             
+            if response and response.get("error") in ("connection_error", "timeout"):
+                # Backend временно недоступен: сохраняем текущее состояние и повторим позже
+                logger.warning(f"Не удалось проверить токен для {user.telegram_id}: Backend недоступен")
+                return False
+            
             if response and not response.get("error"):
                 # Токен действителен, обновляем данные пользователя
                 user_info = response.get("user", {})
@@ -112,11 +178,14 @@ class AuthMiddleware(BaseMiddleware):
                 # Токен недействителен
                 logger.info(f"Недействительный токен для пользователя {user.telegram_id}")
                 await self._clear_authentication(user)
+            
+            return True
                 
         except Exception as e:
             logger.error(f"Ошибка проверки токена для {user.telegram_id}: {e}")
             # При ошибке проверки оставляем пользователя неаутентифицированным
             user.is_authenticated = False
+            return False
     
     async def _clear_authentication(self, user: User) -> None:
         """Очистка аутентификации пользователя"""
@@ -128,9 +197,14 @@ class AuthMiddleware(BaseMiddleware):
         user.role = None
         user.is_authenticated = False
         
-        # Удаляем сессию из БД
+        # Удаляем сессию из кеша и БД
+        self.invalidate_user(user.telegram_id)
         await db_manager.delete_user_session(user.telegram_id)
     
+    def invalidate_user(self, telegram_id: int) -> None:
+        """Удаление пользователя из кеша сессий"""
+        self._sessions.delete(telegram_id)
+    
     async def save_user_session(self, user: User) -> None:
         """Сохранение сессии пользователя"""
         
@@ -163,6 +237,9 @@ class AuthMiddleware(BaseMiddleware):
             }
             await db_manager.save_user_preferences(user.telegram_id, preferences)
             
+            # Токен только что выдан Backend, повторная проверка не нужна
+            self._sessions.set(user.telegram_id, CachedSession(user=user, verified_at=time.monotonic()))
+            
         except Exception as e:
             logger.error(f"Ошибка сохранения сессии пользователя {user.telegram_id}: {e}")
 
@@ -2,15 +2,33 @@
 Middleware для логирования запросов
 """
 
-from typing import Callable, Dict, Any, Awaitable
+from functools import partial
+from typing import Callable, Dict, Any, Awaitable, Optional, Tuple
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject, Update, Message, CallbackQuery
+from aiogram.types import TelegramObject, Update, Message, CallbackQuery, InlineQuery
 from loguru import logger
+import random
 import time
 
+from config.settings import settings
+from utils.metrics import handler_latency, handler_errors
+from utils.profiling import update_profiler
+
 
 class LoggingMiddleware(BaseMiddleware):
-    """Middleware для логирования входящих обновлений"""
+    """Middleware для логирования входящих обновлений.
+    
+    Строки о входящем обновлении и завершении обработки пишутся для доли
+    обновлений каждого типа (sample_rates, по умолчанию все), обе строки
+    одного обновления - вместе. Ошибки и обработка дольше slow_threshold
+    секунд записываются всегда. Описание события строится, только если
+    строка действительно попадет в лог.
+    """
+    
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, slow_threshold: float = 1.0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.slow_threshold = slow_threshold
     
     async def __call__(
         self,
@@ -19,29 +37,88 @@ class LoggingMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        # Определяем тип события и пользователя
-        event_info = self._get_event_info(event)
+        # Определяем тип события и попадет ли обновление в выборку
+        event_type = self._get_event_type(event)
+        rate = self.sample_rates.get(event_type, 1.0)
+        sampled = rate >= 1 or random.random() < rate
+        labels = self._handler_labels(data)
+        profile = update_profiler.begin()
+        describe = partial(self._get_event_info, event)
         
-        logger.info(f"Входящее обновление: {event_info}")
+        if sampled:
+            self._bind(event_type, labels, data).opt(lazy=True).info("Входящее обновление: {}", describe)
         
         try:
             # Выполняем обработчик
             result = await handler(event, data)
             
             # Вычисляем время обработки
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
+            handler_latency.observe(processing_time, *labels)
             
-            logger.info(f"Обработка завершена за {processing_time:.3f}с: {event_info}")
+            slow = processing_time >= self.slow_threshold
+            if sampled or slow:
+                self._bind(event_type, labels, data, processing_time).opt(lazy=True).log(
+                    "WARNING" if slow else "INFO",
+                    "Обработка завершена за {}с: {}", lambda: f"{processing_time:.3f}", describe
+                )
             
             return result
             
         except Exception as e:
             # Логируем ошибку
-            processing_time = time.time() - start_time
-            logger.error(f"Ошибка обработки ({processing_time:.3f}с): {event_info} | Ошибка: {e}")
+            processing_time = time.perf_counter() - start_time
+            handler_latency.observe(processing_time, *labels)
+            handler_errors.inc(*labels)
+            self._bind(event_type, labels, data, processing_time).error(
+                f"Ошибка обработки ({processing_time:.3f}с): {describe()} | Ошибка: {e}"
+            )
             raise
+        
+        finally:
+            # Профиль медленного обновления (если профилирование включено)
+            if profile is not None:
+                await update_profiler.finish(
+                    profile, time.perf_counter() - start_time, ".".join(labels), describe
+                )
+    
+    @staticmethod
+    def _handler_labels(data: Dict[str, Any]) -> Tuple[str, str]:
+        """Метки метрик: модуль роутера и имя функции обработчика"""
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        if callback is None:
+            return "unknown", "unknown"
+        return callback.__module__.rsplit(".", 1)[-1], getattr(callback, "__name__", "unknown")
+    
+    @staticmethod
+    def _bind(event_type: str, labels: Tuple[str, str], data: Dict[str, Any],
+              processing_time: Optional[float] = None):
+        """Поля структурированной записи (LOG_FORMAT=json)"""
+        telegram_user = data.get("event_from_user")
+        fields = {
+            "event_type": event_type,
+            "handler": ".".join(labels),
+            "user_id": telegram_user.id if telegram_user else None
+        }
+        if processing_time is not None:
+            fields["duration_ms"] = round(processing_time * 1000, 1)
+        return logger.bind(**fields)
+    
+    @staticmethod
+    def _get_event_type(event: TelegramObject) -> str:
+        """Тип события для выборки: message, callback_query, ..."""
+        if isinstance(event, Message):
+            return "message"
+        if isinstance(event, CallbackQuery):
+            return "callback_query"
+        if isinstance(event, InlineQuery):
+            return "inline_query"
+        if isinstance(event, Update):
+            return event.event_type
+        return type(event).__name__.lower()
     
     def _get_event_info(self, event: TelegramObject) -> str:
         """Получение информации о событии для логирования"""
@@ -53,7 +130,7 @@ class LoggingMiddleware(BaseMiddleware):
             elif event.callback_query:
                 return self._format_callback_info(event.callback_query)
             elif event.inline_query:
-                return f"InlineQuery from {event.inline_query.from_user.id}: '{event.inline_query.query}'"
+                return self._format_inline_info(event.inline_query)
             else:
                 return f"Update: {type(event).__name__}"
         
@@ -63,6 +140,9 @@ class LoggingMiddleware(BaseMiddleware):
         elif isinstance(event, CallbackQuery):
             return self._format_callback_info(event)
         
+        elif isinstance(event, InlineQuery):
+            return self._format_inline_info(event)
+        
         else:
             return f"Event: {type(event).__name__}"
     
@@ -102,7 +182,16 @@ class LoggingMiddleware(BaseMiddleware):
         callback_data = callback.data or "None"
         
         return f"Callback from {user_id}{username}: '{callback_data}'"
+    
+    def _format_inline_info(self, inline_query: InlineQuery) -> str:
+        """Форматирование информации об inline-запросе"""
+        
+        query = inline_query.query[:50] + "..." if len(inline_query.query) > 50 else inline_query.query
+        return f"InlineQuery from {inline_query.from_user.id}: '{query}'"
 
 
 # Глобальный экземпляр middleware
-logging_middleware = LoggingMiddleware()
\ No newline at end of file
+logging_middleware = LoggingMiddleware(
+    sample_rates=settings.LOG_SAMPLE_RATES,
+    slow_threshold=settings.LOG_SLOW_UPDATE_MS / 1000
+)
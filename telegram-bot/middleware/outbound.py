@@ -0,0 +1,269 @@
+"""
+Планировщик исходящих запросов к Telegram: лимиты отправки и flood control
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Hashable, Iterator, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response
+from aiogram.types import BufferedInputFile, FSInputFile, InputFile, URLInputFile
+from loguru import logger
+from pydantic import BaseModel
+
+from config.settings import settings
+from services.cache_service import LRUCache
+from services.file_transfer import MappedInputFile
+
+# Методы, на которые действуют лимиты отправки сообщений в чат
+LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+# Правки, которые можно заменить более новой правкой того же сообщения
+MERGEABLE_PREFIXES = ("editMessageText", "editMessageCaption", "editMessageReplyMarkup")
+
+# Файлы, которые при повторе запроса читаются заново с начала
+REPLAYABLE_FILES = (FSInputFile, BufferedInputFile, URLInputFile, MappedInputFile)
+
+
+def _input_files(value: Any) -> Iterator[InputFile]:
+    """Файлы загрузки в запросе, в том числе вложенные (sendMediaGroup)"""
+    if isinstance(value, InputFile):
+        yield value
+    elif isinstance(value, BaseModel):
+        for _, item in value:
+            yield from _input_files(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _input_files(item)
+
+
+def is_replayable(method: TelegramMethod) -> bool:
+    """Можно ли отправить запрос повторно: файлы в нем (если есть) читаются заново"""
+    return all(isinstance(file, REPLAYABLE_FILES) for file in _input_files(method))
+
+
+class TokenBucket:
+    """Корзина токенов: rate запросов в секунду, всплеск до capacity"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # До этого момента Telegram просил не отправлять (retry_after)
+        self.blocked_until = 0.0
+    
+    def delay(self, now: float) -> float:
+        """Сколько ждать до следующего токена (0 - можно отправлять)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self) -> None:
+        self.tokens -= 1
+    
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+@dataclass
+class PendingEdit:
+    """Правка сообщения в очереди"""
+    future: asyncio.Future
+    # Ответ более новой правки того же сообщения, которая заменила эту
+    superseded_by: Optional[asyncio.Future] = None
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Очередь исходящих запросов с лимитами Telegram.
+    
+    Запрос отправки или правки ждет токены общей корзины и корзины чата
+    (для групп лимит ниже). Ответ 429 выдерживается автоматически: чат
+    блокируется на retry_after, запрос повторяется. Запрос с файлом, который
+    нельзя прочитать второй раз (поток с Backend), не повторяется: 429
+    возвращается вызывающему, чтобы он отправил файл заново. Если пока правка ждала
+    очереди, пришла более новая правка того же сообщения, старая не
+    отправляется и получает результат новой.
+    """
+    
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 group_rate: float = 20 / 60, group_burst: float = 5, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._chats = LRUCache(maxsize=100000, ttl=600)
+        # Последняя ожидающая правка каждого сообщения
+        self._edits: Dict[Hashable, PendingEdit] = {}
+        self._latencies: "deque[float]" = deque(maxlen=1000)
+        self.queued = 0
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+    
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Группы и каналы (отрицательный id или @username) ограничены строже
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = TokenBucket(
+                self.group_rate if is_group else self.chat_rate,
+                self.group_burst if is_group else self.chat_burst
+            )
+            self._chats.set(chat_id, bucket)
+        return bucket
+    
+    @staticmethod
+    def _edit_key(method: TelegramMethod) -> Optional[Hashable]:
+        if not method.__api_method__.startswith(MERGEABLE_PREFIXES):
+            return None
+        return (
+            method.__api_method__,
+            getattr(method, "chat_id", None),
+            getattr(method, "message_id", None),
+            getattr(method, "inline_message_id", None)
+        )
+    
+    async def _acquire(self, buckets: List[TokenBucket], edit: Optional[PendingEdit]) -> bool:
+        """Ожидание токенов во всех корзинах. False - правку заменила более новая"""
+        while True:
+            if edit is not None and edit.superseded_by is not None:
+                return False
+            now = time.monotonic()
+            wait = max(bucket.delay(now) for bucket in buckets)
+            if wait <= 0:
+                for bucket in buckets:
+                    bucket.consume()
+                return True
+            await asyncio.sleep(wait)
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Response:
+        if not method.__api_method__.startswith(LIMITED_PREFIXES):
+            return await self._send(make_request, bot, method, None)
+        
+        chat_id = getattr(method, "chat_id", None)
+        buckets = [self.global_bucket]
+        if chat_id is not None:
+            buckets.append(self._chat_bucket(chat_id))
+        
+        key = self._edit_key(method)
+        edit: Optional[PendingEdit] = None
+        if key is not None:
+            edit = PendingEdit(future=asyncio.get_running_loop().create_future())
+            # Ответ нужен только замененным правкам; без них исключение никто не заберет
+            edit.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            previous = self._edits.get(key)
+            if previous is not None:
+                previous.superseded_by = edit.future
+                self.merged += 1
+            self._edits[key] = edit
+        
+        queued_at = time.monotonic()
+        self.queued += 1
+        try:
+            if await self._acquire(buckets, edit):
+                self._latencies.append(time.monotonic() - queued_at)
+                response = await self._send(make_request, bot, method, buckets[-1] if chat_id is not None else None)
+            else:
+                # Отправится более новая правка: отдаем ее результат
+                response = await asyncio.shield(edit.superseded_by)
+            if edit is not None:
+                edit.future.set_result(response)
+            return response
+        except Exception as e:
+            if edit is not None and not edit.future.done():
+                edit.future.set_exception(e)
+            raise
+        except BaseException:
+            if edit is not None and not edit.future.done():
+                edit.future.cancel()
+            raise
+        finally:
+            self.queued -= 1
+            if key is not None and self._edits.get(key) is edit:
+                del self._edits[key]
+    
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod,
+                    chat_bucket: Optional[TokenBucket]) -> Response:
+        """Отправка с повтором после 429"""
+        attempt = 0
+        while True:
+            try:
+                response = await make_request(bot, method)
+                self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                # Следующие запросы в чат ждут retry_after в очереди
+                (chat_bucket or self.global_bucket).block(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries or not is_replayable(method):
+                    raise
+                self.retries += 1
+                logger.warning(
+                    f"Flood control Telegram: {method.__api_method__} "
+                    f"в чате {getattr(method, 'chat_id', '-')}, ждем {e.retry_after}с"
+                )
+                await asyncio.sleep(e.retry_after)
+    
+    def stats(self) -> Dict[str, float]:
+        """Очередь и задержка в ней (секунды, по последним 1000 запросам)"""
+        latencies = sorted(self._latencies)
+        
+        def percentile(pct: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))]
+        
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "merged": self.merged,
+            "retries": self.retries,
+            "latency_p50": percentile(50),
+            "latency_p95": percentile(95),
+            "latency_max": latencies[-1] if latencies else 0.0
+        }
+
+
+_background: set = set()
+
+
+def fire_and_forget(request: Awaitable[Any]) -> asyncio.Task:
+    """Отправка без ожидания доставки: message.answer(...) и т.п. уходят в очередь,
+    обработчик продолжает работу. Ошибки доставки пишутся в лог"""
+    
+    async def deliver() -> None:
+        try:
+            await request
+        except Exception as e:
+            logger.error(f"Ошибка фоновой отправки в Telegram: {e}")
+    
+    task = asyncio.create_task(deliver())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+# Глобальный экземпляр планировщика. При нескольких процессах-обработчиках
+# общий лимит бота делится между ними
+outbound_limiter = OutboundLimiter(
+    global_rate=settings.TELEGRAM_GLOBAL_RATE / max(1, settings.BOT_WORKERS),
+    chat_rate=settings.TELEGRAM_CHAT_RATE,
+    chat_burst=settings.TELEGRAM_CHAT_BURST,
+    group_rate=settings.TELEGRAM_GROUP_RATE / 60,
+    group_burst=settings.TELEGRAM_GROUP_BURST,
+    max_retries=settings.TELEGRAM_MAX_RETRIES
+)
@@ -0,0 +1,173 @@
+"""
+Middleware записи входящих обновлений для воспроизведения нагрузки
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, Any, Awaitable, List, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+from config.settings import settings
+
+# Состояния FSM, в которых пользователь вводит пароль, имя или email: текст не записывается
+SENSITIVE_STATE_PREFIXES = ("AuthStates:",)
+
+# Поля пользователя и чата, которые не нужны для воспроизведения
+PERSONAL_FIELDS = ("first_name", "last_name", "username", "title", "phone_number", "bio", "is_premium")
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Запись обезличенных входящих обновлений в NDJSON (одна строка - одно обновление).
+    
+    Регистрируется первым outer middleware обновлений: записываются все
+    обновления в порядке поступления, в том числе повторные нажатия, которые
+    отбросит планировщик. Идентификаторы пользователей и чатов заменяются
+    стабильным хешем с солью (последовательность действий пользователя
+    сохраняется), имена удаляются, email в тексте маскируются, текст в
+    состояниях входа и регистрации не записывается. sample - доля
+    пользователей, обновления которых записываются целиком.
+    
+    Строки копятся в памяти и дописываются в файл раз в flush_interval
+    секунд одним вызовом write в режиме O_APPEND, поэтому несколько
+    процессов-обработчиков могут писать в один файл.
+    """
+    
+    def __init__(self, path: str, salt: str, sample: float = 1.0, flush_interval: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.salt = salt.encode()
+        self.sample = sample
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+    
+    def start(self) -> None:
+        if self._fd is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"📼 Запись входящих обновлений: {self.path} (доля пользователей {self.sample:g})")
+    
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._fd is not None:
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self) -> None:
+        if not self._buffer or self._fd is None:
+            return
+        chunk = "".join(self._buffer).encode()
+        self._buffer.clear()
+        try:
+            os.write(self._fd, chunk)
+        except OSError as e:
+            logger.error(f"Ошибка записи обновлений в {self.path}: {e}")
+    
+    def anonymize_id(self, value: int) -> int:
+        """Стабильная замена идентификатора (знак сохраняется: группы остаются группами)"""
+        digest = hashlib.blake2b(str(abs(value)).encode(), digest_size=6, key=self.salt[:64]).digest()
+        anonymized = int.from_bytes(digest, "big") or 1
+        return -anonymized if value < 0 else anonymized
+    
+    def _selected(self, user_id: Optional[int]) -> bool:
+        if self.sample >= 1 or user_id is None:
+            return self.sample >= 1
+        # Выборка по пользователю, а не по обновлению: его сценарии записываются целиком
+        return self.anonymize_id(user_id) % 10000 < self.sample * 10000
+    
+    def _anonymize(self, value: Any, redact_text: bool) -> Any:
+        if isinstance(value, list):
+            return [self._anonymize(item, redact_text) for item in value]
+        if not isinstance(value, dict):
+            return value
+        
+        result = {}
+        for key, item in value.items():
+            if key in PERSONAL_FIELDS:
+                continue
+            if key in ("from", "user", "chat", "sender_chat") and isinstance(item, dict):
+                item = {k: v for k, v in item.items() if k not in PERSONAL_FIELDS}
+                if isinstance(item.get("id"), int):
+                    item["id"] = self.anonymize_id(item["id"])
+                if "is_bot" in item:
+                    # Обязательное поле пользователя Telegram
+                    item["first_name"] = "User"
+                result[key] = item
+            elif key == "chat_instance":
+                result[key] = str(self.anonymize_id(int(item))) if str(item).lstrip("-").isdigit() else "0"
+            elif key in ("text", "caption", "query") and isinstance(item, str):
+                result[key] = "***" if redact_text else EMAIL_PATTERN.sub("user@example.com", item)
+            elif key == "entities" and redact_text:
+                # Разметка ссылалась на удаленный текст
+                continue
+            else:
+                result[key] = self._anonymize(item, redact_text)
+        return result
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        
+        if self._fd is not None and isinstance(event, Update):
+            telegram_user = data.get("event_from_user")
+            if self._selected(telegram_user.id if telegram_user else None):
+                try:
+                    await self._record(event, data)
+                except Exception as e:
+                    logger.error(f"Ошибка записи обновления {event.update_id}: {e}")
+        
+        return await handler(event, data)
+    
+    async def _record(self, event: Update, data: Dict[str, Any]) -> None:
+        redact_text = False
+        state = data.get("state")
+        if state is not None:
+            current = await state.get_state()
+            redact_text = bool(current) and current.startswith(SENSITIVE_STATE_PREFIXES)
+        
+        raw = event.model_dump(mode="json", by_alias=True, exclude_none=True)
+        callback = raw.get("callback_query")
+        if callback and callback.get("message"):
+            # Сообщение бота под кнопкой: для воспроизведения достаточно его идентификатора
+            message = callback["message"]
+            callback["message"] = {key: message[key] for key in ("message_id", "date", "chat", "from") if key in message}
+        record = {"ts": round(time.time(), 3), "update": self._anonymize(raw, redact_text)}
+        self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.recorded += 1
+
+
+# Глобальный экземпляр (запись включается непустым RECORD_UPDATES_FILE)
+update_recorder = UpdateRecorder(
+    path=settings.RECORD_UPDATES_FILE,
+    salt=settings.RECORD_UPDATES_SALT or settings.TELEGRAM_BOT_TOKEN,
+    sample=settings.RECORD_UPDATES_SAMPLE
+)
@@ -0,0 +1,152 @@
+"""
+Middleware планирования обработки обновлений
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, Any, Awaitable, List, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+from config.settings import settings
+from services.cache_service import LRUCache
+
+# Приоритеты обработки: нажатия кнопок и inline-запросы раньше новых текстовых поисков
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+
+
+class PrioritySemaphore:
+    """Семафор, отдающий освободившееся место ожидающему с наименьшим приоритетом"""
+    
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+    
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+    
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> None:
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Место уже выдано, но задачу отменили: возвращаем его
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+    
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Очередь обновлений каждого пользователя и общий лимит одновременных обработчиков.
+    
+    Сообщения и нажатия кнопок одного пользователя обрабатываются строго по
+    очереди: частые нажатия "След. ➡️" не запускают параллельные поиски и правки
+    одного сообщения. Повторное нажатие той же кнопки того же сообщения
+    в течение duplicate_window секунд отбрасывается. Inline-запросы в очередь
+    пользователя не попадают: у них свой debounce.
+    """
+    
+    def __init__(self, concurrency: int = 64, duplicate_window: float = 1.0):
+        super().__init__()
+        self.slots = PrioritySemaphore(concurrency)
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._user_waiters: Dict[int, int] = {}
+        self._recent_callbacks = LRUCache(maxsize=10000, ttl=duplicate_window) if duplicate_window > 0 else None
+        self.duplicates = 0
+        self.in_flight = 0
+    
+    @property
+    def active_users(self) -> int:
+        """Пользователей с обновлениями в обработке или в очереди"""
+        return len(self._user_locks)
+    
+    def _is_duplicate(self, event: Update) -> bool:
+        callback = event.callback_query
+        if callback is None or self._recent_callbacks is None:
+            return False
+        
+        message_id = callback.message.message_id if callback.message else callback.inline_message_id
+        key = (callback.from_user.id, message_id, callback.data)
+        if self._recent_callbacks.get(key):
+            return True
+        self._recent_callbacks.set(key, True)
+        return False
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        
+        # Момент поступления: от него считают дедлайн обработчики с ограничением времени ответа
+        data["received_at"] = time.monotonic()
+        
+        if self._is_duplicate(event):
+            self.duplicates += 1
+            logger.debug(f"Повторное нажатие отброшено: {event.callback_query.data}")
+            try:
+                await event.callback_query.answer()
+            except Exception:
+                pass
+            return None
+        
+        interactive = event.callback_query is not None or event.inline_query is not None
+        priority = PRIORITY_INTERACTIVE if interactive else PRIORITY_DEFAULT
+        
+        telegram_user = data.get("event_from_user")
+        if telegram_user is None or event.inline_query is not None:
+            return await self._run(handler, event, data, priority)
+        
+        user_id = telegram_user.id
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        self._user_waiters[user_id] = self._user_waiters.get(user_id, 0) + 1
+        
+        try:
+            async with lock:
+                return await self._run(handler, event, data, priority)
+        finally:
+            self._user_waiters[user_id] -= 1
+            if not self._user_waiters[user_id]:
+                del self._user_waiters[user_id]
+                del self._user_locks[user_id]
+    
+    async def _run(self, handler, event: Update, data: Dict[str, Any], priority: int) -> Any:
+        await self.slots.acquire(priority)
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+
+# Глобальный экземпляр middleware
+scheduler_middleware = SchedulerMiddleware(
+    concurrency=settings.SCHEDULER_CONCURRENCY,
+    duplicate_window=settings.SCHEDULER_DUPLICATE_WINDOW
+)
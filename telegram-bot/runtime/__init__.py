@@ -0,0 +1,15 @@
+"""
+Режимы запуска бота
+"""
+
+from .webhook import ConcurrentRequestHandler, create_app, run_webhook
+from .supervisor import HashRing, Supervisor, run_supervisor
+
+__all__ = [
+    "ConcurrentRequestHandler",
+    "create_app",
+    "run_webhook",
+    "HashRing",
+    "Supervisor",
+    "run_supervisor"
+]
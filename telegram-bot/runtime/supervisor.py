@@ -0,0 +1,420 @@
+"""
+Обработка обновлений в нескольких процессах: супервизор и процессы-обработчики
+"""
+
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import queue
+import signal
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from loguru import logger
+
+from config.settings import settings
+from utils import metrics
+from utils.profiling import loop_watchdog
+
+# Процессы запускаем через spawn: у каждого свой цикл событий, сессии HTTP и соединения с БД
+_mp = multiprocessing.get_context("spawn")
+
+
+class HashRing:
+    """Консистентное хеширование ключей на обработчики.
+
+    Каждый обработчик занимает replicas точек на кольце; ключ достается
+    ближайшей по часовой стрелке точке. При изменении числа обработчиков
+    переезжает только часть пользователей, а не почти все, как при key % n.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 160):
+        points = sorted(
+            (self._hash(f"{node}:{replica}"), node)
+            for node in range(nodes)
+            for replica in range(replicas)
+        )
+        self._hashes = [point[0] for point in points]
+        self._nodes = [point[1] for point in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get(self, key: Any) -> int:
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._nodes[index]
+
+
+def shard_key(update: Dict[str, Any]) -> Any:
+    """Ключ распределения: пользователь, иначе чат.
+
+    Все обновления одного пользователя попадают в один процесс и в порядке
+    поступления, а его сессии поиска и кеши процесса остаются на месте.
+    """
+    for field in ("message", "edited_message", "callback_query", "inline_query",
+                  "chosen_inline_result", "channel_post", "my_chat_member"):
+        event = update.get(field)
+        if not event:
+            continue
+        sender = event.get("from")
+        if sender and sender.get("id"):
+            return sender["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat.get("id")
+    return update.get("update_id", 0)
+
+
+def worker_main(index: int, workers: int, updates: "multiprocessing.Queue", taken, concurrency: int) -> None:
+    """Точка входа процесса-обработчика"""
+    # Остановкой управляет супервизор (через метку конца очереди)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, workers, updates, taken, concurrency))
+
+
+async def _worker_loop(index: int, workers: int, updates: "multiprocessing.Queue", taken, concurrency: int) -> None:
+    from bot import setup_logging, create_bot, create_dispatcher
+    from services.pdf_cache import pdf_cache
+
+    setup_logging()
+    # Свой каталог кеша PDF: индекс кеша в памяти процесса
+    pdf_cache.use_worker_dir(index, workers)
+    bot = create_bot()
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    logger.info(f"👷 Обработчик {index} запущен")
+
+    metrics_runner = None
+    if settings.METRICS_ENABLED:
+        metrics_runner = await metrics.start_metrics_server(
+            settings.METRICS_HOST, settings.METRICS_PORT + 1 + index
+        )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def process(update: Dict[str, Any]) -> None:
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.error(f"Обработчик {index}: ошибка обновления {update.get('update_id')}: {e}")
+        finally:
+            semaphore.release()
+
+    try:
+        while True:
+            update = await asyncio.to_thread(updates.get)
+            if update is None:
+                break
+            # Подтверждение супервизору: обновление взято из очереди (пишет только этот процесс)
+            taken.value += 1
+            await semaphore.acquire()
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        logger.info(f"👷 Обработчик {index} остановлен")
+
+
+class Worker:
+    """Процесс-обработчик и его очередь обновлений.
+
+    Отправленные в очередь обновления супервизор хранит у себя (pending),
+    пока процесс не подтвердит, что взял их: счетчик taken общий с процессом.
+    """
+
+    def __init__(self, index: int, workers: int, queue_size: int, concurrency: int):
+        self.index = index
+        self.workers = workers
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue = _mp.Queue(maxsize=queue_size)
+        self.taken = _mp.RawValue("Q", 0)
+        # Не взятые процессом обновления (не больше queue_size после trim)
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self._acknowledged = 0
+        self.process: Optional[multiprocessing.Process] = None
+        self.routed = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        self.process = _mp.Process(
+            target=worker_main,
+            args=(self.index, self.workers, self.queue, self.taken, self.concurrency),
+            name=f"bot-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+
+    def trim(self) -> None:
+        """Удаление из pending обновлений, которые процесс уже взял из очереди"""
+        taken = self.taken.value
+        while self._acknowledged < taken and self.pending:
+            self.pending.popleft()
+            self._acknowledged += 1
+
+    def send(self, update: Dict[str, Any]) -> bool:
+        """Передача обновления в очередь процесса. False - очередь заполнена"""
+        self.trim()
+        try:
+            self.queue.put_nowait(update)
+        except queue.Full:
+            return False
+        self.pending.append(update)
+        self.routed += 1
+        return True
+
+    def restart(self) -> None:
+        """Перезапуск упавшего процесса.
+
+        Процесс мог упасть, удерживая блокировку чтения очереди, поэтому
+        старую очередь не читаем: обновления, которые он не успел взять,
+        берем из pending и отправляем в новую очередь. Обновление, на котором
+        процесс упал, повторно не отправляется.
+        """
+        self.trim()
+        pending, self.pending = self.pending, deque()
+        old_queue = self.queue
+        self.queue = _mp.Queue(maxsize=self.queue_size)
+        self.taken = _mp.RawValue("Q", 0)
+        self._acknowledged = 0
+        old_queue.close()
+        old_queue.cancel_join_thread()
+
+        self.restarts += 1
+        self.start()
+
+        resent = 0
+        for update in pending:
+            if not self.send(update):
+                break
+            resent += 1
+        # Повторная отправка не считается новым распределением
+        self.routed -= resent
+        if resent < len(pending):
+            logger.error(f"Обработчик {self.index}: потеряно обновлений при перезапуске: {len(pending) - resent}")
+        logger.info(f"Обработчик {self.index} перезапущен, повторно отправлено обновлений: {resent}")
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def depth(self) -> int:
+        """Обновлений в очереди процесса"""
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            # macOS: qsize недоступен
+            return -1
+
+
+class Supervisor:
+    """Распределение обновлений по процессам-обработчикам по хешу пользователя"""
+
+    def __init__(self, workers: int, queue_size: int = 1000, concurrency: int = 100,
+                 restart_delay: float = 1.0):
+        self.workers = [Worker(index, workers, queue_size, concurrency) for index in range(workers)]
+        self.ring = HashRing(workers)
+        self.restart_delay = restart_delay
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        self._monitor_task = asyncio.create_task(self._monitor())
+        logger.info(f"🚀 Запущено обработчиков: {len(self.workers)}")
+
+    def route(self, update: Dict[str, Any]) -> bool:
+        """Передача обновления обработчику. False - очередь обработчика заполнена"""
+        worker = self.workers[self.ring.get(shard_key(update))]
+        return worker.send(update)
+
+    async def route_wait(self, update: Dict[str, Any]) -> None:
+        """Передача обновления с ожиданием места в очереди"""
+        while not self.route(update):
+            await asyncio.sleep(0.05)
+
+    async def _monitor(self) -> None:
+        """Перезапуск упавших обработчиков"""
+        while True:
+            await asyncio.sleep(self.restart_delay)
+            for worker in self.workers:
+                worker.trim()
+                if worker.process is not None and not worker.process.is_alive():
+                    logger.error(
+                        f"💥 Обработчик {worker.index} завершился (код {worker.process.exitcode}), перезапуск"
+                    )
+                    worker.restart()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние обработчиков: процесс, глубина очереди, счетчики"""
+        return [
+            {
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": worker.alive,
+                "queue_depth": worker.depth,
+                "routed": worker.routed,
+                "restarts": worker.restarts
+            }
+            for worker in self.workers
+        ]
+
+    def collect_metrics(self) -> None:
+        """Очереди и состояние обработчиков для /metrics супервизора"""
+        for item in self.stats():
+            worker = str(item["worker"])
+            metrics.worker_queue_depth.set(item["queue_depth"], worker)
+            metrics.worker_alive.set(1 if item["alive"] else 0, worker)
+            metrics.worker_routed.set(item["routed"], worker)
+            metrics.worker_restarts.set(item["restarts"], worker)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Остановка: обработчики дорабатывают свои очереди"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+
+        for worker in self.workers:
+            await asyncio.to_thread(worker.queue.put, None)
+
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            await asyncio.to_thread(worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"Обработчик {worker.index} не остановился, завершаем принудительно")
+                worker.process.terminate()
+
+
+class ShardingRequestHandler(SimpleRequestHandler):
+    """Webhook супервизора: проверка секрета и передача обновления обработчику"""
+
+    def __init__(self, bot: Bot, supervisor: Supervisor, secret_token: Optional[str] = None):
+        super().__init__(Dispatcher(), bot, handle_in_background=True, secret_token=secret_token or None)
+        self.supervisor = supervisor
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        if not self.supervisor.route(update):
+            # Telegram повторит доставку позже
+            return web.Response(status=503, text="Overloaded")
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "workers": self.supervisor.stats()})
+
+
+async def _poll(bot: Bot, supervisor: Supervisor, allowed_updates: List[str]) -> None:
+    """getUpdates в супервизоре; обновления передаются обработчикам без разбора"""
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=25, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.error(f"Ошибка получения обновлений: {e}")
+            await asyncio.sleep(1)
+            continue
+
+        for update in updates:
+            await supervisor.route_wait(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def _log_stats(supervisor: Supervisor, interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        depths = ", ".join(
+            f"{item['worker']}: {item['queue_depth']}" + ("" if item["alive"] else " (остановлен)")
+            for item in supervisor.stats()
+        )
+        logger.info(f"📊 Очереди обработчиков: {depths}")
+
+
+async def run_supervisor(workers: int, allowed_updates: List[str]) -> None:
+    """Запуск супервизора с workers процессами-обработчиками до остановки процесса"""
+    from bot import create_bot
+
+    supervisor = Supervisor(
+        workers,
+        queue_size=settings.WORKER_QUEUE_SIZE,
+        concurrency=settings.WORKER_CONCURRENCY,
+        restart_delay=settings.WORKER_RESTART_DELAY
+    )
+    supervisor.start()
+
+    bot = create_bot()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = None
+    metrics_runner = None
+    tasks = [asyncio.create_task(_log_stats(supervisor, settings.WORKER_STATS_INTERVAL))]
+    if settings.METRICS_ENABLED:
+        metrics.registry.on_collect(supervisor.collect_metrics)
+    loop_watchdog.start()
+
+    try:
+        if settings.BOT_MODE == "webhook":
+            app = web.Application()
+            handler = ShardingRequestHandler(bot, supervisor, secret_token=settings.WEBHOOK_SECRET)
+            handler.register(app, path=settings.WEBHOOK_PATH)
+            app.router.add_get("/healthz", handler.health)
+            if settings.METRICS_ENABLED:
+                app.router.add_get("/metrics", metrics.metrics_handler)
+
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT).start()
+
+            if settings.WEBHOOK_URL:
+                await bot.set_webhook(
+                    settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+                    secret_token=settings.WEBHOOK_SECRET or None,
+                    allowed_updates=allowed_updates
+                )
+            logger.info(f"🌐 Супервизор слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+        else:
+            if settings.METRICS_ENABLED:
+                metrics_runner = await metrics.start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+            tasks.append(asyncio.create_task(_poll(bot, supervisor, allowed_updates)))
+            logger.info("🔄 Супервизор: запуск polling...")
+
+        await stop.wait()
+        logger.info("🛑 Остановка супервизора")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if runner:
+            await runner.cleanup()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await loop_watchdog.stop()
+        await supervisor.stop()
+        await bot.session.close()
@@ -0,0 +1,132 @@
+"""
+Получение обновлений через webhook: встроенный aiohttp-сервер
+"""
+
+import asyncio
+from typing import Any, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from config.settings import settings
+from utils.metrics import registry, metrics_handler, webhook_pending
+
+
+class ConcurrentRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook с ограничением параллельной обработки.
+
+    Telegram сразу получает 200, обновление обрабатывается в фоновой задаче.
+    Одновременно выполняется не больше concurrency обработчиков; если в очереди
+    уже max_pending обновлений, отвечаем 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 concurrency: int = 100, max_pending: int = 1000, **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True,
+                         secret_token=secret_token or None, **data)
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @property
+    def pending(self) -> int:
+        """Обновлений принято, но еще не обработано"""
+        return len(self._background_feed_update_tasks)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self.pending >= self.max_pending:
+            logger.warning(f"Webhook: очередь заполнена ({self.pending}), обновление отклонено")
+            return web.Response(status=503, text="Overloaded")
+
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _background_feed_update(self, bot: Bot, update: dict) -> None:
+        async with self._semaphore:
+            try:
+                await super()._background_feed_update(bot=bot, update=update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Ожидание обработки уже принятых обновлений при остановке"""
+        tasks = list(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Webhook: завершаем обработку {len(tasks)} обновлений")
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    async def health(self, request: web.Request) -> web.Response:
+        """Проверка для балансировщика нагрузки"""
+        return web.json_response({"status": "ok", "pending": self.pending})
+
+
+def create_app(bot: Bot, dp: Dispatcher, path: str = "/webhook", secret_token: str = "",
+               concurrency: int = 100, max_pending: int = 1000) -> web.Application:
+    """aiohttp-приложение webhook. Подходит и для тестов: обновления можно
+    отправлять POST-запросами на path (с заголовком секрета, если он задан)"""
+    app = web.Application()
+    handler = ConcurrentRequestHandler(
+        dp, bot,
+        secret_token=secret_token,
+        concurrency=concurrency,
+        max_pending=max_pending
+    )
+
+    # Сначала дожидаемся фоновых обработчиков, затем закрываем сессию бота и сервисы
+    app.on_shutdown.append(lambda _: handler.drain())
+    handler.register(app, path=path)
+    app.router.add_get("/healthz", handler.health)
+    if settings.METRICS_ENABLED:
+        app.router.add_get("/metrics", metrics_handler)
+        registry.on_collect(lambda: webhook_pending.set(handler.pending))
+    setup_application(app, dp, bot=bot)
+
+    app["webhook_handler"] = handler
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: List[str]) -> None:
+    """Запуск встроенного сервера webhook до остановки процесса"""
+    app = create_app(
+        bot, dp,
+        path=settings.WEBHOOK_PATH,
+        secret_token=settings.WEBHOOK_SECRET,
+        concurrency=settings.WEBHOOK_CONCURRENCY,
+        max_pending=settings.WEBHOOK_MAX_PENDING
+    )
+
+    if settings.WEBHOOK_URL:
+        async def register_webhook(_: web.Application) -> None:
+            url = settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH
+            await bot.set_webhook(
+                url,
+                secret_token=settings.WEBHOOK_SECRET or None,
+                allowed_updates=allowed_updates
+            )
+            logger.info(f"✅ Webhook зарегистрирован: {url}")
+
+        app.on_startup.append(register_webhook)
+    else:
+        logger.warning("⚠️ WEBHOOK_URL не задан: webhook должен быть зарегистрирован извне")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"🌐 Webhook сервер слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -3,5 +3,7 @@
 """
 
 from .api_client import api_client
+from .cache_service import search_cache
+from .search_sessions import search_sessions
 
-__all__ = ["api_client"]
\ No newline at end of file
+__all__ = ["api_client", "search_cache", "search_sessions"]
\ No newline at end of file
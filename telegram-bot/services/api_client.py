@@ -4,25 +4,92 @@
 
 import aiohttp
 import asyncio
+import hashlib
 import json
-from typing import Optional, Dict, Any, List
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Hashable, Callable, Awaitable, Tuple, AsyncIterator
+from urllib.parse import urlencode
 from loguru import logger
 from config.settings import settings
+from services.cache_service import LRUCache, search_cache
+from utils.metrics import api_latency, api_errors, endpoint_label
+from services.resilience import (
+    CircuitBreaker, RetryBudget, ROUTE_GROUPS, route_group, build_retry_policies, get_policy
+)
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов в один.
+
+    Первый вызов с ключом запускает запрос, остальные ждут его результат.
+    Запрос выполняется в отдельной задаче, поэтому отмена одного из ожидающих
+    не отменяет запрос для остальных.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+    
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        
+        return await asyncio.shield(task)
+    
+    def __len__(self) -> int:
+        return len(self._calls)
 
 
 class APIClient:
     """Клиент для работы с Backend API"""
     
+    # Идемпотентные методы, одинаковые запросы которых можно объединять
+    COALESCED_METHODS = ("GET",)
+    
+    # Ответы Backend, после которых запрос имеет смысл повторить
+    RETRYABLE_STATUSES = (502, 503, 504)
+    
     def __init__(self):
         self.base_url = settings.BACKEND_API_URL.rstrip("/")
         self.api_key = settings.BACKEND_API_KEY
         self.session: Optional[aiohttp.ClientSession] = None
+        self._inflight = SingleFlight()
+        
+        # Повторы и circuit breaker по группам маршрутов
+        self.retry_policies = build_retry_policies(
+            attempts=settings.API_RETRY_ATTEMPTS,
+            base_delay=settings.API_RETRY_BASE_DELAY,
+            max_delay=settings.API_RETRY_MAX_DELAY,
+            timeout=settings.API_TIMEOUT
+        )
+        self.retry_budget = RetryBudget(ratio=settings.API_RETRY_BUDGET_RATIO)
+        self.breakers: Dict[str, CircuitBreaker] = {
+            group: CircuitBreaker(
+                group,
+                failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+            )
+            for group in ROUTE_GROUPS + ("other",)
+        }
+        self._probe_task: Optional[asyncio.Task] = None
+        
+        # Справочные данные (категории, композиторы, статистика) одинаковы для всех пользователей
+        self._reference = LRUCache(maxsize=64, ttl=settings.REFERENCE_CACHE_TTL)
     
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получение HTTP сессии"""
         if self.session is None or self.session.closed:
             timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            # Соединения живут дольше стандартных 15с: прогретые при запуске не закрываются до первых пользователей
+            connector = aiohttp.TCPConnector(keepalive_timeout=settings.API_KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
         return self.session
     
     def _get_headers(self, jwt_token: Optional[str] = None) -> Dict[str, str]:
@@ -40,11 +107,101 @@ class APIClient:
         
         return headers
     
+    @staticmethod
+    def _auth_partition(jwt_token: Optional[str]) -> str:
+        """Ключ разделения по авторизации: ответы разных пользователей не смешиваются"""
+        if not jwt_token:
+            return "anonymous"
+        return hashlib.sha256(jwt_token.encode("utf-8")).hexdigest()[:16]
+    
     async def _make_request(self, method: str, endpoint: str, 
                           jwt_token: Optional[str] = None, 
                           data: Optional[Dict] = None,
                           params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
-        """Выполнение HTTP запроса"""
+        """Выполнение HTTP запроса (одинаковые одновременные GET объединяются)"""
+        if settings.ENABLE_REQUEST_COALESCING and method in self.COALESCED_METHODS and data is None:
+            key = (
+                method,
+                endpoint,
+                tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())),
+                self._auth_partition(jwt_token)
+            )
+            return await self._inflight.do(
+                key, lambda: self._send_request(method, endpoint, jwt_token, data, params)
+            )
+        
+        return await self._send_request(method, endpoint, jwt_token, data, params)
+    
+    async def _get_reference(self, endpoint: str, jwt_token: Optional[str] = None,
+                             params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """GET справочных данных с кешем в памяти на REFERENCE_CACHE_TTL секунд"""
+        key = (endpoint, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+        cached = self._reference.get(key)
+        if cached is not None:
+            return cached
+        
+        result = await self._make_request("GET", endpoint, jwt_token=jwt_token, params=params)
+        if result and not result.get("error"):
+            self._reference.set(key, result)
+        return result
+    
+    async def _send_request(self, method: str, endpoint: str,
+                            jwt_token: Optional[str] = None,
+                            data: Optional[Dict] = None,
+                            params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """Отправка HTTP запроса с повторами и circuit breaker группы маршрутов"""
+        group = route_group(endpoint)
+        breaker = self.breakers[group]
+        policy = get_policy(self.retry_policies, group, method)
+        
+        self.retry_budget.record_request()
+        attempt = 1
+        label = endpoint_label(endpoint)
+        
+        while True:
+            if not breaker.allow_request():
+                # Backend недоступен: отвечаем сразу, не дожидаясь таймаута
+                api_errors.inc(method, label, "circuit_open")
+                return {"error": "connection_error", "message": "Ошибка соединения с сервером"}
+            
+            probe = breaker.state == breaker.HALF_OPEN
+            started = time.perf_counter()
+            try:
+                result, retryable = await self._send_once(method, endpoint, jwt_token, data, params, policy.timeout)
+            except BaseException:
+                # Отмена (дедлайн, отмена обработчика) не дает результата: место пробы освобождаем,
+                # иначе выключатель навсегда останется в half-open
+                if probe:
+                    breaker.release_probe()
+                raise
+            api_latency.observe(time.perf_counter() - started, method, label)
+            if result is None:
+                api_errors.inc(method, label, "invalid_json")
+            elif isinstance(result, dict) and "error" in result:
+                api_errors.inc(method, label, str(result["error"]))
+            
+            if not retryable:
+                # Ответ 5xx без повтора (например, 500) - тоже сбой Backend: закрывают выключатель только 2xx/4xx
+                if isinstance(result, dict) and result.get("status", 0) >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                return result
+            
+            breaker.record_failure()
+            
+            if attempt >= policy.attempts or breaker.is_open or not self.retry_budget.try_spend():
+                return result
+            
+            delay = policy.backoff(attempt)
+            logger.warning(f"Повтор запроса {method} {endpoint} через {delay:.2f}с (попытка {attempt + 1})")
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    async def _send_once(self, method: str, endpoint: str, jwt_token: Optional[str],
+                         data: Optional[Dict], params: Optional[Dict],
+                         timeout: float) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Одна попытка HTTP запроса. Возвращает (результат, можно ли повторить)"""
         url = f"{self.base_url}{endpoint}"
         headers = self._get_headers(jwt_token)
         
@@ -56,36 +213,38 @@ class APIClient:
                 url=url,
                 headers=headers,
                 json=data,
-                params=params
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=timeout)
             ) as response:
                 
                 response_text = await response.text()
                 
                 if response.status == 200:
                     try:
-                        return json.loads(response_text)
+                        return json.loads(response_text), False
                     except json.JSONDecodeError:
                         logger.error(f"Ошибка парсинга JSON: {response_text}")
-                        return None
+                        return None, False
                 
                 elif response.status == 401:
                     logger.warning("Ошибка авторизации API")
-                    return {"error": "unauthorized", "message": "Требуется авторизация"}
+                    return {"error": "unauthorized", "message": "Требуется авторизация"}, False
                 
                 elif response.status == 404:
-                    return {"error": "not_found", "message": "Ресурс не найден"}
+                    return {"error": "not_found", "message": "Ресурс не найден"}, False
                 
                 else:
                     logger.error(f"API ошибка {response.status}: {response_text}")
-                    return {"error": "api_error", "message": f"Ошибка API: {response.status}"}
+                    error = {"error": "api_error", "message": f"Ошибка API: {response.status}", "status": response.status}
+                    return error, response.status in self.RETRYABLE_STATUSES
         
         except asyncio.TimeoutError:
             logger.error(f"Таймаут запроса: {url}")
-            return {"error": "timeout", "message": "Превышен таймаут запроса"}
+            return {"error": "timeout", "message": "Превышен таймаут запроса"}, True
         
         except Exception as e:
             logger.error(f"Ошибка HTTP запроса: {e}")
-            return {"error": "connection_error", "message": "Ошибка соединения с сервером"}
+            return {"error": "connection_error", "message": "Ошибка соединения с сервером"}, True
     
     # Методы аутентификации
     async def register_user(self, email: str, password: str, name: str) -> Optional[Dict[str, Any]]:
@@ -132,15 +291,19 @@ class APIClient:
             "page": page,
             "limit": limit
         }
-        return await self._make_request("GET", "/works/search/smart", jwt_token=jwt_token, params=params)
+        return await search_cache.get_or_fetch(
+            "works_smart", query, page, limit,
+            lambda: self._make_request("GET", "/works/search/smart", jwt_token=jwt_token, params=params)
+        )
     
     async def get_search_suggestions(self, query: str, search_type: str = "all",
-                                   jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+                                   jwt_token: Optional[str] = None,
+                                   limit: int = 5) -> Optional[Dict[str, Any]]:
         """Получение предложений для автокомплита"""
         params = {
             "q": query,
             "type": search_type,
-            "limit": 5
+            "limit": limit
         }
         return await self._make_request("GET", "/works/search/suggestions", jwt_token=jwt_token, params=params)
     
@@ -155,13 +318,20 @@ class APIClient:
     # Методы для работы с категориями и композиторами
     async def get_categories(self, jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получение списка категорий"""
-        return await self._make_request("GET", "/works/categories", jwt_token=jwt_token)
+        return await self._get_reference("/works/categories", jwt_token=jwt_token)
     
     async def get_composers(self, category: Optional[str] = None, 
-                          jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """Получение списка композиторов"""
-        params = {"category": category} if category else None
-        return await self._make_request("GET", "/works/composers", jwt_token=jwt_token, params=params)
+                          jwt_token: Optional[str] = None,
+                          search: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Получение списка композиторов (с фильтром по части имени)"""
+        params = {}
+        if category:
+            params["category"] = category
+        if search:
+            params["search"] = search
+            # Поиск по части имени не кешируется: вариантов слишком много
+            return await self._make_request("GET", "/works/composers", jwt_token=jwt_token, params=params)
+        return await self._get_reference("/works/composers", jwt_token=jwt_token, params=params or None)
     
     async def get_composer_works(self, composer: str, category: Optional[str] = None,
                                jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -179,7 +349,10 @@ class APIClient:
             "page": page,
             "limit": limit
         }
-        return await self._make_request("GET", "/terms", jwt_token=jwt_token, params=params)
+        return await search_cache.get_or_fetch(
+            "terms", query, page, limit,
+            lambda: self._make_request("GET", "/terms", jwt_token=jwt_token, params=params)
+        )
     
     async def smart_search_terms(self, query: str, page: int = 1, limit: int = 10,
                                 jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -189,7 +362,10 @@ class APIClient:
             "page": page,
             "limit": limit
         }
-        return await self._make_request("GET", "/terms/search/smart", jwt_token=jwt_token, params=params)
+        return await search_cache.get_or_fetch(
+            "terms_smart", query, page, limit,
+            lambda: self._make_request("GET", "/terms/search/smart", jwt_token=jwt_token, params=params)
+        )
     
     async def get_term_by_id(self, term_id: int, jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получение термина по ID"""
@@ -265,9 +441,69 @@ class APIClient:
     
     async def download_file_url(self, file_path: str, jwt_token: Optional[str] = None) -> str:
         """Получение URL для скачивания файла"""
-        # Возвращаем прямую ссылку на файл
-        encoded_path = file_path.replace(" ", "%20")
-        return f"{self.base_url}/files/download/{encoded_path}"
+        # Backend принимает путь в параметре path (GET /files/download?path=...)
+        return f"{self.base_url}/files/download?{urlencode({'path': file_path})}"
+    
+    @asynccontextmanager
+    async def stream_file(self, file_path: str,
+                          jwt_token: Optional[str] = None) -> AsyncIterator[Optional[aiohttp.ClientResponse]]:
+        """Открытый ответ GET /files/download для потоковой передачи тела файла.
+        
+        Запрос проходит через circuit breaker группы files. Общий таймаут не
+        ограничен: длительность зависит от того, куда передается файл; на
+        соединение и каждое чтение - API_TIMEOUT. Если Backend недоступен или
+        ответил не 200, отдает None.
+        """
+        endpoint = "/files/download"
+        label = endpoint_label(endpoint)
+        breaker = self.breakers[route_group(endpoint)]
+        
+        if not breaker.allow_request():
+            api_errors.inc("GET", label, "circuit_open")
+            yield None
+            return
+        
+        probe = breaker.state == breaker.HALF_OPEN
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=settings.API_TIMEOUT,
+                                        sock_read=settings.API_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            session = await self._get_session()
+            response = await session.get(
+                f"{self.base_url}{endpoint}",
+                params={"path": file_path},
+                headers=self._get_headers(jwt_token),
+                timeout=timeout
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            api_latency.observe(time.perf_counter() - started, "GET", label)
+            api_errors.inc("GET", label, "connection_error")
+            breaker.record_failure()
+            logger.error(f"Ошибка загрузки файла {file_path}: {e}")
+            yield None
+            return
+        except BaseException:
+            # Отмена до ответа: место пробы half-open освобождаем
+            if probe:
+                breaker.release_probe()
+            raise
+        
+        api_latency.observe(time.perf_counter() - started, "GET", label)
+        try:
+            if response.status != 200:
+                api_errors.inc("GET", label, "api_error")
+                if response.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                logger.error(f"Backend вернул {response.status} для файла {file_path}")
+                yield None
+                return
+            
+            breaker.record_success()
+            yield response
+        finally:
+            response.release()
     
     async def get_file_stats(self, jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получение статистики файлов"""
@@ -276,11 +512,11 @@ class APIClient:
     # Методы статистики
     async def get_works_stats(self, jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получение статистики произведений"""
-        return await self._make_request("GET", "/works/stats/summary", jwt_token=jwt_token)
+        return await self._get_reference("/works/stats/summary", jwt_token=jwt_token)
     
     async def get_terms_stats(self, jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получение статистики терминов"""
-        return await self._make_request("GET", "/terms/stats/summary", jwt_token=jwt_token)
+        return await self._get_reference("/terms/stats/summary", jwt_token=jwt_token)
     
     # Health check
     async def health_check(self) -> Optional[Dict[str, Any]]:
@@ -288,8 +524,9 @@ class APIClient:
         try:
             session = await self._get_session()
             url = f"{self.base_url.replace('/api', '')}/health"
+            timeout = aiohttp.ClientTimeout(total=settings.HEALTH_CHECK_TIMEOUT)
             
-            async with session.get(url) as response:
+            async with session.get(url, timeout=timeout) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
@@ -298,8 +535,40 @@ class APIClient:
             logger.error(f"Ошибка health check: {e}")
             return {"status": "unhealthy", "error": str(e)}
     
+    def start_health_probe(self) -> None:
+        """Запуск фоновой пробы Backend для circuit breaker"""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._health_probe_loop())
+    
+    async def _health_probe_loop(self) -> None:
+        """Пока есть открытые circuit breaker, проверяем /health и переводим их в half-open"""
+        while True:
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+            
+            open_breakers = [breaker for breaker in self.breakers.values() if breaker.is_open]
+            if not open_breakers:
+                continue
+            
+            health = await self.health_check()
+            if health and health.get("status") == "healthy":
+                # Backend снова отвечает: пропускаем пробные запросы
+                for breaker in open_breakers:
+                    breaker.half_open()
+            else:
+                # Продлеваем открытое состояние, чтобы не слать запросы в лежащий Backend
+                for breaker in open_breakers:
+                    breaker.open()
+    
     async def close(self) -> None:
         """Закрытие HTTP сессии"""
+        if self._probe_task and not self._probe_task.done():
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        
         if self.session and not self.session.closed:
             await self.session.close()
             logger.debug("HTTP сессия закрыта")
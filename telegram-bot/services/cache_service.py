@@ -0,0 +1,177 @@
+"""
+Кеширование результатов поиска
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable
+from loguru import logger
+
+from config.settings import settings
+from config.database import db_manager
+
+# Учет частых поисков для прогрева (поиски самого прогрева не учитываются)
+record_searches: ContextVar[bool] = ContextVar("record_searches", default=True)
+
+# Длина запроса, который еще учитывается в статистике поисков
+MAX_RECORDED_QUERY = 255
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU кеш в памяти процесса с TTL"""
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получение значения (None, если нет или истекло)"""
+        item = self._data.get(key)
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Сохранение значения с вытеснением самых старых записей"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Удаление значения"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистка кеша"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_query(query: str) -> str:
+    """Каноническая форма запроса для ключа кеша"""
+    return re.sub(r"\s+", " ", query.strip()).casefold()
+
+
+class SearchCache:
+    """Двухуровневый кеш поиска: L1 в памяти, L2 в таблице search_cache"""
+
+    def __init__(self, maxsize: int = 512, ttl: int = 3600, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(search_type: str, query: str, page: int, limit: int) -> str:
+        """Канонический ключ запроса (тип, нормализованный запрос, страница, лимит)"""
+        canonical = json.dumps(
+            [search_type, normalize_query(query), int(page), int(limit)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Получение результата: сначала L1, затем L2"""
+        if not self.enabled:
+            return None
+
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        cached = await db_manager.get_search_cache(key)
+        if cached is None:
+            return None
+
+        results, remaining = cached
+        if remaining <= 0:
+            return None
+
+        try:
+            result = json.loads(results)
+        except json.JSONDecodeError:
+            logger.warning(f"Поврежденная запись кеша поиска: {key}")
+            return None
+
+        # Поднимаем запись в L1 на оставшийся в L2 срок, а не на полный ttl
+        self.memory.set(key, result, ttl=min(self.ttl, remaining))
+        return result
+
+    async def set(self, key: str, query_text: str, result: Dict[str, Any]) -> None:
+        """Сохранение результата в оба уровня кеша"""
+        if not self.enabled:
+            return
+
+        self.memory.set(key, result)
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        await db_manager.save_search_cache(
+            query_hash=key,
+            query_text=query_text,
+            results=json.dumps(result, ensure_ascii=False),
+            expires_at=expires_at.isoformat()
+        )
+
+    async def get_or_fetch(self, search_type: str, query: str, page: int, limit: int,
+                           fetch: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+                           ) -> Optional[Dict[str, Any]]:
+        """Read-through: отдаем из кеша или выполняем запрос и кешируем успешный ответ"""
+        if not self.enabled:
+            return await fetch()
+
+        key = self.make_key(search_type, query, page, limit)
+
+        if page == 1 and record_searches.get():
+            normalized = normalize_query(query)
+            if normalized and len(normalized) <= MAX_RECORDED_QUERY:
+                await db_manager.record_search(search_type, normalized, limit)
+
+        cached = await self.get(key)
+        if cached is not None:
+            logger.debug(f"Кеш поиска: попадание {search_type} '{query}' стр. {page}")
+            return cached
+
+        result = await fetch()
+
+        # Ошибки и пустые ответы не кешируем
+        if result and not result.get("error"):
+            await self.set(key, f"{search_type}:{normalize_query(query)}", result)
+
+        return result
+
+    def clear(self) -> None:
+        """Очистка L1"""
+        self.memory.clear()
+
+
+# Глобальный экземпляр кеша поиска
+search_cache = SearchCache(
+    maxsize=settings.SEARCH_CACHE_L1_SIZE,
+    ttl=settings.CACHE_EXPIRE_TIME,
+    enabled=settings.ENABLE_CACHE
+)
@@ -0,0 +1,100 @@
+"""
+Кеш file_id Telegram для файлов произведений
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Optional
+from loguru import logger
+
+from config.settings import settings
+from config.database import db_manager
+from services.api_client import api_client
+from services.cache_service import LRUCache
+from services.file_transfer import stat_library_file
+
+
+def make_fingerprint(file_path: str, size: int, mtime_ms: int) -> str:
+    """Отпечаток версии файла: путь, размер и время изменения (миллисекунды).
+
+    Если файл заменили или переместили, отпечаток меняется и старый file_id
+    больше не используется.
+    """
+    parts = [file_path, str(size), str(mtime_ms)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+async def file_fingerprint(file_path: str, jwt_token: Optional[str] = None) -> Optional[str]:
+    """Отпечаток текущей версии файла произведения.
+
+    Таблица works не хранит время изменения файла, поэтому размер и mtime
+    берутся у самого файла: os.stat в каталоге библиотеки (LIBRARY_ROOT),
+    иначе GET /files/info Backend. None - версию узнать не удалось, кеши
+    file_id и PDF для этой отправки не используются.
+    """
+    library_file = await stat_library_file(settings.LIBRARY_ROOT, file_path)
+    if library_file:
+        _, stat = library_file
+        return make_fingerprint(file_path, stat.st_size, stat.st_mtime_ns // 1_000_000)
+
+    info = await api_client.get_file_info(file_path, jwt_token)
+    if not info or info.get("error") or info.get("size") is None or not info.get("modified"):
+        return None
+    try:
+        modified = datetime.fromisoformat(str(info["modified"]).replace("Z", "+00:00"))
+        return make_fingerprint(file_path, int(info["size"]), int(modified.timestamp() * 1000))
+    except (TypeError, ValueError):
+        logger.warning(f"Некорректные сведения о файле {file_path}: {info}")
+        return None
+
+
+class TelegramFileCache:
+    """Соответствие work_id -> file_id уже загруженного в Telegram файла.
+
+    L1 в памяти процесса, постоянное хранение - в таблице telegram_files.
+    Повторная отправка по file_id не скачивает файл с Backend и не загружает его в Telegram.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.memory = LRUCache(maxsize=maxsize)
+
+    async def get(self, work_id: int, fingerprint: str) -> Optional[str]:
+        """file_id для текущей версии файла; устаревшая запись удаляется"""
+        if not fingerprint:
+            return None
+
+        entry = self.memory.get(work_id)
+        if entry is None:
+            entry = await db_manager.get_telegram_file(work_id)
+            if entry is None:
+                return None
+            self.memory.set(work_id, entry)
+
+        if entry["fingerprint"] != fingerprint:
+            logger.info(f"Файл произведения {work_id} изменился, file_id устарел")
+            await self.invalidate(work_id)
+            return None
+
+        return entry["file_id"]
+
+    async def set(self, work_id: int, fingerprint: str, file_id: str, file_unique_id: str = "") -> None:
+        """Сохранение file_id после первой загрузки файла"""
+        if not fingerprint:
+            return
+
+        entry = {
+            "fingerprint": fingerprint,
+            "file_id": file_id,
+            "file_unique_id": file_unique_id
+        }
+        self.memory.set(work_id, entry)
+        await db_manager.save_telegram_file(work_id, fingerprint, file_id, file_unique_id)
+
+    async def invalidate(self, work_id: int) -> None:
+        """Удаление file_id (файл изменился или Telegram его больше не принимает)"""
+        self.memory.delete(work_id)
+        await db_manager.delete_telegram_file(work_id)
+
+
+# Глобальный экземпляр кеша file_id
+telegram_files = TelegramFileCache()
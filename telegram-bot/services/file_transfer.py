@@ -0,0 +1,162 @@
+"""
+Передача файлов с Backend или из общего каталога библиотеки в Telegram
+"""
+
+import asyncio
+import mmap
+import os
+import tempfile
+from typing import AsyncGenerator, Optional, Tuple
+
+import aiofiles
+import aiohttp
+from aiogram.types import InputFile
+
+# Размер фрагмента при передаче файла
+CHUNK_SIZE = 64 * 1024
+
+
+class FileTooLargeError(Exception):
+    """Файл превышает MAX_FILE_SIZE"""
+
+
+class BackendStreamFile(InputFile):
+    """Тело ответа Backend, передаваемое в multipart-загрузку Telegram без записи на диск.
+
+    Читаем ответ фрагментами по мере отправки: aiohttp приостанавливает чтение
+    сокета, пока буфер ответа не освободится, поэтому в памяти держится
+    не больше пары фрагментов. Ответ должен оставаться открытым до конца загрузки.
+    Тело ответа читается один раз: повторное чтение (повтор запроса) - ошибка.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse, filename: str,
+                 chunk_size: int = CHUNK_SIZE, sink=None):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.response = response
+        # Необязательный приемник копии данных (например, запись в кеш PDF)
+        self.sink = sink
+        self._consumed = False
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        if self._consumed:
+            raise RuntimeError(f"Поток {self.filename} уже передан и не может быть прочитан повторно")
+        self._consumed = True
+        async for chunk in self.response.content.iter_chunked(self.chunk_size):
+            if self.sink is not None:
+                await self.sink.write(chunk)
+            yield chunk
+
+
+class MappedInputFile(InputFile):
+    """Файл библиотеки, передаваемый в загрузку Telegram через mmap.
+
+    Фрагменты отдаются как memoryview отображенного файла, без чтения в
+    промежуточные буферы. Открытие и отображение файла выполняются в пуле
+    потоков, а ядро заранее подчитывает следующий фрагмент (MADV_WILLNEED),
+    чтобы обращения к страницам не останавливали цикл событий.
+    """
+
+    def __init__(self, path: str, filename: Optional[str] = None,
+                 chunk_size: int = 4 * CHUNK_SIZE):
+        super().__init__(filename=filename or os.path.basename(path), chunk_size=chunk_size)
+        self.path = path
+
+    def _map(self) -> Tuple[Optional[mmap.mmap], int]:
+        """Открытие и отображение файла (в пуле потоков) с подчиткой первого фрагмента"""
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return None, 0
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        self._prefetch(mapped, 0, size)
+        return mapped, size
+
+    def _prefetch(self, mapped: mmap.mmap, offset: int, size: int) -> None:
+        if offset < size and hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_WILLNEED, offset, min(self.chunk_size, size - offset))
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        mapped, size = await asyncio.to_thread(self._map)
+        if mapped is None:
+            return
+
+        view = memoryview(mapped)
+        try:
+            # Следующий фрагмент подчитывается, пока отправляется текущий
+            for offset in range(0, size, self.chunk_size):
+                self._prefetch(mapped, offset + self.chunk_size, size)
+                yield view[offset:offset + self.chunk_size]
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                # Фрагменты еще в буфере отправки: отображение закроется при сборке мусора
+                pass
+
+
+def resolve_library_path(root: str, file_path: str) -> Optional[str]:
+    """Полный путь к файлу внутри корня библиотеки.
+
+    Возвращает None, если путь выходит за пределы корня (в том числе через
+    символические ссылки) или не указывает на обычный файл.
+    """
+    if not root or not file_path:
+        return None
+
+    # Относительный путь - от корня. Абсолютный os.path.join оставляет как есть, и ниже он
+    # проходит проверку, только если лежит внутри корня; иначе файл отдает Backend
+    real_root = os.path.realpath(root)
+    full_path = os.path.realpath(os.path.join(real_root, file_path))
+
+    if os.path.commonpath([real_root, full_path]) != real_root:
+        return None
+
+    return full_path if os.path.isfile(full_path) else None
+
+
+def _stat_library_file(root: str, file_path: str) -> Optional[Tuple[str, os.stat_result]]:
+    path = resolve_library_path(root, file_path)
+    if path is None:
+        return None
+    try:
+        return path, os.stat(path)
+    except OSError:
+        return None
+
+
+async def stat_library_file(root: str, file_path: str) -> Optional[Tuple[str, os.stat_result]]:
+    """Путь к файлу в каталоге библиотеки и его stat (None - файла там нет).
+
+    Разрешение пути и stat выполняются в пуле потоков: каталог библиотеки
+    может быть сетевым, и обращения к нему не должны останавливать цикл событий.
+    """
+    if not root or not file_path:
+        return None
+    return await asyncio.to_thread(_stat_library_file, root, file_path)
+
+
+async def spool_to_temp(response: aiohttp.ClientResponse, max_size: int,
+                        suffix: Optional[str] = None, directory: Optional[str] = None) -> str:
+    """Сохранение ответа неизвестного размера во временный файл с уникальным именем.
+
+    Прерывает загрузку, как только размер превысит max_size. Удалять файл - на вызывающем.
+    """
+    fd, path = tempfile.mkstemp(prefix="work-", suffix=suffix or "", dir=directory)
+    os.close(fd)
+
+    try:
+        received = 0
+        async with aiofiles.open(path, "wb") as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_size:
+                    raise FileTooLargeError(f"Файл больше {max_size} байт")
+                await f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return path
@@ -0,0 +1,394 @@
+"""
+Локальный кеш PDF-файлов произведений на диске
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, List
+
+import aiofiles
+from loguru import logger
+
+from config.settings import settings
+from config.database import db_manager
+from services.api_client import api_client
+from services.file_id_cache import file_fingerprint
+
+
+class CacheWriter:
+    """Запись файла в кеш: во временный файл с подсчетом sha256, затем переименование на место"""
+
+    def __init__(self, cache: "PDFCache", work_id: int, fingerprint: str):
+        self.cache = cache
+        self.work_id = work_id
+        self.fingerprint = fingerprint
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(dir=cache.tmp_dir, suffix=".part")
+        os.close(fd)
+        self._file = None
+
+    async def write(self, chunk: bytes) -> None:
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, "wb")
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        await self._file.write(chunk)
+
+    async def commit(self) -> Optional[str]:
+        """Перенос файла в кеш. Возвращает путь к закешированному файлу"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        path = await self.cache.add(self.work_id, self.fingerprint, self.path,
+                                    self._hash.hexdigest(), self.size)
+        if path is None:
+            await self.abort()
+        return path
+
+    async def abort(self) -> None:
+        """Отмена записи (файл получен не полностью)"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class PDFCache:
+    """Ограниченный по объему LRU кеш файлов произведений, адресуемый по содержимому.
+
+    objects/<sha256>.pdf - содержимое файлов (одинаковые файлы хранятся один раз);
+    refs/<work_id>.json  - версия файла произведения (sha256 и отпечаток метаданных);
+    tmp/                 - незавершенные записи, переименовываются на место атомарно.
+
+    Порядок LRU восстанавливается при запуске по времени изменения объектов,
+    которое обновляется при каждом обращении.
+
+    Индекс и учет объема - в памяти процесса, поэтому каталог принадлежит
+    одному процессу: процессы-обработчики (BOT_WORKERS > 1) работают каждый
+    в своем подкаталоге worker-N с долей общего бюджета (use_worker_dir).
+    """
+
+    def __init__(self, directory: str, max_bytes: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._set_directory(directory)
+        # Процессов-обработчиков, делящих бюджет и прогрев
+        self.workers = 1
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # sha256 -> размер, в порядке от давно использованных к недавним
+        self._objects: "OrderedDict[str, int]" = OrderedDict()
+        # work_id -> (sha256, отпечаток)
+        self._refs: Dict[int, Tuple[str, str]] = {}
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._ready = False
+
+    def _set_directory(self, directory: str) -> None:
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.refs_dir = os.path.join(directory, "refs")
+        self.tmp_dir = os.path.join(directory, "tmp")
+
+    def use_worker_dir(self, index: int, workers: int) -> None:
+        """Отдельный подкаталог процесса-обработчика и его доля бюджета (до start).
+
+        Процессы не видят индексы друг друга, поэтому в общем каталоге один
+        удалял бы недописанные файлы и объекты другого, а объем на диске
+        достигал бы BOT_WORKERS x PDF_CACHE_SIZE_MB.
+        """
+        self._set_directory(os.path.join(self.directory, f"worker-{index}"))
+        self.workers = max(1, workers)
+        self.max_bytes //= self.workers
+
+    @property
+    def ready(self) -> bool:
+        """Кеш включен и индекс восстановлен"""
+        return self._ready
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, f"{digest}.pdf")
+
+    def _ref_path(self, work_id: int) -> str:
+        return os.path.join(self.refs_dir, f"{work_id}.json")
+
+    async def start(self) -> None:
+        """Восстановление индекса по содержимому каталога"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._scan)
+        self._ready = True
+        logger.info(
+            f"Кеш PDF: {len(self._objects)} файлов, {len(self._refs)} произведений, "
+            f"{self.total_bytes / (1024 * 1024):.1f} МБ"
+        )
+
+    def _scan(self) -> None:
+        """Сканирование каталога кеша (в отдельном потоке)"""
+        for path in (self.objects_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+        # Незавершенные записи прошлого запуска этого процесса (каталог не общий с другими)
+        for entry in os.scandir(self.tmp_dir):
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+        objects = []
+        for entry in os.scandir(self.objects_dir):
+            if not entry.name.endswith(".pdf"):
+                continue
+            stat = entry.stat()
+            objects.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        self._objects.clear()
+        self.total_bytes = 0
+        for _, digest, size in sorted(objects):
+            self._objects[digest] = size
+            self.total_bytes += size
+
+        self._refs.clear()
+        for entry in os.scandir(self.refs_dir):
+            try:
+                work_id = int(entry.name.split(".", 1)[0])
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    ref = json.load(f)
+                digest = ref["sha256"]
+            except (ValueError, KeyError, OSError):
+                os.unlink(entry.path)
+                continue
+
+            if digest in self._objects:
+                self._refs[work_id] = (digest, ref.get("fingerprint", ""))
+            else:
+                os.unlink(entry.path)
+
+        for path in self._evict():
+            os.unlink(path)
+
+    async def get(self, work_id: int, fingerprint: str) -> Optional[str]:
+        """Путь к закешированному файлу текущей версии произведения"""
+        if not self._ready or not fingerprint:
+            return None
+
+        ref = self._refs.get(work_id)
+        if ref is None or ref[0] not in self._objects:
+            self.misses += 1
+            return None
+
+        digest, cached_fingerprint = ref
+        if cached_fingerprint != fingerprint:
+            # Файл произведения изменился
+            await self._drop_ref(work_id)
+            self.misses += 1
+            return None
+
+        path = self._object_path(digest)
+        try:
+            # Время изменения - порядок LRU после перезапуска; обращение к диску вне цикла событий
+            await asyncio.to_thread(os.utime, path)
+        except OSError:
+            # Файл удалили вне бота
+            self.total_bytes -= self._objects.pop(digest, 0)
+            await self._drop_ref(work_id)
+            self.misses += 1
+            return None
+
+        if digest in self._objects:
+            self._objects.move_to_end(digest)
+        self.hits += 1
+        return path
+
+    def open_writer(self, work_id: int, fingerprint: str) -> Optional[CacheWriter]:
+        """Запись нового файла в кеш (None, если кеш выключен или версия файла неизвестна)"""
+        if not self._ready or not fingerprint:
+            return None
+        return CacheWriter(self, work_id, fingerprint)
+
+    async def put_file(self, work_id: int, fingerprint: str, path: str) -> Optional[str]:
+        """Перенос готового файла (из tmp_dir) в кеш"""
+        if not self._ready or not fingerprint:
+            return None
+        digest, size = await asyncio.to_thread(self._hash_file, path)
+        return await self.add(work_id, fingerprint, path, digest, size)
+
+    @staticmethod
+    def _hash_file(path: str) -> Tuple[str, int]:
+        file_hash = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                file_hash.update(chunk)
+                size += len(chunk)
+        return file_hash.hexdigest(), size
+
+    async def add(self, work_id: int, fingerprint: str, tmp_path: str,
+                  digest: str, size: int) -> Optional[str]:
+        """Атомарное добавление файла в кеш с вытеснением старых файлов.
+
+        Если файл не помещается в кеш, возвращает None и оставляет tmp_path вызывающему.
+        """
+        if size > self.max_bytes:
+            return None
+
+        try:
+            await asyncio.to_thread(self._install, work_id, fingerprint, tmp_path, digest)
+        except OSError as e:
+            logger.error(f"Ошибка записи в кеш PDF: {e}")
+            return None
+
+        if digest not in self._objects:
+            self._objects[digest] = size
+            self.total_bytes += size
+        self._objects.move_to_end(digest)
+        self._refs[work_id] = (digest, fingerprint)
+
+        evicted = self._evict()
+        if evicted:
+            await asyncio.to_thread(self._unlink_all, evicted)
+
+        return self._object_path(digest)
+
+    def _install(self, work_id: int, fingerprint: str, tmp_path: str, digest: str) -> None:
+        """Переименование файла и ссылки на место (в отдельном потоке)"""
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            # Такое содержимое уже есть в кеше
+            os.unlink(tmp_path)
+            os.utime(object_path)
+        else:
+            os.replace(tmp_path, object_path)
+
+        fd, ref_tmp = tempfile.mkstemp(dir=self.tmp_dir, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"sha256": digest, "fingerprint": fingerprint}, f)
+        os.replace(ref_tmp, self._ref_path(work_id))
+
+    async def _drop_ref(self, work_id: int) -> None:
+        self._refs.pop(work_id, None)
+        try:
+            await asyncio.to_thread(os.unlink, self._ref_path(work_id))
+        except OSError:
+            pass
+
+    def _evict(self) -> List[str]:
+        """Вытеснение давно не использованных файлов сверх бюджета. Возвращает пути для удаления"""
+        paths = []
+        while self.total_bytes > self.max_bytes and self._objects:
+            digest, size = self._objects.popitem(last=False)
+            self.total_bytes -= size
+            paths.append(self._object_path(digest))
+
+            for work_id, (ref_digest, _) in list(self._refs.items()):
+                if ref_digest == digest:
+                    del self._refs[work_id]
+                    paths.append(self._ref_path(work_id))
+        return paths
+
+    @staticmethod
+    def _unlink_all(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def download(self, work: Dict, jwt_token: Optional[str] = None) -> Optional[str]:
+        """Загрузка файла произведения с Backend в кеш"""
+        work_id = work.get("id")
+        file_path = work.get("file_path")
+        if not self._ready or not work_id or not file_path:
+            return None
+
+        fingerprint = await file_fingerprint(file_path, jwt_token)
+        if not fingerprint:
+            return None
+        cached = await self.get(work_id, fingerprint)
+        if cached:
+            return cached
+
+        max_size = settings.get_max_file_size_bytes()
+        async with api_client.stream_file(file_path, jwt_token) as response:
+            if response is None:
+                return None
+            if response.content_length and response.content_length > max_size:
+                return None
+
+            writer = self.open_writer(work_id, fingerprint)
+            try:
+                received = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    # Без Content-Length размер известен только по мере чтения
+                    received += len(chunk)
+                    if received > max_size:
+                        logger.warning(f"Файл произведения {work_id} больше {max_size} байт, в кеш не загружен")
+                        await writer.abort()
+                        return None
+                    await writer.write(chunk)
+            except BaseException:
+                await writer.abort()
+                raise
+
+        return await writer.commit()
+
+    async def prewarm(self, limit: int, concurrency: int = 4) -> None:
+        """Загрузка в кеш самых скачиваемых произведений"""
+        work_ids = await db_manager.get_popular_works(limit)
+        if not work_ids:
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+        loaded = 0
+
+        async def warm(work_id: int) -> None:
+            nonlocal loaded
+            async with semaphore:
+                try:
+                    work = await api_client.get_work_by_id(work_id)
+                    if not work or work.get("error"):
+                        return
+                    if await self.download(work.get("data", work)):
+                        loaded += 1
+                except Exception as e:
+                    logger.warning(f"Ошибка прогрева кеша PDF для произведения {work_id}: {e}")
+
+        await asyncio.gather(*(warm(work_id) for work_id in work_ids))
+        logger.info(f"Кеш PDF прогрет: {loaded} из {len(work_ids)} популярных произведений")
+
+    def start_prewarm(self, limit: int, concurrency: int = 4) -> None:
+        """Прогрев кеша в фоне, не задерживая запуск бота.
+
+        Каждый процесс-обработчик загружает самые популярные произведения в
+        пределах своей доли: всего с Backend загружается не больше limit файлов.
+        """
+        limit = -(-limit // self.workers)
+        concurrency = max(1, concurrency // self.workers)
+        if self._ready and limit > 0 and self._prewarm_task is None:
+            self._prewarm_task = asyncio.create_task(self.prewarm(limit, concurrency))
+
+    async def close(self) -> None:
+        """Остановка фонового прогрева"""
+        if self._prewarm_task:
+            self._prewarm_task.cancel()
+            try:
+                await self._prewarm_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._prewarm_task = None
+
+
+# Глобальный экземпляр кеша PDF
+pdf_cache = PDFCache(
+    directory=settings.PDF_CACHE_DIR,
+    max_bytes=settings.PDF_CACHE_SIZE_MB * 1024 * 1024,
+    enabled=settings.PDF_CACHE_ENABLED
+)
@@ -0,0 +1,153 @@
+"""
+Повторы запросов и автоматический выключатель (circuit breaker) для Backend API
+"""
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Политика повторов для группы эндпоинтов"""
+    attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+    timeout: float = 10.0
+
+    def backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером перед попыткой attempt (с 1)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """Бюджет повторов: каждый запрос пополняет бюджет на ratio, каждый повтор тратит 1.
+
+    Не дает повторам умножать нагрузку на Backend, когда он и так не справляется.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+
+    def record_request(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """Автоматический выключатель для группы маршрутов.
+
+    closed    - запросы идут как обычно, считаем подряд идущие сбои;
+    open      - запросы сразу отклоняются; переход в half_open по таймауту или по пробе;
+    half_open - пропускаем ограниченное число пробных запросов: успех закрывает, сбой открывает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 15.0,
+                 half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.half_open()
+
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+
+        return False
+
+    def release_probe(self) -> None:
+        """Возврат места пробного запроса, который завершился без результата (отменен)"""
+        if self.state == self.HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker '{self.name}' закрыт")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probes_in_flight = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.open()
+
+    def open(self) -> None:
+        if self.state != self.OPEN:
+            logger.warning(f"Circuit breaker '{self.name}' открыт после {self.failures} сбоев подряд")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probes_in_flight = 0
+
+    def half_open(self) -> None:
+        if self.state == self.OPEN:
+            logger.info(f"Circuit breaker '{self.name}' переведен в half-open")
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+
+# Группы маршрутов Backend API
+ROUTE_GROUPS = ("works", "terms", "collections", "files", "auth")
+
+
+def route_group(endpoint: str) -> str:
+    """Группа маршрута по первому сегменту пути (/works/search/smart -> works)"""
+    segment = endpoint.lstrip("/").split("/", 1)[0].split("?", 1)[0]
+    return segment if segment in ROUTE_GROUPS else "other"
+
+
+def build_retry_policies(attempts: int, base_delay: float, max_delay: float,
+                         timeout: float) -> Dict[str, RetryPolicy]:
+    """Политики повторов идемпотентных GET-запросов по группам маршрутов"""
+    default = RetryPolicy(attempts=attempts, base_delay=base_delay, max_delay=max_delay, timeout=timeout)
+
+    return {
+        "works": default,
+        "terms": default,
+        "collections": RetryPolicy(attempts=min(attempts, 2), base_delay=base_delay,
+                                   max_delay=max_delay, timeout=timeout),
+        "files": RetryPolicy(attempts=min(attempts, 2), base_delay=base_delay,
+                             max_delay=max_delay, timeout=timeout * 1.5),
+        "auth": RetryPolicy(attempts=min(attempts, 2), base_delay=base_delay,
+                            max_delay=max_delay, timeout=timeout),
+        "other": default,
+    }
+
+
+def get_policy(policies: Dict[str, RetryPolicy], group: str, method: str) -> RetryPolicy:
+    """Политика для запроса: повторяем только идемпотентные GET"""
+    policy = policies.get(group, policies["other"])
+    if method != "GET":
+        return RetryPolicy(attempts=1, timeout=policy.timeout)
+    return policy
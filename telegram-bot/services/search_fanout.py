@@ -0,0 +1,115 @@
+"""
+Общий поиск: произведения, термины, композиторы и категории параллельно
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Sequence
+from loguru import logger
+
+from services.api_client import api_client
+from services.search_sessions import search_sessions, SearchSession
+from services.terms_index import terms_service
+
+# Источники в порядке показа
+SOURCES = ("works", "terms", "composers", "categories")
+
+
+@dataclass
+class SourceResult:
+    """Ответ одного источника"""
+    # loading - ждем ответа (или не дождались к сроку), done - получен, error - ошибка
+    status: str = "loading"
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    total: int = 0
+    # Сессия поиска произведений (для пагинации и карточек)
+    session: Optional[SearchSession] = None
+    elapsed: float = 0.0
+
+
+def _check(response: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not response or response.get("error"):
+        message = (response or {}).get("message") or (response or {}).get("error") or "нет ответа"
+        raise RuntimeError(message)
+    return response
+
+
+async def _fetch_works(result: SourceResult, query: str, jwt_token: Optional[str], limit: int) -> None:
+    session, error = await search_sessions.create(query, jwt_token)
+    if error:
+        _check(error)
+    result.session = session
+    result.items = session.results
+    result.total = session.total
+
+
+async def _fetch_terms(result: SourceResult, query: str, jwt_token: Optional[str], limit: int) -> None:
+    response = _check(await terms_service.search(query=query, limit=limit, jwt_token=jwt_token))
+    result.items = response.get("terms", response.get("data", []))
+    result.total = response.get("pagination", {}).get("total", len(result.items))
+
+
+async def _fetch_composers(result: SourceResult, query: str, jwt_token: Optional[str], limit: int) -> None:
+    response = _check(await api_client.get_composers(jwt_token=jwt_token, search=query))
+    composers = sorted(response.get("composers", []), key=lambda c: -(c.get("works_count") or 0))
+    result.items = composers[:limit]
+    result.total = len(composers)
+
+
+async def _fetch_categories(result: SourceResult, query: str, jwt_token: Optional[str], limit: int) -> None:
+    response = _check(await api_client.get_search_suggestions(
+        query, search_type="categories", jwt_token=jwt_token, limit=limit
+    ))
+    result.items = response.get("suggestions", [])
+    result.total = len(result.items)
+
+
+_FETCHERS = {
+    "works": _fetch_works,
+    "terms": _fetch_terms,
+    "composers": _fetch_composers,
+    "categories": _fetch_categories,
+}
+
+
+async def search_everything(query: str, jwt_token: Optional[str] = None, deadline: float = 4.0,
+                            on_update: Optional[Callable[[Dict[str, SourceResult]], Awaitable[None]]] = None,
+                            sources: Sequence[str] = SOURCES,
+                            limit: int = 5) -> Dict[str, SourceResult]:
+    """Параллельный поиск по источникам с общим сроком ответа.
+
+    on_update вызывается после ответа каждого источника, чтобы показать
+    результаты сразу, не дожидаясь остальных. Источники, не успевшие к сроку,
+    отменяются и остаются в статусе loading. Сами запросы к Backend при этом
+    не прерываются (см. SingleFlight) и попадают в кеш поиска.
+    """
+    results = {name: SourceResult() for name in sources}
+    started = time.monotonic()
+
+    async def run(name: str) -> None:
+        result = results[name]
+        try:
+            await _FETCHERS[name](result, query, jwt_token, limit)
+            result.status = "done"
+        except Exception as e:
+            logger.warning(f"Общий поиск '{query}': источник {name} недоступен: {e}")
+            result.status = "error"
+        result.elapsed = time.monotonic() - started
+
+        if on_update:
+            try:
+                await on_update(results)
+            except Exception as e:
+                logger.error(f"Ошибка показа промежуточных результатов поиска: {e}")
+
+    try:
+        async with asyncio.timeout(deadline):
+            async with asyncio.TaskGroup() as group:
+                for name in sources:
+                    group.create_task(run(name))
+    except TimeoutError:
+        missed = [name for name, result in results.items() if result.status == "loading"]
+        logger.info(f"Общий поиск '{query}': не успели за {deadline}с: {', '.join(missed)}")
+
+    return results
@@ -0,0 +1,120 @@
+"""
+Сессии поиска: снимок ранжированных результатов для пагинации без повторного поиска
+"""
+
+import asyncio
+import math
+import secrets
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+
+from config.settings import settings
+from services.api_client import api_client
+from services.cache_service import LRUCache
+
+
+@dataclass
+class SearchSession:
+    """Снимок результатов одного поиска"""
+    id: str
+    query: str
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    total: int = 0
+    # Сколько окон результатов уже загружено с Backend и есть ли еще
+    windows: int = 0
+    has_more: bool = False
+    # Последняя показанная страница (для кнопки "Назад" из карточки произведения)
+    page: int = 1
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def total_pages(self, per_page: int) -> int:
+        """Число страниц: по загруженным результатам или по оценке Backend"""
+        count = len(self.results)
+        if self.has_more:
+            count = max(count, self.total)
+        return max(1, math.ceil(count / per_page))
+
+    def get_work(self, work_id: int) -> Optional[Dict[str, Any]]:
+        """Произведение из снимка"""
+        for work in self.results:
+            if work.get("id") == work_id:
+                return work
+        return None
+
+
+class SearchSessionStore:
+    """Хранилище сессий поиска в памяти процесса.
+
+    Первый поиск забирает с Backend окно из window результатов и сохраняет его
+    под коротким идентификатором. Листание, возврат к результатам и карточки
+    произведений обслуживаются из снимка; следующее окно подгружается,
+    только если пользователь долистал до конца загруженного.
+    """
+
+    def __init__(self, maxsize: int = 5000, ttl: int = 1800, window: int = 100):
+        self.window = window
+        self._sessions = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _new_id() -> str:
+        # 8 hex-символов: без "_" и укладывается в лимит callback_data в 64 байта
+        return secrets.token_hex(4)
+
+    async def _load_window(self, session: SearchSession,
+                           jwt_token: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Загрузка следующего окна результатов. Возвращает ответ Backend с ошибкой, если она была"""
+        response = await api_client.smart_search_works(
+            query=session.query,
+            page=session.windows + 1,
+            limit=self.window,
+            jwt_token=jwt_token
+        )
+
+        if not response or response.get("error"):
+            return response or {"error": "connection_error", "message": "Ошибка соединения с сервером"}
+
+        session.results.extend(response.get("results", []))
+        session.total = response.get("total", len(session.results))
+        session.has_more = bool(response.get("pagination", {}).get("has_next"))
+        session.windows += 1
+        return None
+
+    async def create(self, query: str,
+                     jwt_token: Optional[str] = None) -> Tuple[Optional[SearchSession], Optional[Dict[str, Any]]]:
+        """Новый поиск: (сессия, None) при успехе или (None, ответ с ошибкой)"""
+        session = SearchSession(id=self._new_id(), query=query)
+
+        error = await self._load_window(session, jwt_token)
+        if error:
+            return None, error
+
+        self._sessions.set(session.id, session)
+        logger.debug(f"Сессия поиска {session.id} для '{query}': {len(session.results)} результатов")
+        return session, None
+
+    def get(self, session_id: str) -> Optional[SearchSession]:
+        """Сессия по идентификатору (None, если истекла)"""
+        return self._sessions.get(session_id)
+
+    async def get_page(self, session: SearchSession, page: int, per_page: int,
+                       jwt_token: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Результаты страницы; при необходимости догружаем следующее окно"""
+        end = page * per_page
+
+        # Одновременные нажатия не должны загрузить одно окно дважды
+        async with session.lock:
+            while end > len(session.results) and session.has_more:
+                if await self._load_window(session, jwt_token):
+                    break
+
+        session.page = page
+        return session.results[(page - 1) * per_page:end]
+
+
+# Глобальный экземпляр хранилища сессий поиска
+search_sessions = SearchSessionStore(
+    maxsize=settings.SEARCH_SESSION_MAX,
+    ttl=settings.SEARCH_SESSION_TTL,
+    window=settings.SEARCH_SESSION_WINDOW
+)
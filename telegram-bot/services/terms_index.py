@@ -0,0 +1,320 @@
+"""
+Локальный словарь музыкальных терминов из files/terms.csv
+"""
+
+import asyncio
+import bisect
+import csv
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+
+from config.settings import settings
+from services.api_client import api_client
+
+
+_WORD_RE = re.compile(r"\w+")
+
+# Кириллические буквы, совпадающие по начертанию с латинскими. В словаре они
+# встречаются внутри латинских слов ("Аllegro", "Poсо"), поэтому при поиске
+# приводим их к одному виду и в ключах, и в запросах
+_HOMOGLYPHS = str.maketrans("аеорсухкмтнв", "aeopcyxkmthb")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация для поиска: регистр, ё -> е, без диакритики, схлопнутые пробелы"""
+    text = unicodedata.normalize("NFKD", text.casefold().replace("ё", "е"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.translate(_HOMOGLYPHS).split())
+
+
+# Пометка языка в скобках заголовка: "нем. а", "англ. эй"
+_LANG_RE = re.compile(r"^([а-яё]+)\.\s*(.*)$", re.IGNORECASE)
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Разбиение по запятым вне скобок"""
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_headword(headword: str) -> Tuple[str, List[Dict[str, str]]]:
+    """Разбор заголовка на основной термин и варианты по языкам.
+
+    "Fort (фр. фор), Forte (ит. фортэ)" ->
+        ("Fort", [{"text": "Fort", "lang": "фр", "kind": "variant"},
+                  {"text": "фор", "lang": "фр", "kind": "pronunciation"},
+                  {"text": "Forte", "lang": "ит", "kind": "variant"},
+                  {"text": "фортэ", "lang": "ит", "kind": "pronunciation"}])
+
+    Незакрытые скобки (обрезанные заголовки) разбираются до конца строки.
+    """
+    aliases: List[Dict[str, str]] = []
+    canonical = ""
+
+    for segment in _split_top_level(headword):
+        name, _, inner = segment.partition("(")
+        name = name.strip()
+        inner = inner.rsplit(")", 1)[0] if ")" in inner else inner
+
+        variant_lang = ""
+        pronunciations = []
+        for part in _split_top_level(inner):
+            match = _LANG_RE.match(part)
+            lang, text = (match.group(1).lower(), match.group(2).strip()) if match else ("", part)
+            variant_lang = variant_lang or lang
+            if text:
+                pronunciations.append({"text": text, "lang": lang or variant_lang, "kind": "pronunciation"})
+
+        if name:
+            canonical = canonical or name
+            aliases.append({"text": name, "lang": variant_lang, "kind": "variant"})
+        aliases.extend(pronunciations)
+
+    return canonical or headword.strip(), aliases
+
+
+def trigrams(text: str) -> List[str]:
+    """Символьные триграммы слов строки (с границами слов)"""
+    grams = []
+    for word in _WORD_RE.findall(text):
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TermsIndex:
+    """Неизменяемый индекс терминов.
+
+    - точное совпадение: нормализованный заголовок и каждый его вариант
+      (написание на другом языке, произношение) -> id, без перебора словаря;
+    - префиксы: отсортированный массив (ключ, id) по заголовкам и их словам,
+      диапазон префикса находится двоичным поиском (компактная замена дереву);
+    - нечеткий поиск: инвертированный индекс триграмм -> id.
+    """
+
+    def __init__(self, terms: List[Dict[str, Any]]):
+        self.terms: Dict[int, Dict[str, Any]] = {term["id"]: term for term in terms}
+        self.keys: Dict[int, str] = {}
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self.trigram_counts: Dict[int, int] = {}
+        prefix_entries: List[Tuple[str, int]] = []
+
+        for term in terms:
+            term_id = term["id"]
+            key = normalize_text(term["term"])
+            self.keys[term_id] = key
+            self.exact[key].append(term_id)
+
+            canonical, aliases = parse_headword(term["term"])
+            term["canonical"] = canonical
+            term["aliases"] = aliases
+            for alias in aliases:
+                alias_key = normalize_text(alias["text"])
+                if alias_key and term_id not in self.exact[alias_key]:
+                    self.exact[alias_key].append(term_id)
+
+            prefix_entries.append((key, term_id))
+            for word in set(_WORD_RE.findall(key)):
+                if word != key:
+                    prefix_entries.append((word, term_id))
+
+            grams = set(trigrams(key))
+            self.trigram_counts[term_id] = len(grams)
+            for gram in grams:
+                self.trigram_index[gram].append(term_id)
+
+        prefix_entries.sort()
+        self.prefix_keys = [entry[0] for entry in prefix_entries]
+        self.prefix_ids = [entry[1] for entry in prefix_entries]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def prefix(self, key: str, limit: int, scan_limit: int = 256) -> List[int]:
+        """id терминов, заголовок или слово заголовка которых начинается с key.
+
+        Сначала термины, у которых с key начинается сам заголовок, затем более короткие.
+        """
+        start = bisect.bisect_left(self.prefix_keys, key)
+        end = min(len(self.prefix_keys), start + scan_limit)
+        found = set()
+        for i in range(start, end):
+            if not self.prefix_keys[i].startswith(key):
+                break
+            found.add(self.prefix_ids[i])
+
+        ranked = sorted(
+            found,
+            key=lambda term_id: (not self.keys[term_id].startswith(key), len(self.keys[term_id]))
+        )
+        return ranked[:limit]
+
+    def fuzzy(self, key: str, limit: int, min_score: float = 0.35) -> List[int]:
+        """id терминов, похожих на key по доле общих триграмм"""
+        grams = set(trigrams(key))
+        if not grams:
+            return []
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for term_id in self.trigram_index.get(gram, ()):
+                shared[term_id] += 1
+
+        scored = []
+        for term_id, count in shared.items():
+            # Коэффициент Дайса по множествам триграмм
+            score = 2 * count / (len(grams) + self.trigram_counts[term_id])
+            if score >= min_score:
+                scored.append((-score, term_id))
+
+        scored.sort()
+        return [term_id for _, term_id in scored[:limit]]
+
+    def lookup(self, query: str) -> List[Dict[str, Any]]:
+        """Термины, у которых заголовок или один из вариантов совпадает с запросом"""
+        return [self.terms[term_id] for term_id in self.exact.get(normalize_text(query), ())]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Поиск: точные совпадения, затем префиксные, затем нечеткие"""
+        key = normalize_text(query)
+        if not key:
+            return []
+
+        ids: List[int] = list(self.exact.get(key, ()))
+        if len(ids) < limit:
+            ids.extend(self.prefix(key, limit))
+        if len(ids) < limit:
+            ids.extend(self.fuzzy(key, limit))
+
+        results = []
+        seen = set()
+        for term_id in ids:
+            if term_id in seen:
+                continue
+            seen.add(term_id)
+            results.append(self.terms[term_id])
+            if len(results) >= limit:
+                break
+        return results
+
+
+def load_terms(path: str) -> List[Dict[str, Any]]:
+    """Чтение терминов из CSV (term, description); id - номер строки, как при импорте в Backend"""
+    terms = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for term_id, row in enumerate(csv.DictReader(f), 1):
+            term = (row.get("term") or "").strip()
+            if not term:
+                continue
+            terms.append({
+                "id": term_id,
+                "term": term,
+                "definition": (row.get("description") or "").strip()
+            })
+    return terms
+
+
+class TermsService:
+    """Поиск терминов по локальному индексу с перезагрузкой CSV при изменении.
+
+    Новый индекс строится в отдельном потоке и подменяет текущий одним
+    присваиванием, поэтому поиск всегда видит целый индекс. Пока индекс
+    не загружен (нет файла), запросы уходят в Backend.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 30.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.index: Optional[TermsIndex] = None
+        self._mtime: Optional[float] = None
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    async def load(self) -> bool:
+        """Загрузка или перезагрузка индекса, если файл изменился"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+
+        if mtime == self._mtime:
+            return False
+
+        try:
+            index = await asyncio.to_thread(lambda: TermsIndex(load_terms(self.path)))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки терминов из {self.path}: {e}")
+            return False
+
+        self.index = index
+        self._mtime = mtime
+        logger.info(f"Словарь терминов загружен: {len(index)} терминов из {self.path}")
+        return True
+
+    async def start(self) -> None:
+        """Первичная загрузка и запуск отслеживания изменений файла"""
+        if not await self.load():
+            logger.warning(f"Файл терминов {self.path} не найден, поиск терминов через Backend")
+        if self._watch_task is None and self.reload_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def _watch_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Ошибка проверки файла терминов: {e}")
+
+    async def close(self) -> None:
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def search(self, query: str, limit: int = 10,
+                     jwt_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Поиск терминов в формате ответа Backend ({"terms": [...], "pagination": {...}})"""
+        index = self.index
+        if index is None:
+            return await api_client.search_terms(query=query, page=1, limit=limit, jwt_token=jwt_token)
+
+        terms = index.search(query, limit)
+        return {
+            "terms": terms,
+            "pagination": {
+                "total": len(terms),
+                "limit": limit,
+                "offset": 0,
+                "hasMore": False
+            }
+        }
+
+
+# Глобальный экземпляр словаря терминов
+terms_service = TermsService(
+    path=settings.TERMS_CSV_PATH,
+    reload_interval=settings.TERMS_RELOAD_INTERVAL
+)
@@ -0,0 +1,146 @@
+"""
+Прогрев при запуске: соединения, справочные данные и частые поиски
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from loguru import logger
+
+from config.settings import settings
+from config.database import db_manager
+from services.api_client import api_client
+from services.cache_service import search_cache, record_searches
+from utils.metrics import bot_ready, warmup_duration
+
+# Поиски, результаты которых кешируются в search_cache, и их запросы к Backend
+SEARCH_FETCHERS: Dict[str, Callable[..., Awaitable[Optional[dict]]]] = {
+    "works_smart": api_client.smart_search_works,
+    "terms": api_client.search_terms,
+    "terms_smart": api_client.smart_search_terms,
+}
+
+
+class StartupWarmer:
+    """Прогрев кешей и соединений до приема обновлений.
+
+    Одновременно открываются соединения keep-alive с Backend и Telegram,
+    запрашиваются справочные данные (категории, композиторы, статистика),
+    а самые частые поиски поднимаются в L1 кеша поиска: из таблицы
+    search_cache, если запись еще не истекла, иначе запросом к Backend.
+    Запуск ждет прогрева не дольше budget секунд; не успевшие задачи
+    продолжаются в фоне и наполняют кеши для первых пользователей.
+    """
+
+    def __init__(self, budget: float = 10.0, backend_connections: int = 8, telegram_connections: int = 2,
+                 searches: int = 100, concurrency: int = 8):
+        self.budget = budget
+        self.backend_connections = backend_connections
+        self.telegram_connections = telegram_connections
+        self.searches = searches
+        self.concurrency = concurrency
+        self._background: Set[asyncio.Task] = set()
+        self.ready = False
+        self.stats: Dict[str, int] = {}
+
+    async def _count(self, name: str, call: Awaitable) -> None:
+        """Задача прогрева: успех учитывается в stats[name]"""
+        try:
+            result = await call
+        except Exception as e:
+            logger.debug(f"Прогрев {name}: {e}")
+            return
+        if isinstance(result, dict) and (result.get("error") or result.get("status") == "unhealthy"):
+            return
+        self.stats[name] = self.stats.get(name, 0) + 1
+
+    def _connections(self, bot: Optional[Bot]) -> List[Awaitable]:
+        # Одновременные запросы открывают по соединению каждый; после ответа они остаются в пуле
+        calls: List[Awaitable] = [
+            self._count("backend_connections", api_client.health_check())
+            for _ in range(self.backend_connections)
+        ]
+        if bot is not None:
+            calls.extend(
+                self._count("telegram_connections", bot.get_me())
+                for _ in range(self.telegram_connections)
+            )
+        return calls
+
+    def _reference(self) -> List[Awaitable]:
+        return [
+            self._count("reference", api_client.get_categories()),
+            self._count("reference", api_client.get_composers()),
+            self._count("reference", api_client.get_works_stats()),
+            self._count("reference", api_client.get_terms_stats()),
+        ]
+
+    async def _warm_search(self, search_type: str, query: str, limit: int, semaphore: asyncio.Semaphore) -> None:
+        # Поиски прогрева не увеличивают счетчики частых поисков
+        record_searches.set(False)
+        async with semaphore:
+            if await search_cache.get(search_cache.make_key(search_type, query, 1, limit)) is not None:
+                self.stats["searches_from_storage"] = self.stats.get("searches_from_storage", 0) + 1
+                return
+            await self._count("searches_from_backend", SEARCH_FETCHERS[search_type](query, 1, limit))
+
+    async def _searches(self) -> None:
+        if self.searches <= 0 or not search_cache.enabled:
+            return
+        popular: List[Tuple[str, str, int]] = await db_manager.get_popular_searches(self.searches)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        await asyncio.gather(*(
+            self._warm_search(search_type, query, limit, semaphore)
+            for search_type, query, limit in popular
+            if search_type in SEARCH_FETCHERS
+        ))
+
+    async def run(self, bot: Optional[Bot] = None) -> None:
+        """Прогрев с ожиданием не дольше budget; после него бот считается готовым"""
+        started = time.monotonic()
+        bot_ready.set(0)
+        if self.budget <= 0:
+            self._mark_ready(started)
+            return
+
+        tasks = [
+            asyncio.create_task(call)
+            for call in self._connections(bot) + self._reference() + [self._searches()]
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=self.budget)
+
+        if pending:
+            for task in pending:
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            logger.warning(
+                f"⏱ Бюджет прогрева {self.budget:g}с истек: {len(pending)} задач продолжаются в фоне"
+            )
+        self._mark_ready(started)
+
+    def _mark_ready(self, started: float) -> None:
+        elapsed = time.monotonic() - started
+        self.ready = True
+        bot_ready.set(1)
+        warmup_duration.set(elapsed)
+        summary = ", ".join(f"{name}: {count}" for name, count in sorted(self.stats.items())) or "-"
+        logger.info(f"🔥 Прогрев за {elapsed:.2f}с ({summary})")
+
+    async def close(self) -> None:
+        """Отмена незавершенного фонового прогрева"""
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background.clear()
+
+
+# Глобальный экземпляр прогрева
+startup_warmer = StartupWarmer(
+    budget=settings.WARMUP_BUDGET,
+    backend_connections=settings.WARMUP_BACKEND_CONNECTIONS,
+    telegram_connections=settings.WARMUP_TELEGRAM_CONNECTIONS,
+    searches=settings.WARMUP_SEARCHES,
+    concurrency=settings.WARMUP_CONCURRENCY
+)
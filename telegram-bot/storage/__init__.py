@@ -0,0 +1,17 @@
+"""
+Хранилища данных бота (SQLite / MySQL)
+"""
+
+from .base import BaseStorage, DEFAULT_PREFERENCES, to_sql_timestamp
+from .sqlite import SQLiteStorage
+from .sqlite_wal import WALSQLiteStorage
+from .mysql import MySQLStorage
+
+__all__ = [
+    "BaseStorage",
+    "DEFAULT_PREFERENCES",
+    "to_sql_timestamp",
+    "SQLiteStorage",
+    "WALSQLiteStorage",
+    "MySQLStorage"
+]
@@ -0,0 +1,110 @@
+"""
+Базовый интерфейс хранилища бота (сессии, кеш поиска, настройки, file_id Telegram)
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+
+# Настройки пользователя по умолчанию
+DEFAULT_PREFERENCES: Dict[str, Any] = {
+    "language": "ru",
+    "notifications": True,
+    "default_search_type": "all",
+    "items_per_page": 5
+}
+
+
+def to_sql_timestamp(value: str) -> str:
+    """Приведение ISO-времени к UTC в формате SQL ('YYYY-MM-DD HH:MM:SS').
+
+    В этом формате строки сравниваются так же, как datetime('now') в SQLite
+    и UTC_TIMESTAMP() в MySQL. Время без часового пояса считается локальным.
+    """
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return value
+    
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BaseStorage(ABC):
+    """Хранилище бота. Реализации бросают исключения, обработка ошибок - в DatabaseManager"""
+    
+    name: str = "base"
+    
+    @abstractmethod
+    async def connect(self) -> None:
+        """Подключение и создание таблиц"""
+    
+    @abstractmethod
+    async def close(self) -> None:
+        """Закрытие соединений"""
+    
+    @abstractmethod
+    async def save_user_session(self, telegram_id: int, jwt_token: str,
+                                user_data: str, expires_at: str) -> None:
+        """Сохранение пользовательской сессии"""
+    
+    @abstractmethod
+    async def get_user_session(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """Получение активной пользовательской сессии"""
+    
+    @abstractmethod
+    async def delete_user_session(self, telegram_id: int) -> None:
+        """Деактивация пользовательской сессии"""
+    
+    @abstractmethod
+    async def save_search_cache(self, query_hash: str, query_text: str,
+                                results: str, expires_at: str) -> None:
+        """Сохранение результатов поиска в кеш"""
+    
+    @abstractmethod
+    async def get_search_cache(self, query_hash: str) -> Optional[Tuple[str, float]]:
+        """Получение неистекших результатов поиска из кеша и оставшегося срока (секунды)"""
+    
+    @abstractmethod
+    async def record_search(self, search_type: str, query_text: str, limit: int) -> None:
+        """Учет поиска (первой страницы результатов)"""
+    
+    @abstractmethod
+    async def get_popular_searches(self, limit: int) -> List[Tuple[str, str, int]]:
+        """Самые частые поиски: (тип, нормализованный запрос, размер страницы)"""
+    
+    @abstractmethod
+    async def save_user_preferences(self, telegram_id: int, preferences: Dict[str, Any]) -> None:
+        """Сохранение пользовательских настроек"""
+    
+    @abstractmethod
+    async def get_user_preferences(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """Получение пользовательских настроек (None, если не сохранены)"""
+    
+    @abstractmethod
+    async def save_telegram_file(self, work_id: int, fingerprint: str,
+                                 file_id: str, file_unique_id: str) -> None:
+        """Сохранение file_id загруженного в Telegram файла произведения"""
+    
+    @abstractmethod
+    async def get_telegram_file(self, work_id: int) -> Optional[Dict[str, Any]]:
+        """Получение file_id файла произведения (None, если файл не загружался)"""
+    
+    @abstractmethod
+    async def delete_telegram_file(self, work_id: int) -> None:
+        """Удаление file_id файла произведения"""
+    
+    @abstractmethod
+    async def record_download(self, work_id: int) -> None:
+        """Учет скачивания произведения"""
+    
+    @abstractmethod
+    async def get_popular_works(self, limit: int) -> List[int]:
+        """id самых скачиваемых произведений"""
+    
+    @abstractmethod
+    async def cleanup_expired_data(self) -> None:
+        """Очистка устаревших сессий и кеша"""
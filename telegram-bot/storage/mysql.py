@@ -0,0 +1,293 @@
+"""
+Хранилище бота на MySQL (общее для нескольких реплик бота)
+"""
+
+import aiomysql
+from typing import Optional, Dict, Any, List, Tuple
+
+from .base import BaseStorage, to_sql_timestamp
+
+
+class MySQLStorage(BaseStorage):
+    """Хранилище на пуле соединений aiomysql.
+
+    Каждый запрос берет соединение из пула и возвращает его после выполнения,
+    поэтому несколько реплик бота могут разделять сессии и кеш поиска.
+    """
+    
+    name = "mysql"
+    
+    def __init__(self, host: str, port: int, user: str, password: str, db: str,
+                 minsize: int = 1, maxsize: int = 10):
+        self._pool_params = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "db": db,
+            "minsize": minsize,
+            "maxsize": maxsize
+        }
+        self._pool: Optional[aiomysql.Pool] = None
+    
+    async def connect(self) -> None:
+        self._pool = await aiomysql.create_pool(
+            **self._pool_params,
+            autocommit=True,
+            charset="utf8mb4",
+            # Время в таблицах храним и сравниваем в UTC
+            init_command="SET time_zone = '+00:00'"
+        )
+        await self._create_tables()
+    
+    async def _create_tables(self) -> None:
+        """Создание таблиц"""
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                telegram_id BIGINT PRIMARY KEY,
+                jwt_token TEXT,
+                user_data TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NULL,
+                is_active BOOLEAN DEFAULT TRUE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                query_hash VARCHAR(255) UNIQUE,
+                query_text TEXT,
+                results LONGTEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS search_queries (
+                search_type VARCHAR(32) NOT NULL,
+                query_text VARCHAR(255) NOT NULL,
+                page_limit INT NOT NULL,
+                searches INT DEFAULT 0,
+                last_search_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (search_type, query_text, page_limit),
+                INDEX idx_searches (searches)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS user_preferences (
+                telegram_id BIGINT PRIMARY KEY,
+                language VARCHAR(16) DEFAULT 'ru',
+                notifications BOOLEAN DEFAULT TRUE,
+                default_search_type VARCHAR(32) DEFAULT 'all',
+                items_per_page INT DEFAULT 5,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS telegram_files (
+                work_id BIGINT PRIMARY KEY,
+                fingerprint VARCHAR(64) NOT NULL,
+                file_id VARCHAR(255) NOT NULL,
+                file_unique_id VARCHAR(64),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        await self._execute("""
+            CREATE TABLE IF NOT EXISTS work_downloads (
+                work_id BIGINT PRIMARY KEY,
+                downloads INT DEFAULT 0,
+                last_download_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_downloads (downloads)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+    
+    async def _execute(self, query: str, params: tuple = ()) -> None:
+        """Выполнение запроса без результата"""
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+    
+    async def _fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        """Выполнение запроса и получение одной строки"""
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone()
+    
+    async def _fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        """Выполнение запроса и получение всех строк"""
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return list(await cur.fetchall())
+    
+    async def close(self) -> None:
+        if self._pool:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+    
+    async def save_user_session(self, telegram_id: int, jwt_token: str,
+                                user_data: str, expires_at: str) -> None:
+        await self._execute("""
+            INSERT INTO user_sessions
+            (telegram_id, jwt_token, user_data, expires_at, is_active)
+            VALUES (%s, %s, %s, %s, TRUE)
+            ON DUPLICATE KEY UPDATE
+                jwt_token = VALUES(jwt_token),
+                user_data = VALUES(user_data),
+                expires_at = VALUES(expires_at),
+                is_active = TRUE
+        """, (telegram_id, jwt_token, user_data, to_sql_timestamp(expires_at)))
+    
+    async def get_user_session(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT jwt_token, user_data, expires_at, is_active
+            FROM user_sessions
+            WHERE telegram_id = %s AND is_active = TRUE
+        """, (telegram_id,))
+        
+        if row:
+            return {
+                "jwt_token": row[0],
+                "user_data": row[1],
+                "expires_at": row[2].isoformat() if row[2] else None,
+                "is_active": bool(row[3])
+            }
+        return None
+    
+    async def delete_user_session(self, telegram_id: int) -> None:
+        await self._execute("""
+            UPDATE user_sessions
+            SET is_active = FALSE
+            WHERE telegram_id = %s
+        """, (telegram_id,))
+    
+    async def save_search_cache(self, query_hash: str, query_text: str,
+                                results: str, expires_at: str) -> None:
+        await self._execute("""
+            INSERT INTO search_cache
+            (query_hash, query_text, results, expires_at)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                query_text = VALUES(query_text),
+                results = VALUES(results),
+                expires_at = VALUES(expires_at)
+        """, (query_hash, query_text, results, to_sql_timestamp(expires_at)))
+    
+    async def get_search_cache(self, query_hash: str) -> Optional[Tuple[str, float]]:
+        row = await self._fetchone("""
+            SELECT results, TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), expires_at) FROM search_cache
+            WHERE query_hash = %s AND expires_at > UTC_TIMESTAMP()
+        """, (query_hash,))
+        return (row[0], float(row[1])) if row else None
+    
+    async def record_search(self, search_type: str, query_text: str, limit: int) -> None:
+        await self._execute("""
+            INSERT INTO search_queries (search_type, query_text, page_limit, searches)
+            VALUES (%s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE
+                searches = searches + 1,
+                last_search_at = CURRENT_TIMESTAMP
+        """, (search_type, query_text, limit))
+    
+    async def get_popular_searches(self, limit: int) -> List[Tuple[str, str, int]]:
+        rows = await self._fetchall("""
+            SELECT search_type, query_text, page_limit FROM search_queries
+            ORDER BY searches DESC, last_search_at DESC
+            LIMIT %s
+        """, (limit,))
+        return [(row[0], row[1], row[2]) for row in rows]
+    
+    async def save_user_preferences(self, telegram_id: int, preferences: Dict[str, Any]) -> None:
+        await self._execute("""
+            INSERT INTO user_preferences
+            (telegram_id, language, notifications, default_search_type, items_per_page)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                language = VALUES(language),
+                notifications = VALUES(notifications),
+                default_search_type = VALUES(default_search_type),
+                items_per_page = VALUES(items_per_page)
+        """, (
+            telegram_id,
+            preferences.get("language", "ru"),
+            preferences.get("notifications", True),
+            preferences.get("default_search_type", "all"),
+            preferences.get("items_per_page", 5)
+        ))
+    
+    async def get_user_preferences(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT language, notifications, default_search_type, items_per_page
+            FROM user_preferences WHERE telegram_id = %s
+        """, (telegram_id,))
+        
+        if row:
+            return {
+                "language": row[0],
+                "notifications": bool(row[1]),
+                "default_search_type": row[2],
+                "items_per_page": row[3]
+            }
+        return None
+    
+    async def save_telegram_file(self, work_id: int, fingerprint: str,
+                                 file_id: str, file_unique_id: str) -> None:
+        await self._execute("""
+            INSERT INTO telegram_files
+            (work_id, fingerprint, file_id, file_unique_id)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                fingerprint = VALUES(fingerprint),
+                file_id = VALUES(file_id),
+                file_unique_id = VALUES(file_unique_id),
+                created_at = CURRENT_TIMESTAMP
+        """, (work_id, fingerprint, file_id, file_unique_id))
+    
+    async def get_telegram_file(self, work_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT fingerprint, file_id, file_unique_id
+            FROM telegram_files WHERE work_id = %s
+        """, (work_id,))
+        
+        if row:
+            return {
+                "fingerprint": row[0],
+                "file_id": row[1],
+                "file_unique_id": row[2]
+            }
+        return None
+    
+    async def delete_telegram_file(self, work_id: int) -> None:
+        await self._execute("""
+            DELETE FROM telegram_files WHERE work_id = %s
+        """, (work_id,))
+    
+    async def record_download(self, work_id: int) -> None:
+        await self._execute("""
+            INSERT INTO work_downloads (work_id, downloads)
+            VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE
+                downloads = downloads + 1,
+                last_download_at = CURRENT_TIMESTAMP
+        """, (work_id,))
+    
+    async def get_popular_works(self, limit: int) -> List[int]:
+        rows = await self._fetchall("""
+            SELECT work_id FROM work_downloads
+            ORDER BY downloads DESC, last_download_at DESC
+            LIMIT %s
+        """, (limit,))
+        return [row[0] for row in rows]
+    
+    async def cleanup_expired_data(self) -> None:
+        await self._execute("""
+            UPDATE user_sessions
+            SET is_active = FALSE
+            WHERE expires_at <= UTC_TIMESTAMP()
+        """)
+        await self._execute("""
+            DELETE FROM search_cache
+            WHERE expires_at <= UTC_TIMESTAMP()
+        """)
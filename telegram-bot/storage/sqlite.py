@@ -0,0 +1,268 @@
+"""
+Хранилище бота на SQLite
+"""
+
+import aiosqlite
+from typing import Optional, Dict, Any, List, Tuple
+
+from .base import BaseStorage, to_sql_timestamp
+
+
+# Схема таблиц кеша бота
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        telegram_id INTEGER PRIMARY KEY,
+        jwt_token TEXT,
+        user_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS search_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query_hash TEXT UNIQUE,
+        query_text TEXT,
+        results TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS search_queries (
+        search_type TEXT NOT NULL,
+        query_text TEXT NOT NULL,
+        page_limit INTEGER NOT NULL,
+        searches INTEGER DEFAULT 0,
+        last_search_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (search_type, query_text, page_limit)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_preferences (
+        telegram_id INTEGER PRIMARY KEY,
+        language TEXT DEFAULT 'ru',
+        notifications BOOLEAN DEFAULT TRUE,
+        default_search_type TEXT DEFAULT 'all',
+        items_per_page INTEGER DEFAULT 5,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS telegram_files (
+        work_id INTEGER PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        file_id TEXT NOT NULL,
+        file_unique_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS work_downloads (
+        work_id INTEGER PRIMARY KEY,
+        downloads INTEGER DEFAULT 0,
+        last_download_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+]
+
+
+async def create_tables(conn: aiosqlite.Connection) -> None:
+    """Создание таблиц"""
+    for statement in SCHEMA:
+        await conn.execute(statement)
+    await conn.commit()
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище на одном соединении aiosqlite"""
+    
+    name = "sqlite"
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[aiosqlite.Connection] = None
+    
+    async def connect(self) -> None:
+        self._conn = await aiosqlite.connect(self.db_path)
+        await create_tables(self._conn)
+    
+    async def close(self) -> None:
+        if self._conn:
+            await self._conn.close()
+            self._conn = None
+    
+    async def _write(self, query: str, params: tuple = (), wait: bool = True) -> None:
+        """Выполнение изменяющего запроса с фиксацией"""
+        await self._write_many([(query, params)], wait=wait)
+    
+    async def _write_many(self, statements: List[Tuple[str, tuple]], wait: bool = True) -> None:
+        """Выполнение нескольких изменяющих запросов в одной транзакции"""
+        for query, params in statements:
+            await self._conn.execute(query, params)
+        await self._conn.commit()
+    
+    async def _fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        """Выполнение запроса и получение одной строки"""
+        async with self._conn.execute(query, params) as cursor:
+            return await cursor.fetchone()
+    
+    async def _fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        """Выполнение запроса и получение всех строк"""
+        async with self._conn.execute(query, params) as cursor:
+            return list(await cursor.fetchall())
+    
+    async def save_user_session(self, telegram_id: int, jwt_token: str,
+                                user_data: str, expires_at: str) -> None:
+        await self._write("""
+            INSERT OR REPLACE INTO user_sessions 
+            (telegram_id, jwt_token, user_data, expires_at, is_active)
+            VALUES (?, ?, ?, ?, ?)
+        """, (telegram_id, jwt_token, user_data, to_sql_timestamp(expires_at), True))
+    
+    async def get_user_session(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT jwt_token, user_data, expires_at, is_active
+            FROM user_sessions 
+            WHERE telegram_id = ? AND is_active = TRUE
+        """, (telegram_id,))
+        
+        if row:
+            return {
+                "jwt_token": row[0],
+                "user_data": row[1],
+                "expires_at": row[2],
+                "is_active": row[3]
+            }
+        return None
+    
+    async def delete_user_session(self, telegram_id: int) -> None:
+        await self._write("""
+            UPDATE user_sessions 
+            SET is_active = FALSE 
+            WHERE telegram_id = ?
+        """, (telegram_id,))
+    
+    async def save_search_cache(self, query_hash: str, query_text: str,
+                                results: str, expires_at: str) -> None:
+        # Запись кеша не критична: не ждем фиксации транзакции
+        await self._write("""
+            INSERT OR REPLACE INTO search_cache
+            (query_hash, query_text, results, expires_at)
+            VALUES (?, ?, ?, ?)
+        """, (query_hash, query_text, results, to_sql_timestamp(expires_at)), wait=False)
+    
+    async def get_search_cache(self, query_hash: str) -> Optional[Tuple[str, float]]:
+        row = await self._fetchone("""
+            SELECT results, (julianday(expires_at) - julianday('now')) * 86400 FROM search_cache 
+            WHERE query_hash = ? AND datetime(expires_at) > datetime('now')
+        """, (query_hash,))
+        return (row[0], float(row[1])) if row else None
+    
+    async def record_search(self, search_type: str, query_text: str, limit: int) -> None:
+        # Счетчик не критичен: не ждем фиксации транзакции
+        await self._write("""
+            INSERT INTO search_queries (search_type, query_text, page_limit, searches, last_search_at)
+            VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(search_type, query_text, page_limit) DO UPDATE SET
+                searches = searches + 1,
+                last_search_at = CURRENT_TIMESTAMP
+        """, (search_type, query_text, limit), wait=False)
+    
+    async def get_popular_searches(self, limit: int) -> List[Tuple[str, str, int]]:
+        rows = await self._fetchall("""
+            SELECT search_type, query_text, page_limit FROM search_queries
+            ORDER BY searches DESC, last_search_at DESC
+            LIMIT ?
+        """, (limit,))
+        return [(row[0], row[1], row[2]) for row in rows]
+    
+    async def save_user_preferences(self, telegram_id: int, preferences: Dict[str, Any]) -> None:
+        await self._write("""
+            INSERT OR REPLACE INTO user_preferences
+            (telegram_id, language, notifications, default_search_type, items_per_page)
+            VALUES (?, ?, ?, ?, ?)
+        """, (
+            telegram_id,
+            preferences.get("language", "ru"),
+            preferences.get("notifications", True),
+            preferences.get("default_search_type", "all"),
+            preferences.get("items_per_page", 5)
+        ))
+    
+    async def get_user_preferences(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT language, notifications, default_search_type, items_per_page
+            FROM user_preferences WHERE telegram_id = ?
+        """, (telegram_id,))
+        
+        if row:
+            return {
+                "language": row[0],
+                "notifications": row[1],
+                "default_search_type": row[2],
+                "items_per_page": row[3]
+            }
+        return None
+    
+    async def save_telegram_file(self, work_id: int, fingerprint: str,
+                                 file_id: str, file_unique_id: str) -> None:
+        await self._write("""
+            INSERT OR REPLACE INTO telegram_files
+            (work_id, fingerprint, file_id, file_unique_id)
+            VALUES (?, ?, ?, ?)
+        """, (work_id, fingerprint, file_id, file_unique_id))
+    
+    async def get_telegram_file(self, work_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("""
+            SELECT fingerprint, file_id, file_unique_id
+            FROM telegram_files WHERE work_id = ?
+        """, (work_id,))
+        
+        if row:
+            return {
+                "fingerprint": row[0],
+                "file_id": row[1],
+                "file_unique_id": row[2]
+            }
+        return None
+    
+    async def delete_telegram_file(self, work_id: int) -> None:
+        await self._write("""
+            DELETE FROM telegram_files WHERE work_id = ?
+        """, (work_id,))
+    
+    async def record_download(self, work_id: int) -> None:
+        # Счетчик не критичен: не ждем фиксации транзакции
+        await self._write("""
+            INSERT INTO work_downloads (work_id, downloads, last_download_at)
+            VALUES (?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(work_id) DO UPDATE SET
+                downloads = downloads + 1,
+                last_download_at = CURRENT_TIMESTAMP
+        """, (work_id,), wait=False)
+    
+    async def get_popular_works(self, limit: int) -> List[int]:
+        rows = await self._fetchall("""
+            SELECT work_id FROM work_downloads
+            ORDER BY downloads DESC, last_download_at DESC
+            LIMIT ?
+        """, (limit,))
+        return [row[0] for row in rows]
+    
+    async def cleanup_expired_data(self) -> None:
+        await self._write_many([
+            # Деактивируем устаревшие сессии
+            ("""
+                UPDATE user_sessions 
+                SET is_active = FALSE 
+                WHERE datetime(expires_at) <= datetime('now')
+            """, ()),
+            # Удаляем устаревший кеш поиска
+            ("""
+                DELETE FROM search_cache 
+                WHERE datetime(expires_at) <= datetime('now')
+            """, ())
+        ])
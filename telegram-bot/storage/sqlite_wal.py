@@ -0,0 +1,208 @@
+"""
+Хранилище бота на SQLite в режиме WAL: пул читателей и один писатель
+"""
+
+import asyncio
+import aiosqlite
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, List, Tuple
+from loguru import logger
+
+from .sqlite import SQLiteStorage, SCHEMA
+
+
+@dataclass
+class WriteJob:
+    """Группа изменяющих запросов, фиксируемая атомарно"""
+    statements: List[Tuple[str, tuple]]
+    future: Optional[asyncio.Future] = None
+
+
+class WALSQLiteStorage(SQLiteStorage):
+    """SQLite с WAL, synchronous=NORMAL, пулом соединений на чтение и одной задачей-писателем.
+
+    Чтения идут через отдельные соединения и в режиме WAL не ждут записей.
+    Записи складываются в очередь; писатель объединяет их в короткие транзакции
+    (не больше batch_size запросов или flush_interval секунд ожидания) и фиксирует
+    каждую пачку за один переход в свой поток.
+    """
+
+    name = "sqlite-wal"
+
+    def __init__(self, db_path: str, readers: int = 4, batch_size: int = 64,
+                 flush_interval: float = 0.005):
+        super().__init__(db_path)
+        self.readers_count = max(1, readers)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._readers: List[aiosqlite.Connection] = []
+        self._next_reader = 0
+        self._queue: "asyncio.Queue[Optional[WriteJob]]" = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_executor: Optional[ThreadPoolExecutor] = None
+
+    async def connect(self) -> None:
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        await self._run_in_writer(self._open_writer)
+
+        for _ in range(self.readers_count):
+            reader = await aiosqlite.connect(self.db_path)
+            await reader.execute("PRAGMA query_only=ON")
+            await reader.execute("PRAGMA busy_timeout=5000")
+            self._readers.append(reader)
+
+        self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def close(self) -> None:
+        if self._writer_task:
+            # Писатель дофиксирует очередь и завершится
+            self._queue.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+
+        for reader in self._readers:
+            await reader.close()
+        self._readers.clear()
+
+        if self._writer_executor:
+            await self._run_in_writer(self._writer.close)
+            self._writer_executor.shutdown(wait=True)
+            self._writer_executor = None
+            self._writer = None
+
+    async def _run_in_writer(self, func, *args):
+        """Выполнение функции в потоке писателя"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer_executor, func, *args)
+
+    def _open_writer(self) -> None:
+        """Открытие соединения писателя (в потоке писателя); транзакциями управляем явно"""
+        self._writer = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.execute("PRAGMA busy_timeout=5000")
+        for statement in SCHEMA:
+            self._writer.execute(statement)
+
+    async def _write_many(self, statements: List[Tuple[str, tuple]], wait: bool = True) -> None:
+        """Постановка записи в очередь писателя; при wait=True ждем фиксации"""
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait(WriteJob(statements, future))
+            await future
+        else:
+            self._queue.put_nowait(WriteJob(statements))
+
+    def _reader(self) -> aiosqlite.Connection:
+        """Следующее соединение на чтение.
+
+        Читатели выбираются по кругу: у каждого соединения aiosqlite своя
+        FIFO-очередь запросов в собственном потоке, поэтому порядок честный.
+        """
+        reader = self._readers[self._next_reader]
+        self._next_reader = (self._next_reader + 1) % len(self._readers)
+        return reader
+    
+    async def _fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        # Курсор закрываем сразу, чтобы не удерживать снимок WAL
+        async with self._reader().execute(query, params) as cursor:
+            return await cursor.fetchone()
+    
+    async def _fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        async with self._reader().execute(query, params) as cursor:
+            return list(await cursor.fetchall())
+
+    def _drain(self, batch: List[WriteJob], statements: int) -> Tuple[int, bool]:
+        """Забор уже накопившихся записей без ожидания. Возвращает (число запросов, получен ли сигнал остановки)"""
+        while statements < self.batch_size:
+            try:
+                job = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if job is None:
+                return statements, True
+            batch.append(job)
+            statements += len(job.statements)
+        return statements, False
+
+    async def _writer_loop(self) -> None:
+        """Задача-писатель: группирует записи в транзакции"""
+        stopping = False
+
+        while not stopping:
+            job = await self._queue.get()
+            if job is None:
+                break
+
+            batch = [job]
+            statements, stopping = self._drain(batch, len(job.statements))
+
+            # Даем накопиться соседним записям, если пачка не заполнена
+            if not stopping and statements < self.batch_size and self.flush_interval > 0:
+                await asyncio.sleep(self.flush_interval)
+                statements, stopping = self._drain(batch, statements)
+
+            await self._flush(batch)
+
+        # Дофиксируем то, что осталось после сигнала остановки
+        remaining: List[WriteJob] = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job is not None:
+                remaining.append(job)
+        if remaining:
+            await self._flush(remaining)
+
+    async def _flush(self, batch: List[WriteJob]) -> None:
+        """Фиксация пачки записей"""
+        try:
+            errors = await self._run_in_writer(self._flush_sync, [job.statements for job in batch])
+        except Exception as e:
+            logger.error(f"Ошибка фиксации пачки записей SQLite: {e}")
+            errors = [e] * len(batch)
+
+        for job, error in zip(batch, errors):
+            if job.future is None:
+                if error:
+                    logger.error(f"Ошибка фоновой записи SQLite: {error}")
+                continue
+            if job.future.done():
+                continue
+            if error:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(None)
+
+    def _flush_sync(self, groups: List[List[Tuple[str, tuple]]]) -> List[Optional[BaseException]]:
+        """Фиксация пачки одной транзакцией (в потоке писателя).
+
+        Если транзакция пачки не удалась, группы повторяются по одной,
+        чтобы ошибка одной записи не теряла остальные.
+        """
+        try:
+            self._commit_sync(groups)
+            return [None] * len(groups)
+        except Exception:
+            errors: List[Optional[BaseException]] = []
+            for statements in groups:
+                try:
+                    self._commit_sync([statements])
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+            return errors
+
+    def _commit_sync(self, groups: List[List[Tuple[str, tuple]]]) -> None:
+        """Выполнение групп запросов в одной транзакции"""
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            for statements in groups:
+                for query, params in statements:
+                    self._writer.execute(query, params)
+            self._writer.execute("COMMIT")
+        except Exception:
+            self._writer.execute("ROLLBACK")
+            raise
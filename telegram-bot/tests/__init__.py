@@ -0,0 +1,8 @@
+"""
+Тесты бота (запуск из каталога telegram-bot: python -m unittest discover -s tests -t .)
+"""
+
+import os
+
+# Настройки проверяют токен при импорте; сеть в тестах не используется
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
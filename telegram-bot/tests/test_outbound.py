@@ -0,0 +1,84 @@
+"""
+Повтор исходящих запросов после 429: файлы, которые нельзя прочитать второй раз
+"""
+
+import unittest
+from typing import AsyncIterator, List
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendDocument
+from aiogram.types import BufferedInputFile
+
+from middleware.outbound import OutboundLimiter
+from services.file_transfer import BackendStreamFile
+
+
+class FakeContent:
+    """Тело ответа aiohttp, которое можно прочитать только один раз"""
+
+    def __init__(self, chunks: List[bytes]):
+        self._chunks = list(chunks)
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        while self._chunks:
+            yield self._chunks.pop(0)
+
+
+class FakeResponse:
+    def __init__(self, chunks: List[bytes]):
+        self.content = FakeContent(chunks)
+
+
+class FloodOnceSession:
+    """make_request, который вычитывает файл и на первый вызов отвечает 429"""
+
+    def __init__(self):
+        self.calls = 0
+        self.uploads: List[bytes] = []
+
+    async def __call__(self, bot, method):
+        self.calls += 1
+        body = b"".join([bytes(chunk) async for chunk in method.document.read(bot)])
+        self.uploads.append(body)
+        if self.calls == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        return True
+
+
+class RetryAfterUploadTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.limiter = OutboundLimiter(global_rate=1000, chat_rate=1000, chat_burst=1000)
+        self.session = FloodOnceSession()
+
+    async def test_stream_upload_is_not_retried(self):
+        document = BackendStreamFile(FakeResponse([b"%PDF", b"-1.4"]), filename="work.pdf")
+        method = SendDocument(chat_id=1, document=document)
+
+        with self.assertRaises(TelegramRetryAfter):
+            await self.limiter(self.session, None, method)
+
+        # Второй загрузки с пустым телом не было: 429 достался вызывающему
+        self.assertEqual(self.session.calls, 1)
+        self.assertEqual(self.session.uploads, [b"%PDF-1.4"])
+        self.assertEqual(self.limiter.retries, 0)
+
+    async def test_stream_cannot_be_read_twice(self):
+        document = BackendStreamFile(FakeResponse([b"%PDF"]), filename="work.pdf")
+        self.assertEqual([chunk async for chunk in document.read(None)], [b"%PDF"])
+
+        with self.assertRaises(RuntimeError):
+            async for _ in document.read(None):
+                pass
+
+    async def test_buffered_upload_is_retried(self):
+        method = SendDocument(chat_id=1, document=BufferedInputFile(b"%PDF-1.4", filename="work.pdf"))
+
+        self.assertTrue(await self.limiter(self.session, None, method))
+        self.assertEqual(self.session.calls, 2)
+        self.assertEqual(self.session.uploads, [b"%PDF-1.4", b"%PDF-1.4"])
+        self.assertEqual(self.limiter.retries, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Circuit breaker: пробные запросы в half-open
+"""
+
+import asyncio
+import unittest
+
+from services.api_client import APIClient
+from services.resilience import CircuitBreaker
+
+
+class HalfOpenProbeTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.breaker = self.client.breakers["works"]
+        self.breaker.open()
+        self.breaker.half_open()
+
+    async def test_cancelled_probe_releases_slot(self):
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(3600)
+
+        self.client._send_once = hang
+        probe = asyncio.create_task(self.client._send_request("GET", "/works/search"))
+        await started.wait()
+        # Место пробы занято: остальные запросы отклоняются
+        self.assertFalse(self.breaker.allow_request())
+
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+
+        async def ok(*args, **kwargs):
+            return {"results": []}, False
+
+        self.client._send_once = ok
+        self.assertEqual(await self.client._send_request("GET", "/works/search"), {"results": []})
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+
+class ServerErrorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_non_retryable_5xx_opens_breaker(self):
+        client = APIClient()
+        breaker = client.breakers["works"]
+
+        async def internal_error(*args, **kwargs):
+            return {"error": "api_error", "message": "Ошибка API: 500", "status": 500}, False
+
+        client._send_once = internal_error
+        for _ in range(breaker.failure_threshold):
+            await client._send_request("GET", "/works/search")
+        self.assertTrue(breaker.is_open)
+
+        result = await client._send_request("GET", "/works/search")
+        self.assertEqual(result["error"], "connection_error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 Утилиты для форматирования сообщений
 """
 
+import html
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
@@ -99,6 +100,58 @@ def format_term_info(term: Dict[str, Any]) -> str:
     return text
 
 
+def format_unified_results(query: str, sources: Dict[str, Any], works: List[Dict[str, Any]],
+                           final: bool = False) -> str:
+    """Форматирование общего поиска по источникам (результаты SourceResult по имени источника)"""
+    
+    titles = {
+        "works": "🎵 <b>Произведения</b>",
+        "terms": "📚 <b>Термины</b>",
+        "composers": "👨‍🎼 <b>Композиторы</b>",
+        "categories": "📂 <b>Категории</b>"
+    }
+    
+    text = f"🔍 <b>Результаты поиска:</b> '{html.escape(query)}'\n"
+    
+    for name, result in sources.items():
+        text += f"\n{titles.get(name, name)}"
+        
+        if result.status == "loading":
+            if final:
+                text += "\n⏳ Еще загружается, повторите запрос через несколько секунд\n"
+            else:
+                text += "\n⏳ Загружается...\n"
+            continue
+        if result.status == "error":
+            text += "\n⚠️ Источник временно недоступен\n"
+            continue
+        if not result.items:
+            text += "\nНичего не найдено\n"
+            continue
+        
+        text += f" ({result.total})\n"
+        
+        if name == "works":
+            for i, work in enumerate(works, 1):
+                title = html.escape(work.get("work_title", "Без названия"))
+                composer = html.escape(work.get("composer", "Неизвестный"))
+                text += f"{i}. <b>{title}</b> — {composer}\n"
+        elif name == "terms":
+            for term in result.items:
+                definition = term.get("definition", "")
+                if len(definition) > 100:
+                    definition = definition[:100].rsplit(" ", 1)[0] + "..."
+                text += f"• <b>{html.escape(term.get('term', ''))}</b> — {html.escape(definition)}\n"
+        elif name == "composers":
+            for composer in result.items:
+                text += f"• {html.escape(composer.get('composer', ''))} ({composer.get('works_count', 0)})\n"
+        else:
+            for category in result.items:
+                text += f"• {html.escape(str(category.get('value', '')))} ({category.get('count', 0)})\n"
+    
+    return text
+
+
 def format_collection_info(collection: Dict[str, Any], works_count: Optional[int] = None) -> str:
     """Форматирование информации о коллекции"""
     
@@ -0,0 +1,332 @@
+"""
+Метрики бота в формате Prometheus
+"""
+
+import bisect
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import psutil
+from aiohttp import web
+from loguru import logger
+
+# Границы корзин гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Запросы к Backend с идентификаторами в пути сводим к шаблону маршрута
+_ENDPOINT_PATTERNS = (
+    (re.compile(r"^/works/composer/[^/]+"), "/works/composer/{composer}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}")
+)
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Шаблон маршрута Backend для метки: /works/42/thumbnail -> /works/{id}/thumbnail"""
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        endpoint = pattern.sub(replacement, endpoint)
+    return endpoint
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Метрика с метками. Значения меток передаются позиционно, в порядке labelnames"""
+    
+    type = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def clear(self) -> None:
+        self._values.clear()
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def set(self, value: float, *labels: str) -> None:
+        """Значение счетчика, который ведется вне реестра (снимается при сборе)"""
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+    
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Гистограмма: счетчики корзин, сумма и количество наблюдений"""
+    
+    type = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> [счетчики корзин (последняя - +Inf), сумма, количество]
+        self._series: Dict[Tuple[str, ...], list] = {}
+    
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+    
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+    
+    def clear(self) -> None:
+        self._series.clear()
+    
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[float, int]]:
+        """Метки -> (сумма, количество наблюдений)"""
+        return {labels: (total, count) for labels, (_, total, count) in self._series.items()}
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса.
+    
+    Горячий путь только обновляет счетчики в словарях. Состояние компонентов
+    (кеши, очереди, процесс) снимают функции сбора при каждом запросе /metrics.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+    
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Функция, обновляющая метрики перед выдачей"""
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+    
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик {getattr(collector, '__name__', collector)}: {e}")
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Обработка обновлений
+handler_latency = registry.histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика", ("router", "handler")
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("router", "handler")
+)
+updates_in_flight = registry.gauge("bot_updates_in_flight", "Обновлений в обработке")
+updates_waiting = registry.gauge("bot_updates_waiting", "Обновлений в ожидании свободного обработчика")
+scheduler_users = registry.gauge("bot_scheduler_active_users", "Пользователей с обновлениями в очереди")
+scheduler_duplicates = registry.counter("bot_scheduler_duplicates_total", "Отброшенных повторных нажатий")
+webhook_pending = registry.gauge("bot_webhook_pending", "Принятых через webhook, но не обработанных обновлений")
+
+# Запуск
+bot_ready = registry.gauge("bot_ready", "Прогрев завершен или истек его бюджет: бот принимает обновления")
+warmup_duration = registry.gauge("bot_warmup_duration_seconds", "Длительность прогрева при запуске")
+
+# Backend API
+api_latency = registry.histogram(
+    "bot_api_request_duration_seconds", "Время запроса к Backend (одна попытка)", ("method", "endpoint")
+)
+api_errors = registry.counter(
+    "bot_api_errors_total", "Ошибки запросов к Backend", ("method", "endpoint", "error")
+)
+api_circuit_open = registry.gauge("bot_api_circuit_open", "Circuit breaker группы маршрутов открыт", ("group",))
+
+# База данных
+db_latency = registry.histogram(
+    "bot_db_query_duration_seconds", "Время операции хранилища", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# Кеши
+cache_hits = registry.counter("bot_cache_hits_total", "Попадания в кеш", ("cache",))
+cache_misses = registry.counter("bot_cache_misses_total", "Промахи кеша", ("cache",))
+cache_hit_ratio = registry.gauge("bot_cache_hit_ratio", "Доля попаданий в кеш с запуска", ("cache",))
+cache_entries = registry.gauge("bot_cache_entries", "Записей в кеше", ("cache",))
+pdf_cache_bytes = registry.gauge("bot_pdf_cache_bytes", "Объем файлов в локальном кеше PDF")
+
+# Исходящие запросы к Telegram
+outbound_queued = registry.gauge("bot_telegram_outbound_queued", "Запросов к Telegram в очереди лимитов")
+outbound_events = registry.counter(
+    "bot_telegram_outbound_total", "Исходящие запросы к Telegram", ("result",)
+)
+outbound_wait = registry.gauge(
+    "bot_telegram_outbound_wait_seconds", "Ожидание в очереди лимитов (последние 1000 запросов)", ("quantile",)
+)
+
+# Процессы-обработчики (супервизор)
+worker_queue_depth = registry.gauge("bot_worker_queue_depth", "Обновлений в очереди обработчика", ("worker",))
+worker_alive = registry.gauge("bot_worker_alive", "Процесс обработчика работает", ("worker",))
+worker_routed = registry.counter("bot_worker_routed_total", "Обновлений передано обработчику", ("worker",))
+worker_restarts = registry.counter("bot_worker_restarts_total", "Перезапусков обработчика", ("worker",))
+
+# Цикл событий и процесс
+loop_lag = registry.gauge("bot_event_loop_lag_seconds", "Последняя измеренная задержка цикла событий")
+loop_lag_histogram = registry.histogram(
+    "bot_event_loop_lag_histogram_seconds", "Задержка цикла событий",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+loop_stalls = registry.counter("bot_event_loop_stalls_total", "Блокировок цикла событий дольше порога")
+process_rss = registry.gauge("process_resident_memory_bytes", "Резидентная память процесса")
+process_cpu = registry.counter("process_cpu_seconds_total", "Процессорное время (user + system)")
+process_fds = registry.gauge("process_open_fds", "Открытых файловых дескрипторов")
+process_threads = registry.gauge("process_threads", "Потоков процесса")
+process_start = registry.gauge("process_start_time_seconds", "Время запуска процесса (unix)")
+
+_process = psutil.Process(os.getpid())
+
+
+def collect_process() -> None:
+    """Память и процессорное время текущего процесса"""
+    with _process.oneshot():
+        cpu = _process.cpu_times()
+        process_rss.set(_process.memory_info().rss)
+        process_cpu.set(cpu.user + cpu.system)
+        process_threads.set(_process.num_threads())
+        process_start.set(_process.create_time())
+        if hasattr(_process, "num_fds"):
+            process_fds.set(_process.num_fds())
+
+
+def _collect_cache(name: str, hits: int, misses: int, entries: Optional[int] = None) -> None:
+    cache_hits.set(hits, name)
+    cache_misses.set(misses, name)
+    cache_hit_ratio.set(hits / (hits + misses) if hits + misses else 0.0, name)
+    if entries is not None:
+        cache_entries.set(entries, name)
+
+
+def collect_bot_state() -> None:
+    """Кеши, очереди и лимиты процесса, обрабатывающего обновления"""
+    from middleware.auth import auth_middleware
+    from middleware.outbound import outbound_limiter
+    from middleware.scheduler import scheduler_middleware
+    from services.api_client import api_client
+    from services.cache_service import search_cache
+    from services.file_id_cache import telegram_files
+    from services.pdf_cache import pdf_cache
+    from services.search_sessions import search_sessions
+    
+    for name, cache in (
+        ("search", search_cache.memory),
+        ("search_sessions", search_sessions._sessions),
+        ("user_sessions", auth_middleware._sessions),
+        ("telegram_files", telegram_files.memory),
+        ("reference", api_client._reference)
+    ):
+        _collect_cache(name, cache.hits, cache.misses, len(cache))
+    _collect_cache("pdf", pdf_cache.hits, pdf_cache.misses, len(pdf_cache._objects))
+    pdf_cache_bytes.set(pdf_cache.total_bytes)
+    
+    updates_in_flight.set(scheduler_middleware.in_flight)
+    updates_waiting.set(scheduler_middleware.slots.waiting)
+    scheduler_users.set(scheduler_middleware.active_users)
+    scheduler_duplicates.set(scheduler_middleware.duplicates)
+    
+    for group, breaker in api_client.breakers.items():
+        api_circuit_open.set(1 if breaker.is_open else 0, group)
+    
+    stats = outbound_limiter.stats()
+    outbound_queued.set(stats["queued"])
+    for result in ("sent", "merged", "retries"):
+        outbound_events.set(stats[result], result)
+    outbound_wait.set(stats["latency_p50"], "0.5")
+    outbound_wait.set(stats["latency_p95"], "0.95")
+    outbound_wait.set(stats["latency_max"], "1")
+
+
+registry.on_collect(collect_process)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """GET /metrics"""
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный сервер /metrics (в режиме polling и в процессах-обработчиках)"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,237 @@
+"""
+Диагностика задержек: сторож цикла событий и профилировщик медленных обновлений
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+from utils.metrics import loop_lag, loop_lag_histogram, loop_stalls
+
+
+def _running_task_name(loop: asyncio.AbstractEventLoop) -> str:
+    """Задача, выполняющаяся в цикле (вызывается из другого потока)"""
+    task = asyncio.current_task(loop)
+    if task is None:
+        return "-"
+    coro = task.get_coro()
+    return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+class LoopWatchdog:
+    """Сторож цикла событий.
+    
+    Задача в цикле раз в interval секунд отмечается и измеряет, насколько
+    позже заказанного проснулась (метрики задержки). Отдельный поток следит
+    за отметками: если цикл не отмечался дольше threshold, значит его
+    блокирует синхронный код, и в лог пишется текущий стек потока цикла
+    вместе с выполняющейся задачей - то, что блокирует, а не то, что
+    проснулось после блокировки.
+    """
+    
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            loop_lag.set(lag)
+            loop_lag_histogram.observe(lag)
+    
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            # Об одной блокировке сообщаем один раз
+            reported = heartbeat
+            loop_stalls.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "стек недоступен\n"
+            logger.warning(
+                f"🐢 Цикл событий заблокирован уже {stalled * 1000:.0f} мс, "
+                f"задача: {_running_task_name(self._loop)}\n{stack.rstrip()}"
+            )
+    
+    def start(self) -> None:
+        """Запуск из потока цикла событий"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if self.threshold > 0:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+    
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+
+def _collapse(frame) -> str:
+    """Стек в формате collapsed/folded: от внешнего вызова к внутреннему через ';'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class UpdateProfiler:
+    """Выборочный профилировщик медленных обновлений.
+    
+    Поток-сэмплер раз в sample_interval секунд снимает стек потока цикла
+    событий и относит его к выполняющейся задаче, если ее обновление сейчас
+    профилируется. Если обработка заняла больше threshold, образцы
+    сохраняются в directory в формате folded (flamegraph.pl, speedscope),
+    хранятся последние keep файлов. Время ожидания ввода-вывода в образцы
+    не попадает - только код, занимавший цикл событий.
+    """
+    
+    def __init__(self, threshold: float = 0.0, directory: str = "logs/profiles",
+                 keep: int = 100, sample_interval: float = 0.005):
+        self.threshold = threshold
+        self.directory = directory
+        self.keep = keep
+        self.sample_interval = sample_interval
+        # Задача обновления -> снятые стеки
+        self._tracked: Dict[asyncio.Task, List[str]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self.saved = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0 and self._thread is not None
+    
+    def start(self) -> None:
+        """Запуск сэмплера из потока цикла событий (только при threshold > 0)"""
+        if self.threshold <= 0 or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, name="update-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"🔬 Профилирование обновлений дольше {self.threshold * 1000:.0f} мс: {self.directory}")
+    
+    def stop(self) -> None:
+        if self._thread:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self._tracked.clear()
+    
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.sample_interval):
+            if not self._tracked:
+                continue
+            samples = self._tracked.get(asyncio.current_task(self._loop))
+            if samples is None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                samples.append(_collapse(frame))
+    
+    def begin(self) -> Optional[asyncio.Task]:
+        """Начало обработки обновления; None - профилирование выключено"""
+        if not self.enabled:
+            return None
+        task = asyncio.current_task()
+        if task is None or task in self._tracked:
+            # Вложенный вызов в той же задаче профилирует внешний
+            return None
+        self._tracked[task] = []
+        return task
+    
+    async def finish(self, task: Optional[asyncio.Task], elapsed: float, name: str,
+                     describe: Callable[[], str]) -> None:
+        """Конец обработки: сохранение профиля, если обновление было медленным"""
+        if task is None:
+            return
+        samples = self._tracked.pop(task, [])
+        if elapsed < self.threshold:
+            return
+        try:
+            path = await asyncio.to_thread(self._save, samples, elapsed, name)
+        except OSError as e:
+            logger.error(f"Ошибка сохранения профиля: {e}")
+            return
+        self.saved += 1
+        logger.warning(
+            f"🔬 Медленное обновление {elapsed * 1000:.0f} мс ({describe()}), "
+            f"образцов: {len(samples)}, профиль: {path}"
+        )
+    
+    def _save(self, samples: List[str], elapsed: float, name: str) -> str:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{stamp}_{name}_{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in StackCounter(samples).most_common():
+                f.write(f"{stack} {count}\n")
+        self._rotate()
+        return path
+    
+    def _rotate(self) -> None:
+        """Удаление старых профилей сверх keep"""
+        profiles: List[Tuple[str, str]] = sorted(
+            (entry.name, entry.path) for entry in os.scandir(self.directory)
+            if entry.name.endswith(".folded")
+        )
+        for _, path in profiles[:max(0, len(profiles) - self.keep)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+# Глобальные экземпляры
+loop_watchdog = LoopWatchdog(
+    interval=settings.LOOP_WATCHDOG_INTERVAL,
+    threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000
+)
+
+update_profiler = UpdateProfiler(
+    threshold=settings.PROFILE_SLOW_UPDATES_MS / 1000,
+    directory=settings.PROFILE_DIR,
+    keep=settings.PROFILE_KEEP,
+    sample_interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+)